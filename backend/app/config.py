@@ -20,14 +20,107 @@ DATABASE_URL = f"sqlite:///{DATA_DIR / 'autoledger.db'}"
 
 # ── ML Settings ────────────────────────────────────────────────────────
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | onnx (int8, CPU)
+ONNX_MODEL_DIR = DATA_DIR / "onnx" / EMBEDDING_MODEL_NAME
+ONNX_PARITY_THRESHOLD = 0.99    # min cosine vs. PyTorch embeddings to accept the export
 EMBEDDING_DIMENSION = 384
 FAISS_TOP_K = 5
+CLASSIFY_CHUNK_SIZE = 256  # transactions encoded + searched per batch call
+
+# ── FAISS Index Type ───────────────────────────────────────────────────
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")  # auto | flat | hnsw | ivf_flat | ivf_pq
+FAISS_HNSW_MIN_VECTORS = 50_000       # auto: Flat → HNSW once the index reaches this size
+FAISS_IVF_MIN_VECTORS = 2_000_000     # auto: HNSW → IVF-PQ once the index reaches this size
+FAISS_IVF_MIN_TRAIN = 10_000          # IVF types stay Flat until there is enough training data
+FAISS_IVF_RETRAIN_GROWTH = 4.0        # re-train IVF centroids when ntotal grows by this factor
+FAISS_HNSW_M = 32
+FAISS_HNSW_EF_CONSTRUCTION = 80
+FAISS_HNSW_EF_SEARCH = 64
+FAISS_IVF_NLIST = 0                   # 0 = auto (≈ 4·√N)
+FAISS_IVF_NPROBE = 16
+FAISS_PQ_M = 48                       # PQ sub-quantizers (384 / 48 = 8 dims each, 8 bits)
+
+# ── Multi-worker Sharing ───────────────────────────────────────────────
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"              # map index snapshots read-only (shared page cache)
+EMBEDDING_PRELOAD = os.getenv("EMBEDDING_PRELOAD", "1") == "1"  # load the model in each gunicorn worker at fork, not on first request
+FAISS_VERSION_CHECK_INTERVAL = 1.0   # seconds between checks for a newer index snapshot (per worker)
+
+# ── Index Persistence ──────────────────────────────────────────────────
+FAISS_DELTA_COMPACT_SEGMENTS = 16    # fold delta segments into the base once there are this many
+FAISS_DELTA_COMPACT_FRACTION = 0.1   # …or once they hold this fraction of the base's vectors
+
+# ── Embedding Cache ────────────────────────────────────────────────────
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_SIZE = 50_000   # in-process LRU entries (~1.5 KB each)
+EMBEDDING_CACHE_DIR = DATA_DIR / "embedding_cache"
+
+# ── Embedding Micro-batching ───────────────────────────────────────────
+EMBEDDING_MICROBATCH_ENABLED = True
+EMBEDDING_MICROBATCH_MAX_SIZE = 64      # flush once this many texts are queued
+EMBEDDING_MICROBATCH_MAX_WAIT_MS = 5    # …or once the oldest request waited this long
+
+# ── Two-stage Classification ───────────────────────────────────────────
+CENTROID_STAGE_ENABLED = True
+CENTROID_MIN_MARGIN = 0.15      # top-1 vs top-2 centroid cosine gap needed to skip the k-NN search
+CENTROID_TEMPERATURE = 0.05     # softmax temperature turning centroid similarities into confidence
+CENTROID_MAX_CONFIDENCE = 75.0  # that softmax is uncalibrated: cap it below CONFIDENCE_AUTO_POST so centroid answers get reviewed
+
+# ── Linear Classifier Head ─────────────────────────────────────────────
+LINEAR_HEAD_ENABLED = True
+LINEAR_HEAD_MIN_PROB = 0.85          # head answers when its raw top softmax probability reaches this; else k-NN
+LINEAR_HEAD_CALIBRATION_SHARE = 0.2  # labeled vectors held out to fit the temperature behind its confidence score
+LINEAR_HEAD_C = 10.0                 # inverse L2 regularization strength of the logistic regression
+LINEAR_HEAD_MAX_ITER = 500
+LINEAR_HEAD_CORRECTION_WEIGHT = 3.0  # sample weight of analyst corrections relative to seed vectors
+
+# ── Exact-match Fast Path ──────────────────────────────────────────────
+EXACT_MATCH_ENABLED = True
+EXACT_MATCH_MIN_COUNT = 2            # reviewed bookings of a (description, vendor, department) needed
+EXACT_MATCH_MIN_SHARE = 0.9          # …and the share of them that went to the top GL
+VENDOR_MATCH_MIN_COUNT = 5           # vendor-only matches need more evidence
+VENDOR_MATCH_MIN_SHARE = 0.95
+EXACT_MATCH_REFRESH_SECONDS = 300    # re-sync from the DB (reviews handled by other workers)
 
 # ── Confidence Thresholds ─────────────────────────────────────────────
 CONFIDENCE_AUTO_POST = 80.0     # > 80% → auto-post to ERP
 CONFIDENCE_REVIEW = 50.0        # 50–80% → human review
 # < 50% → manual classification
 
+# ── Staged Batch Pipeline ──────────────────────────────────────────────
+PIPELINE_QUEUE_SIZE = 4        # chunks buffered between two stages
+PIPELINE_EMBED_WORKERS = 1     # fast path + model forward pass
+PIPELINE_SEARCH_WORKERS = 1    # centroid / linear head / k-NN scoring
+PIPELINE_PERSIST_WORKERS = 1   # SQLite has a single writer
+
+# ── Background Classification Jobs ─────────────────────────────────────
+CLASSIFY_JOB_WORKERS = int(os.getenv("CLASSIFY_JOB_WORKERS", "2"))  # job threads per process
+CLASSIFY_JOB_POLL_SECONDS = 2.0      # idle workers look for queued jobs this often
+CLASSIFY_JOB_STALE_SECONDS = 120     # a running job without a checkpoint this long is resumed elsewhere
+
+# ── ERP Outbox ─────────────────────────────────────────────────────────
+ERP_OUTBOX_WORKERS = int(os.getenv("ERP_OUTBOX_WORKERS", "4"))  # concurrent ERP posts per process
+ERP_OUTBOX_CLAIM_SIZE = 16           # entries a worker claims (and records) per DB transaction
+ERP_OUTBOX_MAX_ATTEMPTS = 6          # give up and record the posting as failed after this many tries
+ERP_OUTBOX_BACKOFF_BASE = 2.0        # seconds before the first retry, doubled per attempt…
+ERP_OUTBOX_BACKOFF_MAX = 300.0       # …up to this cap (each delay is jittered to 50–100%)
+ERP_OUTBOX_POLL_SECONDS = 1.0        # idle workers look for due entries this often
+ERP_OUTBOX_STALE_SECONDS = 120       # an in-flight entry unreported this long is claimed again
+
+# ── ERP Journal Batching ───────────────────────────────────────────────
+ERP_BATCH_ENABLED = os.getenv("ERP_BATCH_ENABLED", "1") == "1"  # outbox posts journal batches, not single lines
+ERP_BATCH_GROUPING = "gl_date"       # gl_date: one batch per (GL code, posting date) | size: fill in claim order
+ERP_BATCH_MAX_LINES = 200            # lines per journal batch (and entries a worker claims at once)
+
+# ── ERP Client ─────────────────────────────────────────────────────────
+ERP_API_URL = os.getenv("ERP_API_URL", "")  # e.g. http://localhost:8900 (scripts/mock_erp_server.py); empty = in-process mock
+ERP_TIMEOUT_SECONDS = 5.0            # per request (read / write / waiting for a pooled connection)
+ERP_CONNECT_TIMEOUT_SECONDS = 2.0
+ERP_HTTP_MAX_CONNECTIONS = 20        # pooled connections per process
+ERP_HTTP_MAX_KEEPALIVE = 10          # idle keep-alive connections kept open
+ERP_HTTP_PER_HOST_LIMIT = 8          # requests in flight to the ERP host at once
+ERP_BREAKER_FAILURE_THRESHOLD = 5    # consecutive 5xx / network failures that open the circuit
+ERP_BREAKER_RESET_SECONDS = 30.0     # an open circuit rejects calls this long, then lets one probe through
+
 # ── Retraining ─────────────────────────────────────────────────────────
 RETRAIN_CORRECTION_THRESHOLD = 10  # retrain after N new corrections
 
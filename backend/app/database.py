@@ -1,6 +1,6 @@
 """SQLAlchemy database engine and session management."""
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from app.config import DATABASE_URL
@@ -20,6 +20,20 @@ def get_db():
 
 
 def init_db():
-    """Create all tables."""
+    """Create all tables, plus nullable columns and indexes added to models after their table existed."""
     from app import models  # noqa: F401 – ensure models are registered
     Base.metadata.create_all(bind=engine)
+
+    # create_all skips existing tables entirely – add their missing nullable
+    # columns and indexes (CREATE INDEX IF NOT EXISTS) so older databases get them too
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                    ))
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -4,6 +4,7 @@ AutoLedger AI – FastAPI Application Entry Point.
 Intelligent GL Classification & ERP Posting System.
 """
 
+import asyncio
 import csv
 from contextlib import asynccontextmanager
 
@@ -11,10 +12,18 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.config import DATA_DIR
+from app.config import DATA_DIR, EMBEDDING_PRELOAD
 from app.database import init_db, SessionLocal
 from app.models import ChartOfAccounts
 from app.ml.pipeline import initialize_index_from_coa
+from app.ml.batcher import start_batcher, stop_batcher
+from app.ml.embeddings import get_model, release_model, set_torch_threads
+from app.ml.exact_match import load_exact_match_index
+from app.ml.linear_head import ensure_linear_head
+from app.ml.vector_store import release_index, wait_for_compaction
+from app.services.jobs import start_job_workers, stop_job_workers
+from app.services.erp_outbox import start_outbox_workers, stop_outbox_workers
+from app.services.erp_client import start_erp_client, stop_erp_client
 
 
 def seed_chart_of_accounts():
@@ -45,6 +54,37 @@ def seed_chart_of_accounts():
         db.close()
 
 
+_worker_torch_threads: int | None = None  # torch thread count workers restore after fork
+
+
+def prepare_shared_state():
+    """
+    One-time startup work for the gunicorn master (see gunicorn.conf.py).
+
+    Seeds the DB and builds the on-disk index snapshot before workers fork, so
+    workers only have to map the finished snapshot. Seeding encodes on a
+    single torch thread and the model is dropped afterwards: an OpenMP or
+    onnxruntime thread pool started in the master does not survive the fork
+    and can hang a worker's first encode.
+    """
+    global _worker_torch_threads
+    _worker_torch_threads = set_torch_threads(1)
+    init_db()
+    seed_chart_of_accounts()
+    initialize_index_from_coa()
+    wait_for_compaction()  # never fork while a compaction thread holds the index locks
+    release_index()  # workers map the snapshot instead of inheriting a private copy
+    release_model()
+
+
+def prepare_worker():
+    """Per-worker startup right after fork: restore torch threads, load the model (EMBEDDING_PRELOAD)."""
+    if _worker_torch_threads is not None:
+        set_torch_threads(_worker_torch_threads)
+    if EMBEDDING_PRELOAD:
+        get_model()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application startup and shutdown events."""
@@ -53,10 +93,22 @@ async def lifespan(app: FastAPI):
     init_db()
     seed_chart_of_accounts()
     initialize_index_from_coa()
+    load_exact_match_index()
+    ensure_linear_head()
+    await start_batcher()
+    await start_erp_client()
+    start_job_workers()  # also resumes jobs interrupted by a restart
+    start_outbox_workers()  # also delivers ERP postings queued before a restart
     print("✓ Application ready!")
     yield
     # Shutdown
     print("🛑 Shutting down AutoLedger AI...")
+    # Joined from a thread: a worker may be blocked on an ERP call or an
+    # encode that only this (still running) event loop can finish
+    await asyncio.to_thread(stop_job_workers)
+    await asyncio.to_thread(stop_outbox_workers)
+    await stop_erp_client()
+    await stop_batcher()
 
 
 # ── FastAPI App ────────────────────────────────────────────────────────
@@ -74,16 +126,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # keyset pagination of list endpoints
 )
 
 # ── Register Routers ──────────────────────────────────────────────────
-from app.routers import transactions, predictions, reviews, audit, erp  # noqa: E402
+from app.routers import transactions, predictions, reviews, audit, erp, jobs  # noqa: E402
 
 app.include_router(transactions.router)
 app.include_router(predictions.router)
 app.include_router(reviews.router)
 app.include_router(audit.router)
 app.include_router(erp.router)
+app.include_router(jobs.router)
 
 
 @app.get("/", tags=["Root"])
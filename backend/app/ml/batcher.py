@@ -0,0 +1,174 @@
+"""Dynamic micro-batching of single-text embedding requests."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+from app.config import (
+    EMBEDDING_MICROBATCH_ENABLED,
+    EMBEDDING_MICROBATCH_MAX_SIZE,
+    EMBEDDING_MICROBATCH_MAX_WAIT_MS,
+)
+from app.ml.embeddings import encode_text, encode_texts
+
+
+class MicroBatcher:
+    """
+    Collects concurrent ``encode`` calls into one ``encode_texts`` forward pass.
+
+    A batch is flushed once it holds ``max_batch_size`` texts or the oldest
+    request has waited ``max_wait_ms``. The model runs on a dedicated thread, so
+    the event loop keeps accepting requests (which form the next batch) while a
+    batch is being encoded, and callers blocked in a shared threadpool can never
+    starve it.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[list[str]], np.ndarray],
+        max_batch_size: int = EMBEDDING_MICROBATCH_MAX_SIZE,
+        max_wait_ms: float = EMBEDDING_MICROBATCH_MAX_WAIT_MS,
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.items = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="microbatch")
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Start the flush loop on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._queue = asyncio.Queue()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the flush loop. Requests still queued or being encoded fail with
+        ``RuntimeError`` instead of waiting forever.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _fail([self._queue.get_nowait()], RuntimeError("Micro-batcher stopped"))
+        self._executor.shutdown(wait=False)
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Queue one text and wait for its embedding."""
+        if not self.running:
+            raise RuntimeError("Micro-batcher is not running")
+        future = self._loop.create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    def encode_threadsafe(self, text: str) -> np.ndarray:
+        """
+        Blocking ``encode`` for sync code (e.g. FastAPI threadpool endpoints).
+
+        Falls back to a direct batch-of-1 call when the batcher is not running
+        or when called from the event loop thread itself.
+        """
+        if not self.running or self._loop_thread == threading.get_ident():
+            return self.encode_fn([text])[0]
+        return asyncio.run_coroutine_threadsafe(self.encode(text), self._loop).result()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+    async def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = self._loop.time() + self.max_wait
+
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                batch = [(text, fut) for text, fut in batch if not fut.cancelled()]
+                if not batch:
+                    continue
+
+                try:
+                    vectors = await self._loop.run_in_executor(
+                        self._executor, self.encode_fn, [text for text, _ in batch]
+                    )
+                except Exception as e:
+                    _fail(batch, e)
+                    continue
+
+                self.batches += 1
+                self.items += len(batch)
+                for (_, fut), vector in zip(batch, vectors):
+                    if not fut.done():
+                        fut.set_result(vector)
+        except asyncio.CancelledError:
+            # stop(): fail the batch being collected or encoded
+            _fail(batch, RuntimeError("Micro-batcher stopped"))
+            raise
+
+
+def _fail(batch: list[tuple], error: Exception):
+    """Fail the (text, future) requests of ``batch`` that are still waiting."""
+    for _, fut in batch:
+        if not fut.done():
+            fut.set_exception(error)
+
+
+# Global batcher (started with the app)
+_batcher: MicroBatcher | None = None
+
+
+async def start_batcher():
+    """Start the shared micro-batcher on the app's event loop."""
+    global _batcher
+    if EMBEDDING_MICROBATCH_ENABLED and _batcher is None:
+        _batcher = MicroBatcher(encode_texts)
+        await _batcher.start()
+
+
+async def stop_batcher():
+    global _batcher
+    if _batcher is not None:
+        await _batcher.stop()
+        _batcher = None
+
+
+def batched_encode_text(text: str) -> np.ndarray:
+    """Encode one text, sharing a forward pass with concurrent callers when possible."""
+    if _batcher is None:
+        return encode_text(text)
+    return _batcher.encode_threadsafe(text)
+
+
+def get_batcher_stats() -> dict:
+    return _batcher.stats() if _batcher else {"enabled": False}
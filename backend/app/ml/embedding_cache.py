@@ -0,0 +1,170 @@
+"""Two-tier embedding cache: in-process LRU + append-only memory-mapped disk store."""
+
+import fcntl
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different strings share a cache entry."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Cache of text → embedding, keyed by a hash of the model name and normalized text.
+
+    Disk layout (both files are append-only, row ``i`` of one matches line ``i`` of the other):
+        vectors.f32 – raw float32 rows of ``dim`` values, read through ``np.memmap``
+        keys.txt    – one hex key per row (the offset index is rebuilt from it on load)
+
+    Appends take an exclusive ``flock`` so several worker processes can share a store.
+    """
+
+    def __init__(self, model_name: str, cache_dir: Path, capacity: int, dim: int):
+        self.model_name = model_name
+        self.capacity = capacity
+        self.dim = dim
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self._vectors_file = cache_dir / "vectors.f32"
+        self._keys_file = cache_dir / "keys.txt"
+        self._vectors_file.touch(exist_ok=True)
+        self._keys_file.touch(exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._offsets: dict[str, int] = {}  # key → row in vectors.f32
+        self._rows = 0                      # rows of keys.txt already indexed
+        self._keys_read = 0                 # bytes of keys.txt already indexed
+        self._mmap: np.memmap | None = None
+        self._refresh_offsets()
+
+    # ── Keys ─────────────────────────────────────────────────────────
+    def key(self, text: str) -> str:
+        payload = f"{self.model_name}\x00{normalize_text(text)}".encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    # ── Lookup ───────────────────────────────────────────────────────
+    def get_many(self, texts: list[str]) -> tuple[list[str], dict[int, np.ndarray]]:
+        """
+        Look up texts in memory, then on disk.
+
+        Returns:
+            keys: cache key per text
+            found: {position: embedding} for every hit
+        """
+        keys = [self.key(t) for t in texts]
+        found = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    found[i] = vector
+                    continue
+
+                vector = self._read_disk(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.hits_disk += 1
+                    found[i] = vector
+                    continue
+
+                self.misses += 1
+        return keys, found
+
+    def put_many(self, keys: list[str], vectors: np.ndarray):
+        """Store freshly computed embeddings in both tiers."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            new_keys, new_rows = [], []
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+                if key not in self._offsets and key not in new_keys:
+                    new_keys.append(key)
+                    new_rows.append(vector)
+            if new_keys:
+                self._append_disk(new_keys, np.stack(new_rows))
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._offsets),
+        }
+
+    # ── Internals ────────────────────────────────────────────────────
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> np.ndarray | None:
+        row = self._offsets.get(key)
+        if row is None and os.path.getsize(self._keys_file) > self._keys_read:
+            # Another worker may have appended since we last looked
+            self._refresh_offsets()
+            row = self._offsets.get(key)
+        if row is None:
+            return None
+
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            rows = os.path.getsize(self._vectors_file) // (self.dim * 4)
+            self._mmap = np.memmap(self._vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return np.array(self._mmap[row])
+
+    def _refresh_offsets(self):
+        """Index any key lines appended since the last refresh."""
+        complete_rows = os.path.getsize(self._vectors_file) // (self.dim * 4)
+        with open(self._keys_file, "rb") as f:
+            f.seek(self._keys_read)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written line – pick it up next time
+                if self._rows >= complete_rows:
+                    break
+                self._offsets.setdefault(line[:-1].decode("ascii"), self._rows)
+                self._rows += 1
+                self._keys_read += len(line)
+
+    def _append_disk(self, keys: list[str], vectors: np.ndarray):
+        row_bytes = self.dim * 4
+        with open(self._keys_file, "ab") as keys_f, open(self._vectors_file, "r+b") as vectors_f:
+            fcntl.flock(keys_f, fcntl.LOCK_EX)
+            try:
+                # Index rows other workers appended so our row numbers line up
+                self._refresh_offsets()
+                fresh = [i for i, k in enumerate(keys) if k not in self._offsets]
+                if not fresh:
+                    return
+
+                # Vectors go first; a key line is only written once its row is on disk.
+                # Truncating drops orphaned rows left by a crash between the two writes.
+                vectors_f.seek(self._rows * row_bytes)
+                vectors_f.truncate()
+                vectors_f.write(vectors[fresh].tobytes())
+                vectors_f.flush()
+                keys_f.write("".join(f"{keys[i]}\n" for i in fresh).encode("ascii"))
+                keys_f.flush()
+
+                for i in fresh:
+                    self._offsets[keys[i]] = self._rows
+                    self._rows += 1
+                self._keys_read = keys_f.tell()
+            finally:
+                fcntl.flock(keys_f, fcntl.LOCK_UN)
@@ -3,31 +3,110 @@
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
-from app.config import EMBEDDING_MODEL_NAME, EMBEDDING_DIMENSION
+from app.config import (
+    EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_DIMENSION, ONNX_MODEL_DIR,
+    EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_DIR,
+)
+from app.ml.embedding_cache import EmbeddingCache
 
 # Global model instance (loaded once)
 _model = None
+_cache: EmbeddingCache | None = None
 
 
 def get_model() -> SentenceTransformer:
-    """Lazy-load and return the sentence-transformer model."""
+    """
+    Lazy-load and return the embedding model.
+
+    With ``EMBEDDING_BACKEND = "onnx"`` this is an ``OnnxEmbedder`` exposing the
+    same ``encode`` interface (export it first with ``scripts/export_onnx.py``).
+    """
     global _model
     if _model is None:
-        print(f"Loading embedding model: {EMBEDDING_MODEL_NAME}...")
-        _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        print(f"Loading embedding model: {get_model_id()}...")
+        if EMBEDDING_BACKEND == "onnx":
+            from app.ml.onnx_backend import OnnxEmbedder
+            _model = OnnxEmbedder(ONNX_MODEL_DIR)
+        else:
+            _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
         print("✓ Model loaded successfully.")
     return _model
 
 
+def release_model():
+    """Drop the loaded model; the next ``get_model()`` loads a fresh one."""
+    global _model
+    _model = None
+
+
+def set_torch_threads(count: int) -> int:
+    """
+    Set torch's intra-op thread count.
+
+    Returns:
+        The previous count, to restore later.
+    """
+    import torch
+    previous = torch.get_num_threads()
+    torch.set_num_threads(count)
+    return previous
+
+
+def get_model_id() -> str:
+    """Identity of the active model + backend (embeddings differ between backends)."""
+    if EMBEDDING_BACKEND == "onnx":
+        return f"{EMBEDDING_MODEL_NAME}:onnx-int8"
+    return EMBEDDING_MODEL_NAME
+
+
+def get_cache() -> EmbeddingCache | None:
+    """Lazy-open the embedding cache (None when disabled)."""
+    global _cache
+    if _cache is None and EMBEDDING_CACHE_ENABLED:
+        _cache = EmbeddingCache(
+            get_model_id(), EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_SIZE, EMBEDDING_DIMENSION
+        )
+    return _cache
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters of the embedding cache."""
+    cache = get_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+
 def encode_text(text: str) -> np.ndarray:
     """Encode a single text string into a dense vector."""
-    model = get_model()
-    embedding = model.encode([text], normalize_embeddings=True)
-    return embedding[0].astype(np.float32)
+    return encode_texts([text])[0]
 
 
 def encode_texts(texts: list[str]) -> np.ndarray:
-    """Encode a batch of text strings into dense vectors."""
+    """
+    Encode a batch of text strings into dense vectors.
+
+    Cached embeddings are reused; only cache misses go through the model.
+    """
+    cache = get_cache()
+    if cache is None or not texts:
+        return _encode_with_model(texts)
+
+    keys, found = cache.get_many(texts)
+    if len(found) == len(texts):
+        return np.stack([found[i] for i in range(len(texts))])
+
+    # Encode each distinct missing text once
+    missing = {}
+    for i, key in enumerate(keys):
+        if i not in found:
+            missing.setdefault(key, texts[i])
+    computed = _encode_with_model(list(missing.values()))
+    cache.put_many(list(missing), computed)
+
+    by_key = dict(zip(missing, computed))
+    return np.stack([found[i] if i in found else by_key[keys[i]] for i in range(len(texts))])
+
+
+def _encode_with_model(texts: list[str]) -> np.ndarray:
     model = get_model()
     embeddings = model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
     return embeddings.astype(np.float32)
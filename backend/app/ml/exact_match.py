@@ -0,0 +1,218 @@
+"""
+Exact-match / vendor fast path.
+
+Most volume is recurring: the same vendor and description booked to the same
+GL every month. This tier remembers the GL codes analysts confirmed (approved
+predictions and corrections) and answers those transactions directly, without
+an embedding forward pass or a FAISS search.
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy.orm import Session
+
+from app.config import (
+    EXACT_MATCH_ENABLED,
+    EXACT_MATCH_MIN_COUNT,
+    EXACT_MATCH_MIN_SHARE,
+    VENDOR_MATCH_MIN_COUNT,
+    VENDOR_MATCH_MIN_SHARE,
+    EXACT_MATCH_REFRESH_SECONDS,
+)
+
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_field(value: str | None) -> str:
+    """Lower-case, mask digit runs (dates, invoice numbers) and collapse whitespace."""
+    return " ".join(_DIGITS.sub("#", (value or "").lower()).split())
+
+
+class ExactMatchIndex:
+    """
+    GL code distributions keyed by normalized (description, vendor, department)
+    and by vendor alone.
+
+    A lookup answers only when the evidence is strong: enough reviewed
+    occurrences, and nearly all of them booked to the same GL. Confidence is
+    the Laplace-smoothed share of the top GL, so a handful of agreeing reviews
+    lands in the review band and only a consistent history auto-posts.
+    """
+
+    def __init__(self, gl_names: dict[str, str] | None = None):
+        self._exact: dict[tuple[str, str, str], Counter] = {}
+        self._vendor: dict[str, Counter] = {}
+        self._gl_names = dict(gl_names or {})
+        self._lock = threading.Lock()
+        self.hits_exact = 0
+        self.hits_vendor = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def record(self, description: str, vendor: str | None, department: str | None,
+               gl_code: str, gl_name: str = ""):
+        """Count one reviewed booking of this transaction to ``gl_code``."""
+        key = (normalize_field(description), normalize_field(vendor), normalize_field(department))
+        with self._lock:
+            self._exact.setdefault(key, Counter())[gl_code] += 1
+            if key[1]:
+                self._vendor.setdefault(key[1], Counter())[gl_code] += 1
+            if gl_name and not self._gl_names.get(gl_code):
+                self._gl_names[gl_code] = gl_name
+
+    def lookup(self, description: str, vendor: str | None = "", department: str | None = "") -> dict | None:
+        """
+        Prediction dict (same shape as ``classify_transaction``) or None when
+        the history is too thin or too mixed to skip the model.
+        """
+        key = (normalize_field(description), normalize_field(vendor), normalize_field(department))
+        with self._lock:
+            counts = self._exact.get(key)
+            prediction = self._predict(counts, EXACT_MATCH_MIN_COUNT, EXACT_MATCH_MIN_SHARE, "exact_match")
+            if prediction is not None:
+                self.hits_exact += 1
+                return prediction
+
+            counts = self._vendor.get(key[1]) if key[1] else None
+            prediction = self._predict(counts, VENDOR_MATCH_MIN_COUNT, VENDOR_MATCH_MIN_SHARE, "vendor_match")
+            if prediction is not None:
+                self.hits_vendor += 1
+                return prediction
+
+            self.misses += 1
+            return None
+
+    def _predict(self, counts: Counter | None, min_count: int, min_share: float, method: str) -> dict | None:
+        if not counts:
+            return None
+        total = sum(counts.values())
+        ranked = counts.most_common(3)
+        top_code, top_count = ranked[0]
+        if total < min_count or top_count / total < min_share:
+            return None
+
+        return {
+            "predicted_gl_code": top_code,
+            "predicted_gl_name": self._gl_names.get(top_code, ""),
+            "confidence_score": round((top_count + 1) / (total + 2) * 100, 2),
+            "top_candidates": [
+                {"gl_code": code, "gl_name": self._gl_names.get(code, ""), "score": round(count / total * 100, 2)}
+                for code, count in ranked
+            ],
+            "method": method,
+        }
+
+    def stats(self) -> dict:
+        lookups = self.hits_exact + self.hits_vendor + self.misses
+        return {
+            "enabled": True,
+            "keys": len(self._exact),
+            "vendors": len(self._vendor),
+            "hits_exact": self.hits_exact,
+            "hits_vendor": self.hits_vendor,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_exact + self.hits_vendor) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global index (built at startup from the review history)
+_index: ExactMatchIndex | None = None
+_built_at = 0.0
+_refresh_lock = threading.Lock()
+_refresh: threading.Thread | None = None
+
+
+def build_exact_match_index(db: Session) -> ExactMatchIndex:
+    """Replay every approved prediction and correction into a fresh index."""
+    from app.models import ChartOfAccounts, Correction, Prediction, Transaction
+
+    index = ExactMatchIndex(dict(db.query(ChartOfAccounts.gl_code, ChartOfAccounts.gl_name).all()))
+
+    approved = (
+        db.query(Transaction.description, Transaction.vendor, Transaction.department,
+                 Prediction.predicted_gl_code)
+        .join(Prediction, Prediction.transaction_id == Transaction.id)
+        .filter(Prediction.status == "approved")
+    )
+    corrected = (
+        db.query(Transaction.description, Transaction.vendor, Transaction.department,
+                 Correction.corrected_gl_code)
+        .join(Prediction, Prediction.transaction_id == Transaction.id)
+        .join(Correction, Correction.prediction_id == Prediction.id)
+    )
+    for query in (approved, corrected):
+        for description, vendor, department, gl_code in query.yield_per(1000):
+            index.record(description, vendor, department, gl_code)
+    return index
+
+
+def load_exact_match_index():
+    """(Re)build the global index from the database."""
+    global _index, _built_at
+    if not EXACT_MATCH_ENABLED:
+        return
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        index = build_exact_match_index(db)
+    finally:
+        db.close()
+    _index, _built_at = index, time.monotonic()
+    print(f"✓ Exact-match index built ({len(index)} keys)")
+
+
+def _maybe_refresh():
+    """
+    Periodically re-sync from the DB to pick up reviews handled by other workers.
+
+    The rebuild runs in a background thread (at most one per process); lookups
+    keep answering from the current index until the new one is swapped in.
+    """
+    global _refresh
+    if time.monotonic() - _built_at < EXACT_MATCH_REFRESH_SECONDS:
+        return
+    with _refresh_lock:
+        if _refresh is not None and _refresh.is_alive():
+            return
+        _refresh = threading.Thread(target=_refresh_in_background, name="exact-match-refresh", daemon=True)
+        _refresh.start()
+
+
+def _refresh_in_background():
+    global _built_at
+    try:
+        load_exact_match_index()
+    except Exception as e:
+        _built_at = time.monotonic()  # retry after the next interval, not on every lookup
+        print(f"⚠ Exact-match index refresh failed: {e}")
+
+
+def wait_for_refresh():
+    """Block until a scheduled refresh has finished (e.g. in tests)."""
+    if _refresh is not None:
+        _refresh.join()
+
+
+def lookup_exact_match(description: str, vendor: str | None = "", department: str | None = "") -> dict | None:
+    """Fast-path prediction for a transaction, or None to fall through to the model."""
+    if _index is None:
+        return None
+    _maybe_refresh()
+    return _index.lookup(description, vendor, department)
+
+
+def record_review(description: str, vendor: str | None, department: str | None,
+                  gl_code: str, gl_name: str = ""):
+    """Feed an approved or corrected GL back into the index."""
+    if _index is not None:
+        _index.record(description, vendor, department, gl_code, gl_name)
+
+
+def get_exact_match_stats() -> dict:
+    return _index.stats() if _index else {"enabled": False}
@@ -0,0 +1,316 @@
+"""Columnar label metadata for FAISS vectors."""
+
+import json
+import mmap
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+_GL_IDS_FILE = "labels_gl.npy"
+_SOURCE_IDS_FILE = "labels_source.npy"
+_TABLE_FILE = "labels_table.json"
+_TEXTS_FILE = "labels_texts.bin"  # name used before texts files were versioned
+_TEXT_OFFSETS_FILE = "labels_text_offsets.npy"
+
+
+class _Columns:
+    """
+    Growable id columns, shared by a store and its copies.
+
+    Rows a store holds are never written again, and only the store that
+    appended last (its size equals ``used``) appends in place; any other
+    store moves its rows to new columns first.
+    """
+
+    __slots__ = ("gl_ids", "source_ids", "used")
+
+    def __init__(self, gl_ids: np.ndarray, source_ids: np.ndarray, used: int):
+        self.gl_ids = gl_ids
+        self.source_ids = source_ids
+        self.used = used
+
+
+class LabelStore:
+    """
+    Per-vector labels stored as columns instead of one dict per vector.
+
+    - ``gl_ids``: int32 id per vector into an interned GL code / name table
+    - ``source_ids``: int8 id per vector into an interned source table (coa, correction, …)
+    - texts: UTF-8 bytes in an append-only side file, memory-mapped and only
+      read when a caller asks for a vector's text. Other processes map that
+      file and hold offsets into it, so its bytes are never rewritten: a store
+      that cannot simply append starts a new file (see ``save``)
+
+    Search only ever touches ``gl_ids``. Copies share the id columns and the
+    unsaved texts until one of them diverges, so a writer's copy-then-append
+    costs the appended rows, not the whole store.
+    """
+
+    def __init__(self):
+        self._columns = _Columns(np.empty(1024, dtype=np.int32), np.empty(1024, dtype=np.int8), 0)
+        self._size = 0
+
+        self.gl_codes: list[str] = []
+        self.gl_names: list[str] = []
+        self._gl_lookup: dict[str, int] = {}
+        self._gl_labels: list[dict] = []  # shared {gl_code, gl_name} dict per GL id
+        self.sources: list[str] = []
+        self._source_lookup: dict[str, int] = {}
+
+        self._dir: Path | None = None
+        self._texts_name = _TEXTS_FILE                     # texts file in _dir
+        self._text_offsets = np.zeros(1, dtype=np.int64)  # persisted texts: offsets[i]..offsets[i+1]
+        self._pending_texts: list[bytes] = []              # texts added since the last save (may be shared)
+        self._n_pending = 0                                # …of which this store's are the first _n_pending
+        self._texts_mmap: mmap.mmap | None = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def n_gl(self) -> int:
+        return len(self.gl_codes)
+
+    @property
+    def gl_ids(self) -> np.ndarray:
+        return self._columns.gl_ids[:self._size]
+
+    @property
+    def source_ids(self) -> np.ndarray:
+        return self._columns.source_ids[:self._size]
+
+    # ── Writes ───────────────────────────────────────────────────────
+    def append(self, labels: list[dict]):
+        """Append labels ({gl_code, gl_name, text?, source?}) for newly added vectors."""
+        self._reserve(self._size + len(labels))
+        if len(self._pending_texts) != self._n_pending:
+            self._pending_texts = self._pending_texts[:self._n_pending]  # another copy appended first
+        columns = self._columns
+        for i, label in enumerate(labels, start=self._size):
+            columns.gl_ids[i] = self._intern_gl(label["gl_code"], label.get("gl_name", ""))
+            columns.source_ids[i] = self._intern_source(label.get("source", ""))
+            self._pending_texts.append(label.get("text", "").encode("utf-8"))
+        self._size += len(labels)
+        self._n_pending += len(labels)
+        columns.used = self._size
+
+    def _reserve(self, size: int):
+        """Make room to append up to ``size`` rows in place (see ``_Columns``)."""
+        columns = self._columns
+        if columns.used == self._size and size <= len(columns.gl_ids) and columns.gl_ids.flags.writeable:
+            return
+        capacity = max(size, 2 * self._size, 1024)
+        gl_ids = np.empty(capacity, dtype=np.int32)
+        source_ids = np.empty(capacity, dtype=np.int8)
+        gl_ids[:self._size] = self.gl_ids
+        source_ids[:self._size] = self.source_ids
+        self._columns = _Columns(gl_ids, source_ids, self._size)
+
+    def _intern_gl(self, gl_code: str, gl_name: str) -> int:
+        gl_id = self._gl_lookup.get(gl_code)
+        if gl_id is None:
+            gl_id = len(self.gl_codes)
+            self._gl_lookup[gl_code] = gl_id
+            self.gl_codes.append(gl_code)
+            self.gl_names.append(gl_name or "")
+            self._gl_labels.append({"gl_code": gl_code, "gl_name": gl_name or ""})
+        elif gl_name and not self.gl_names[gl_id]:
+            # e.g. correction vectors arrive without a name – first real name wins
+            self.gl_names[gl_id] = gl_name
+            self._gl_labels[gl_id]["gl_name"] = gl_name
+        return gl_id
+
+    def _intern_source(self, source: str) -> int:
+        source_id = self._source_lookup.get(source)
+        if source_id is None:
+            source_id = len(self.sources)
+            self._source_lookup[source] = source_id
+            self.sources.append(source)
+        return source_id
+
+    # ── Reads ────────────────────────────────────────────────────────
+    def gl_id_matrix(self, indices: np.ndarray) -> np.ndarray:
+        """Map FAISS vector indices to GL ids, keeping -1 for missing neighbors."""
+        valid = (indices >= 0) & (indices < self._size)
+        return np.where(valid, self._columns.gl_ids[np.where(valid, indices, 0)], -1)
+
+    def gl_label(self, gl_id: int) -> dict:
+        """Shared ``{gl_code, gl_name}`` dict for a GL id (do not mutate)."""
+        return self._gl_labels[gl_id]
+
+    def gl_id(self, gl_code: str) -> int | None:
+        return self._gl_lookup.get(gl_code)
+
+    def text(self, i: int) -> str:
+        """Text of vector ``i``, read from the memory-mapped side file when persisted."""
+        persisted = len(self._text_offsets) - 1
+        if i >= persisted:
+            return self._pending_texts[i - persisted].decode("utf-8")
+
+        start, end = int(self._text_offsets[i]), int(self._text_offsets[i + 1])
+        if start == end:
+            return ""
+        if self._texts_mmap is None or end > len(self._texts_mmap):
+            self._open_texts()
+        return self._texts_mmap[start:end].decode("utf-8")
+
+    def label(self, i: int) -> dict:
+        """Full label dict of vector ``i`` (materialized on demand)."""
+        gl_id = int(self._columns.gl_ids[i])
+        return {
+            "gl_code": self.gl_codes[gl_id],
+            "gl_name": self.gl_names[gl_id],
+            "text": self.text(i),
+            "source": self.sources[int(self._columns.source_ids[i])],
+        }
+
+    def source_mask(self, sources) -> np.ndarray:
+        """Boolean mask of vectors whose source is in ``sources``."""
+        ids = [self._source_lookup[s] for s in sources if s in self._source_lookup]
+        return np.isin(self.source_ids, ids)
+
+    def copy(self) -> "LabelStore":
+        """
+        Independent copy to append to; persisted texts stay shared on disk.
+
+        The id columns and unsaved texts are shared copy-on-write (see
+        ``_Columns``), so this costs only the interned tables, which are
+        copied so that appends never show through to readers of the original.
+        """
+        store = LabelStore()
+        store._columns = self._columns
+        store._size = self._size
+        store.gl_codes = list(self.gl_codes)
+        store.gl_names = list(self.gl_names)
+        store._gl_lookup = dict(self._gl_lookup)
+        store._gl_labels = [dict(label) for label in self._gl_labels]
+        store.sources = list(self.sources)
+        store._source_lookup = dict(self._source_lookup)
+        store._dir = self._dir
+        store._texts_name = self._texts_name
+        store._texts_mmap = self._texts_mmap  # read-only; the file may since have been replaced
+        store._text_offsets = self._text_offsets  # never modified in place
+        store._pending_texts = self._pending_texts
+        store._n_pending = self._n_pending
+        return store
+
+    def take(self, rows: np.ndarray) -> "LabelStore":
+        """New store holding only ``rows`` (texts are re-read, so this is O(len(rows)))."""
+        return LabelStore.from_dicts([self.label(int(i)) for i in rows])
+
+    # ── Persistence ──────────────────────────────────────────────────
+    def save(self, directory: Path):
+        """
+        Write the columns and table, appending only new texts to the side file.
+
+        New texts are appended in place only when the file holds exactly this
+        store's persisted texts. Otherwise (another directory, a store built by
+        ``take``, a stale copy, a save that never committed) they go to a new
+        file, the table points at it and the old files are removed once
+        unreferenced; processes still reading them keep their mappings.
+        """
+        directory = Path(directory)
+        end = int(self._text_offsets[-1])
+        texts_path = directory / self._texts_name
+        if self._dir != directory or not texts_path.exists() or texts_path.stat().st_size != end:
+            self._start_texts_file(directory)
+            texts_path = directory / self._texts_name
+
+        if self._n_pending:
+            pending = self._pending_texts[:self._n_pending]
+            with open(texts_path, "ab") as f:
+                lengths = np.array([len(t) for t in pending], dtype=np.int64)
+                f.write(b"".join(pending))
+            self._text_offsets = np.concatenate([self._text_offsets, end + np.cumsum(lengths)])
+            self._pending_texts, self._n_pending = [], 0
+
+        _save_npy(directory / _GL_IDS_FILE, self.gl_ids)
+        _save_npy(directory / _SOURCE_IDS_FILE, self.source_ids)
+        _save_npy(directory / _TEXT_OFFSETS_FILE, self._text_offsets)
+        _write_json(directory / _TABLE_FILE, {
+            "count": self._size,
+            "gl_codes": self.gl_codes,
+            "gl_names": self.gl_names,
+            "sources": self.sources,
+            "texts_file": self._texts_name,
+        })
+        for path in directory.glob("labels_texts*.bin"):
+            if path.name != self._texts_name:
+                path.unlink()
+
+    def _start_texts_file(self, directory: Path):
+        """Move this store's texts to a new, uniquely named file in ``directory``."""
+        name = f"labels_texts.{uuid.uuid4().hex[:12]}.bin"
+        persisted = int(self._text_offsets[-1])
+        with open(directory / name, "wb") as dst:
+            if persisted:
+                if self._texts_mmap is None:
+                    self._open_texts()
+                dst.write(self._texts_mmap[:persisted])
+        self._dir, self._texts_name = directory, name
+
+    @classmethod
+    def exists(cls, directory: Path) -> bool:
+        return (Path(directory) / _TABLE_FILE).exists()
+
+    @classmethod
+    def load(cls, directory: Path, memory_map: bool = False) -> "LabelStore":
+        """
+        Load a saved store. With ``memory_map`` the id columns stay read-only memory
+        maps (shared between processes) until the first append copies them.
+        """
+        directory = Path(directory)
+        mmap_mode = "r" if memory_map else None
+        store = cls()
+        with open(directory / _TABLE_FILE, "r", encoding="utf-8") as f:
+            table = json.load(f)
+
+        store.gl_codes = table["gl_codes"]
+        store.gl_names = table["gl_names"]
+        store._gl_lookup = {code: i for i, code in enumerate(store.gl_codes)}
+        store._gl_labels = [
+            {"gl_code": code, "gl_name": name} for code, name in zip(store.gl_codes, store.gl_names)
+        ]
+        store.sources = table["sources"]
+        store._source_lookup = {source: i for i, source in enumerate(store.sources)}
+
+        count = table["count"]
+        store._columns = _Columns(
+            np.load(directory / _GL_IDS_FILE, mmap_mode=mmap_mode)[:count],
+            np.load(directory / _SOURCE_IDS_FILE, mmap_mode=mmap_mode)[:count],
+            count,
+        )
+        store._size = count
+        store._text_offsets = np.load(directory / _TEXT_OFFSETS_FILE, mmap_mode=mmap_mode)[:count + 1]
+        store._dir = directory
+        store._texts_name = table.get("texts_file", _TEXTS_FILE)
+        if store._text_offsets[-1] > 0:
+            store._open_texts()  # mapped now: a later save elsewhere may replace the file
+        return store
+
+    @classmethod
+    def from_dicts(cls, labels: list[dict]) -> "LabelStore":
+        """Build a store from legacy ``labels.json`` dicts."""
+        store = cls()
+        store.append(labels)
+        return store
+
+    def _open_texts(self):
+        with open(self._dir / self._texts_name, "rb") as f:
+            self._texts_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _save_npy(path: Path, array: np.ndarray):
+    """Write an .npy file atomically."""
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def _write_json(path: Path, payload: dict):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp, path)
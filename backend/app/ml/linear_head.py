@@ -0,0 +1,339 @@
+"""
+Linear classifier head over the stored embeddings.
+
+A multinomial logistic regression trained on every labeled vector in the index
+(seed vectors and analyst corrections). Inference is one (N×384)·(384×C)
+matmul – O(number of GL codes), independent of the index size – so it runs as
+a cascade stage ahead of the k-NN search.
+
+Its raw probabilities only decide whether the head answers at all
+(LINEAR_HEAD_MIN_PROB). The confidence score that gets routed comes from the
+same logits softened by a temperature fitted on held-out vectors, so it
+reflects how often answers that sure are actually right – and can land below
+CONFIDENCE_AUTO_POST like any k-NN answer.
+"""
+
+import fcntl
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.config import (
+    FAISS_INDEX_DIR,
+    FAISS_VERSION_CHECK_INTERVAL,
+    LINEAR_HEAD_ENABLED,
+    LINEAR_HEAD_C,
+    LINEAR_HEAD_MAX_ITER,
+    LINEAR_HEAD_CORRECTION_WEIGHT,
+    LINEAR_HEAD_CALIBRATION_SHARE,
+)
+from app.ml.embeddings import get_model_id
+from app.ml.vector_store import get_generation
+
+_HEAD_FILE = os.path.join(str(FAISS_INDEX_DIR), "linear_head.npz")
+_TRAIN_LOCK_FILE = os.path.join(str(FAISS_INDEX_DIR), ".linear_head.lock")
+
+
+class LinearHead:
+    """
+    Softmax(x·Wᵀ + b) over GL codes, plus softmax((x·Wᵀ + b) / T) as the
+    calibrated confidence.
+
+    Tagged with the index snapshot version and embedding model it was trained
+    on: a head from a different model is never used, a head from an older
+    snapshot is used until the background retrain replaces it.
+    """
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        gl_codes: list[str],
+        gl_names: list[str],
+        index_version: int = 0,
+        model_id: str = "",
+        temperature: float = 1.0,
+    ):
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)  # (C, dim)
+        self.bias = np.asarray(bias, dtype=np.float32)                  # (C,)
+        self.gl_codes = list(gl_codes)
+        self.gl_names = list(gl_names)
+        self.index_version = index_version
+        self.model_id = model_id
+        self.temperature = float(temperature)
+
+    @property
+    def n_classes(self) -> int:
+        return len(self.gl_codes)
+
+    def predict(self, query_vectors: np.ndarray, top_n: int = 3) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            top_classes: (N, top_n) class indices into ``gl_codes``, best first
+            probs: (N, top_n) their probabilities
+        """
+        top_classes, probs, _ = self.predict_calibrated(query_vectors, top_n)
+        return top_classes, probs
+
+    def predict_calibrated(
+        self, query_vectors: np.ndarray, top_n: int = 3
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Like ``predict``, plus the temperature-scaled probabilities.
+
+        Returns:
+            top_classes: (N, top_n) class indices into ``gl_codes``, best first
+            probs: (N, top_n) their raw probabilities
+            calibrated: (N, top_n) their calibrated probabilities
+        """
+        logits = query_vectors @ self.weights.T + self.bias
+        probs = _softmax(logits)
+        calibrated = _softmax(logits / self.temperature) if self.temperature != 1.0 else probs
+
+        top_n = min(top_n, self.n_classes)
+        order = np.argsort(-probs, axis=1, kind="stable")[:, :top_n]
+        return (
+            order,
+            np.take_along_axis(probs, order, axis=1),
+            np.take_along_axis(calibrated, order, axis=1),
+        )
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                weights=self.weights,
+                bias=self.bias,
+                gl_codes=np.array(self.gl_codes),
+                gl_names=np.array(self.gl_names),
+                index_version=np.array(self.index_version),
+                model_id=np.array(self.model_id),
+                temperature=np.array(self.temperature),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearHead":
+        with np.load(path) as data:
+            return cls(
+                data["weights"],
+                data["bias"],
+                data["gl_codes"].tolist(),
+                data["gl_names"].tolist(),
+                int(data["index_version"]),
+                str(data["model_id"]),
+                float(data["temperature"]) if "temperature" in data else 1.0,
+            )
+
+
+def train_linear_head(
+    vectors: np.ndarray,
+    gl_codes: list[str],
+    gl_names: dict[str, str],
+    sample_weight: np.ndarray | None = None,
+    index_version: int = 0,
+    model_id: str = "",
+) -> LinearHead | None:
+    """
+    Fit a multinomial logistic regression on labeled vectors.
+
+    The temperature of its confidence score is fitted first: a head trained
+    without LINEAR_HEAD_CALIBRATION_SHARE of the vectors scores them, and T
+    minimizes the log loss of softmax(logits / T) on that held-out share.
+
+    Returns None when there are fewer than two GL codes to tell apart.
+    """
+    classes = sorted(set(gl_codes))
+    if len(classes) < 2:
+        return None
+
+    gl_codes = np.asarray(gl_codes)
+    weights, bias, codes = _fit(vectors, gl_codes, sample_weight)
+    temperature = _fit_temperature(vectors, gl_codes, sample_weight)
+    return LinearHead(
+        weights, bias, codes, [gl_names.get(c, "") for c in codes], index_version, model_id, temperature
+    )
+
+
+def _fit(
+    vectors: np.ndarray,
+    gl_codes: np.ndarray,
+    sample_weight: np.ndarray | None,
+) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """(weights, bias, GL codes) of a logistic regression in softmax form."""
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(C=LINEAR_HEAD_C, max_iter=LINEAR_HEAD_MAX_ITER)  # lbfgs → multinomial
+    model.fit(vectors, gl_codes, sample_weight=sample_weight)
+
+    codes = [str(c) for c in model.classes_]
+    weights, bias = model.coef_, model.intercept_
+    if len(codes) == 2:
+        # Binary problems come back as one logit; expand to the two-class softmax form
+        weights = np.vstack([-weights[0] / 2, weights[0] / 2])
+        bias = np.array([-bias[0] / 2, bias[0] / 2])
+    return weights, bias, codes
+
+
+def _fit_temperature(
+    vectors: np.ndarray,
+    gl_codes: np.ndarray,
+    sample_weight: np.ndarray | None,
+    seed: int = 0,
+) -> float:
+    """Held-out temperature for the confidence score (1.0 when there is too little data to hold any out)."""
+    held_out = np.random.default_rng(seed).random(len(gl_codes)) < LINEAR_HEAD_CALIBRATION_SHARE
+    train = ~held_out
+    if held_out.sum() < 10 or len(set(gl_codes[train].tolist())) < 2:
+        return 1.0
+
+    weights, bias, codes = _fit(
+        vectors[train], gl_codes[train], None if sample_weight is None else sample_weight[train]
+    )
+    known = np.isin(gl_codes[held_out], codes)  # held-out GL codes the smaller head never saw
+    if not known.any():
+        return 1.0
+    logits = vectors[held_out][known] @ np.asarray(weights, dtype=np.float32).T + bias
+    truth = np.searchsorted(codes, gl_codes[held_out][known])
+
+    def log_loss(temperature: float) -> float:
+        probs = _softmax(logits / temperature)
+        return float(-np.log(np.maximum(probs[np.arange(len(truth)), truth], 1e-12)).mean())
+
+    candidates = np.geomspace(0.25, 20.0, 80)
+    return float(min(candidates, key=log_loss))
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+# Global head (loaded from disk, retrained in the background)
+_head: LinearHead | None = None
+_head_mtime = 0
+_last_check = 0.0
+_training: threading.Thread | None = None
+
+
+def get_linear_head() -> LinearHead | None:
+    """
+    Current head, re-read when another worker has written a newer artifact.
+
+    The artifact's mtime is checked at most every FAISS_VERSION_CHECK_INTERVAL
+    seconds. Returns None while no head exists for the active embedding model.
+    """
+    global _head, _head_mtime, _last_check
+    if not LINEAR_HEAD_ENABLED:
+        return None
+    now = time.monotonic()
+    if now - _last_check >= FAISS_VERSION_CHECK_INTERVAL:
+        _last_check = now
+        try:
+            mtime = os.stat(_HEAD_FILE).st_mtime_ns
+        except FileNotFoundError:
+            mtime = 0
+        if mtime != _head_mtime:
+            _head, _head_mtime = (LinearHead.load(_HEAD_FILE) if mtime else None), mtime
+
+    if _head is None or _head.model_id != get_model_id():
+        return None
+    return _head
+
+
+def train_from_index() -> LinearHead | None:
+    """Train on the current index generation and publish the artifact next to it."""
+    global _head, _head_mtime
+
+    generation = get_generation()
+    labels = generation.labels
+    if len(labels) == 0:
+        return None
+
+    gl_ids = np.asarray(labels.gl_ids)
+    codes = [labels.gl_codes[i] for i in gl_ids.tolist()]
+    names = dict(zip(labels.gl_codes, labels.gl_names))
+    is_correction = np.asarray(labels.source_mask(("correction",)))
+    weights = np.where(is_correction, LINEAR_HEAD_CORRECTION_WEIGHT, 1.0)
+
+    started = time.time()
+    head = train_linear_head(
+        generation.vectors(), codes, names, weights, generation.version, get_model_id()
+    )
+    if head is None:
+        return None
+
+    head.save(_HEAD_FILE)
+    _head, _head_mtime = head, os.stat(_HEAD_FILE).st_mtime_ns
+    print(f"✓ Linear head trained ({head.n_classes} GL codes, {len(codes)} vectors, "
+          f"temperature {head.temperature:.2f}, index version {head.index_version}, "
+          f"{time.time() - started:.1f}s)")
+    return head
+
+
+def schedule_training():
+    """
+    Retrain the head in a background thread.
+
+    A file lock makes sure only one worker process trains at a time; a worker
+    that finds an up-to-date artifact once it gets the lock skips training, and
+    every worker picks the new artifact up through ``get_linear_head``.
+    """
+    global _training
+    if not LINEAR_HEAD_ENABLED or (_training is not None and _training.is_alive()):
+        return
+    _training = threading.Thread(target=_train_in_background, name="linear-head-training", daemon=True)
+    _training.start()
+
+
+def ensure_linear_head():
+    """At startup: retrain in the background if the artifact is missing or behind the index."""
+    if not LINEAR_HEAD_ENABLED:
+        return
+    head = get_linear_head()
+    if head is None or head.index_version != get_generation().version:
+        schedule_training()
+
+
+def wait_for_training():
+    if _training is not None:
+        _training.join()
+
+
+def get_linear_head_stats() -> dict:
+    head = get_linear_head()
+    stats = {
+        "enabled": LINEAR_HEAD_ENABLED,
+        "trained": head is not None,
+        "training": _training is not None and _training.is_alive(),
+    }
+    if head is not None:
+        stats.update(gl_codes=head.n_classes, index_version=head.index_version,
+                     temperature=round(head.temperature, 3))
+    return stats
+
+
+def _is_current() -> bool:
+    """Whether the artifact on disk was trained on the current snapshot and model."""
+    if not os.path.exists(_HEAD_FILE):
+        return False
+    head = LinearHead.load(_HEAD_FILE)
+    return head.model_id == get_model_id() and head.index_version >= get_generation().version
+
+
+def _train_in_background():
+    with open(_TRAIN_LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not _is_current():
+                train_from_index()
+        except ImportError:
+            print("⚠ scikit-learn not installed – linear head disabled")
+        except Exception as e:
+            print(f"⚠ Linear head training failed: {e}")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
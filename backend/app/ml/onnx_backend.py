@@ -0,0 +1,146 @@
+"""Int8-quantized ONNX Runtime embedding backend for CPU-only inference."""
+
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+class OnnxEmbedder:
+    """
+    Drop-in replacement for ``SentenceTransformer.encode`` backed by ONNX Runtime.
+
+    Reproduces the all-MiniLM-L6-v2 pipeline: transformer → mean pooling over
+    the attention mask → optional L2 normalization.
+    """
+
+    def __init__(self, model_dir: Path, max_seq_length: int = 256, batch_size: int = 64):
+        self.model_dir = Path(model_dir)
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(self.model_dir / ONNX_INT8_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(
+        self,
+        texts: list[str],
+        normalize_embeddings: bool = True,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        """Encode texts into (N, dim) float32 embeddings."""
+        batches = [
+            self._encode_batch(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        if not batches:
+            dim = self.session.get_outputs()[0].shape[-1]
+            return np.empty((0, dim if isinstance(dim, int) else 0), dtype=np.float32)
+
+        embeddings = np.concatenate(batches)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings.astype(np.float32)
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self._input_names}
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real (non-padding) tokens
+        mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return summed / counts
+
+
+def export_quantized_onnx(model, output_dir: Path, opset: int = 14) -> Path:
+    """
+    Export a SentenceTransformer's transformer to ONNX and quantize it to int8.
+
+    Writes ``model.onnx`` (fp32), ``model_int8.onnx`` and ``tokenizer.json``
+    into ``output_dir`` and returns the quantized model path.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    tokenizer = model.tokenizer
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _TokenEmbeddings(torch.nn.Module):
+        """Bind positional ONNX inputs to the transformer's keyword arguments."""
+
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs)))[0]
+
+    transformer = _TokenEmbeddings(model[0].auto_model).eval()
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = output_dir / ONNX_FP32_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[n] for n in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    int8_path = output_dir / ONNX_INT8_FILE
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    tokenizer.backend_tokenizer.save(str(output_dir / TOKENIZER_FILE))
+
+    print(f"✓ Quantized ONNX model exported to {int8_path}")
+    return int8_path
+
+
+def check_parity(reference, embedder: OnnxEmbedder, texts: list[str], threshold: float) -> dict:
+    """
+    Compare ONNX embeddings against the PyTorch model on sample texts.
+
+    Returns:
+        {min_cosine, mean_cosine, threshold, passed}
+    """
+    expected = reference.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    actual = embedder.encode(texts, normalize_embeddings=True)
+    cosines = (np.asarray(expected, dtype=np.float32) * actual).sum(axis=1)
+
+    min_cosine = float(cosines.min()) if len(cosines) else 1.0
+    return {
+        "min_cosine": round(min_cosine, 6),
+        "mean_cosine": round(float(cosines.mean()) if len(cosines) else 1.0, 6),
+        "threshold": threshold,
+        "passed": min_cosine >= threshold,
+    }
@@ -1,28 +1,179 @@
 """End-to-end ML pipeline: text → embedding → FAISS search → prediction."""
 
 import csv
+import hashlib
+import json
+import os
 from pathlib import Path
 
 import numpy as np
 
-from app.config import DATA_DIR, FAISS_TOP_K
-from app.ml.embeddings import encode_text, encode_texts, build_transaction_text
+from app.config import (
+    DATA_DIR, FAISS_INDEX_DIR, FAISS_TOP_K, CLASSIFY_CHUNK_SIZE, EMBEDDING_DIMENSION,
+    CENTROID_STAGE_ENABLED, CENTROID_MIN_MARGIN, CENTROID_TEMPERATURE, CENTROID_MAX_CONFIDENCE,
+    LINEAR_HEAD_MIN_PROB,
+)
+from app.ml.embeddings import encode_texts, build_transaction_text, get_model_id
+from app.ml.batcher import batched_encode_text
+from app.ml.exact_match import lookup_exact_match
+from app.ml.linear_head import LinearHead, get_linear_head
 from app.ml.vector_store import (
-    add_vectors, search, save_index, get_total_vectors, get_index
+    add_vectors, save_index, get_total_vectors, get_generation, IndexGeneration,
+    get_labels, remove_sources, reset_index,
 )
-from app.services.confidence import compute_confidence
+from app.services.confidence import compute_confidence, compute_confidence_batch
+
+
+# Keyword-augmented descriptions per GL code, indexed as the "enrichment" segment
+ENRICHMENT_MAP = {
+    "1100": [
+        "bank transfer deposit wire ACH",
+        "cash withdrawal petty cash bank interest",
+    ],
+    "1200": [
+        "accounts receivable customer invoice payment due",
+        "client billing outstanding balance trade receivable",
+    ],
+    "1300": [
+        "inventory purchase raw materials stock warehouse",
+        "procurement supply chain goods merchandise",
+    ],
+    "2100": [
+        "accounts payable vendor invoice supplier bill",
+        "trade payable procurement outstanding balance",
+    ],
+    "2200": [
+        "accrued expenses wages interest tax bonus",
+        "accrued liability provision charges",
+    ],
+    "3100": [
+        "retained earnings dividend net income equity",
+    ],
+    "4100": [
+        "product sales revenue wholesale retail order",
+        "merchandise sold point of sale licensing",
+    ],
+    "4200": [
+        "service revenue consulting advisory retainer",
+        "professional services implementation contract",
+    ],
+    "5100": [
+        "office supplies stationery printer paper toner",
+        "desk accessories breakroom supplies pens",
+    ],
+    "5200": [
+        "travel expense flight hotel car rental",
+        "business trip accommodation per diem uber",
+    ],
+    "5300": [
+        "utility expense electricity water gas internet",
+        "telephone VoIP service charges",
+    ],
+    "5400": [
+        "software subscription SaaS license cloud hosting",
+        "annual renewal platform developer tools",
+    ],
+    "5500": [
+        "professional fees legal accounting audit consulting",
+        "tax preparation HR external advisory",
+    ],
+    "5600": [
+        "commission sales referral bonus agent payout",
+        "channel partner performance incentive",
+    ],
+    "5700": [
+        "rent expense office lease warehouse co-working space",
+        "parking facility storage property rent",
+    ],
+    "5800": [
+        "marketing expense advertising campaign social media",
+        "trade show content email influencer promotion",
+    ],
+    "5900": [
+        "salary expense payroll wages compensation",
+        "bi-weekly pay overtime contractor payment",
+    ],
+    "6100": [
+        "insurance premium general liability workers compensation",
+        "property insurance D&O cyber policy",
+    ],
+    "6200": [
+        "depreciation expense equipment computer furniture",
+        "vehicle fleet amortization leasehold",
+    ],
+}
+
+_MANIFEST_FILE = FAISS_INDEX_DIR / "manifest.json"
+_SEED_SOURCES = ("coa", "enrichment", "kaggle")
 
 
 def initialize_index_from_coa():
     """
-    Seed the FAISS index using the Chart of Accounts.
-    Each GL code gets an embedding from its name + category.
+    Seed the FAISS index using the Chart of Accounts, enrichment keywords and Kaggle data.
+
+    Idempotent: a manifest of content hashes (COA file, enrichment map, Kaggle
+    file, embedding model) is stored next to the index. Startup skips seeding
+    when nothing changed and re-seeds only the segments whose inputs changed.
+    A model change re-embeds everything, including stored correction texts.
     """
     coa_file = DATA_DIR / "chart_of_accounts.csv"
     if not coa_file.exists():
         print(f"⚠ COA file not found: {coa_file}")
         return
 
+    fingerprints = _compute_fingerprints()
+    manifest = _load_manifest()
+
+    if get_total_vectors() == 0:
+        stale = list(_SEED_SOURCES)
+    elif manifest is None:
+        # Index predates the manifest: its vectors carry no source tag, so
+        # only those matching a seed input are seed vectors; the rest are
+        # analyst corrections and are kept, now tagged as such
+        print("⟳ No index manifest – re-seeding")
+        seed_texts = _seed_texts()
+        corrections = [
+            {**label, "source": "correction"}
+            for label in get_labels(("",)) if label["text"] not in seed_texts
+        ]
+        remove_sources({"", *_SEED_SOURCES})
+        stale = list(_SEED_SOURCES)
+        if corrections:
+            add_vectors(encode_texts([c["text"] for c in corrections]), corrections)
+            print(f"✓ Kept {len(corrections)} untagged correction vectors")
+    elif manifest.get("model") != fingerprints["model"]:
+        print(f"⟳ Embedding model changed ({manifest.get('model')} → {fingerprints['model']}) – re-embedding index")
+        corrections = get_labels(("correction",))
+        reset_index()
+        stale = list(_SEED_SOURCES)
+        if corrections:
+            add_vectors(encode_texts([c["text"] for c in corrections]), corrections)
+    else:
+        stale = [s for s in _SEED_SOURCES if manifest["segments"].get(s) != fingerprints["segments"][s]]
+        if not stale:
+            print(f"✓ FAISS index up to date ({get_total_vectors()} vectors) – skipping seeding")
+            return
+        print(f"⟳ Re-seeding changed index segments: {', '.join(stale)}")
+        remove_sources(set(stale))
+
+    seeders = {
+        "coa": _add_coa_vectors,
+        # Also add enriched variations for better matching
+        "enrichment": _add_enriched_coa_vectors,
+        # Seed with real transaction data if available
+        "kaggle": _add_kaggle_transactions,
+    }
+    for source in stale:
+        seeders[source]()
+
+    save_index()
+    _save_manifest(fingerprints)
+    print(f"✓ FAISS index initialized with {get_total_vectors()} vectors from COA")
+
+
+def _add_coa_vectors():
+    """Each GL code gets an embedding from its name + category."""
+    coa_file = DATA_DIR / "chart_of_accounts.csv"
     texts = []
     labels = []
 
@@ -35,6 +186,7 @@ def initialize_index_from_coa():
                 "gl_code": row["gl_code"],
                 "gl_name": row["gl_name"],
                 "text": text,
+                "source": "coa",
             })
 
     if not texts:
@@ -44,14 +196,63 @@ def initialize_index_from_coa():
     embeddings = encode_texts(texts)
     add_vectors(embeddings, labels)
 
-    # Also add enriched variations for better matching
-    _add_enriched_coa_vectors()
 
-    # Seed with real transaction data if available
-    _add_kaggle_transactions()
+def _seed_texts() -> set[str]:
+    """Every text the COA, enrichment and Kaggle seeders index."""
+    texts = {desc for descriptions in ENRICHMENT_MAP.values() for desc in descriptions}
+    with open(DATA_DIR / "chart_of_accounts.csv", "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            texts.add(f"{row['gl_name']} {row['category']} {row['sub_category']}")
+
+    kaggle_file = DATA_DIR / "kaggle_transactions.csv"
+    if kaggle_file.exists():
+        with open(kaggle_file, "r", encoding="utf-8") as f:
+            texts.update(row["description"] for row in csv.DictReader(f) if row.get("description"))
+    return texts
+
+
+def _compute_fingerprints() -> dict:
+    """Content hashes of every seed input, plus the embedding model identity."""
+    coa_hash = _file_hash(DATA_DIR / "chart_of_accounts.csv")
+    enrichment_hash = hashlib.sha256(
+        json.dumps(ENRICHMENT_MAP, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    kaggle_hash = _file_hash(DATA_DIR / "kaggle_transactions.csv")
+
+    # Enrichment and Kaggle labels take their GL names from the COA
+    return {
+        "model": get_model_id(),
+        "segments": {
+            "coa": coa_hash,
+            "enrichment": f"{enrichment_hash}:{coa_hash}",
+            "kaggle": f"{kaggle_hash}:{coa_hash}",
+        },
+    }
+
+
+def _file_hash(path: Path) -> str:
+    if not path.exists():
+        return "absent"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_manifest() -> dict | None:
+    if not _MANIFEST_FILE.exists():
+        return None
+    with open(_MANIFEST_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(fingerprints: dict):
+    tmp = _MANIFEST_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f, indent=2)
+    os.replace(tmp, _MANIFEST_FILE)
 
-    save_index()
-    print(f"✓ FAISS index initialized with {get_total_vectors()} vectors from COA")
 
 def _add_kaggle_transactions():
     """Seed the FAISS index using unique descriptions from kaggle_transactions.csv."""
@@ -86,6 +287,7 @@ def _add_kaggle_transactions():
                 "gl_code": gl_code,
                 "gl_name": gl_name,
                 "text": desc,
+                "source": "kaggle",
             })
             
         if all_texts:
@@ -98,84 +300,6 @@ def _add_kaggle_transactions():
 
 def _add_enriched_coa_vectors():
     """Add additional description-style vectors for each GL code to improve matching."""
-    enrichment_map = {
-        "1100": [
-            "bank transfer deposit wire ACH",
-            "cash withdrawal petty cash bank interest",
-        ],
-        "1200": [
-            "accounts receivable customer invoice payment due",
-            "client billing outstanding balance trade receivable",
-        ],
-        "1300": [
-            "inventory purchase raw materials stock warehouse",
-            "procurement supply chain goods merchandise",
-        ],
-        "2100": [
-            "accounts payable vendor invoice supplier bill",
-            "trade payable procurement outstanding balance",
-        ],
-        "2200": [
-            "accrued expenses wages interest tax bonus",
-            "accrued liability provision charges",
-        ],
-        "3100": [
-            "retained earnings dividend net income equity",
-        ],
-        "4100": [
-            "product sales revenue wholesale retail order",
-            "merchandise sold point of sale licensing",
-        ],
-        "4200": [
-            "service revenue consulting advisory retainer",
-            "professional services implementation contract",
-        ],
-        "5100": [
-            "office supplies stationery printer paper toner",
-            "desk accessories breakroom supplies pens",
-        ],
-        "5200": [
-            "travel expense flight hotel car rental",
-            "business trip accommodation per diem uber",
-        ],
-        "5300": [
-            "utility expense electricity water gas internet",
-            "telephone VoIP service charges",
-        ],
-        "5400": [
-            "software subscription SaaS license cloud hosting",
-            "annual renewal platform developer tools",
-        ],
-        "5500": [
-            "professional fees legal accounting audit consulting",
-            "tax preparation HR external advisory",
-        ],
-        "5600": [
-            "commission sales referral bonus agent payout",
-            "channel partner performance incentive",
-        ],
-        "5700": [
-            "rent expense office lease warehouse co-working space",
-            "parking facility storage property rent",
-        ],
-        "5800": [
-            "marketing expense advertising campaign social media",
-            "trade show content email influencer promotion",
-        ],
-        "5900": [
-            "salary expense payroll wages compensation",
-            "bi-weekly pay overtime contractor payment",
-        ],
-        "6100": [
-            "insurance premium general liability workers compensation",
-            "property insurance D&O cyber policy",
-        ],
-        "6200": [
-            "depreciation expense equipment computer furniture",
-            "vehicle fleet amortization leasehold",
-        ],
-    }
-
     # Load COA for gl_name lookup
     coa_lookup = {}
     coa_file = DATA_DIR / "chart_of_accounts.csv"
@@ -187,7 +311,7 @@ def _add_enriched_coa_vectors():
     all_texts = []
     all_labels = []
 
-    for gl_code, descriptions in enrichment_map.items():
+    for gl_code, descriptions in ENRICHMENT_MAP.items():
         gl_name = coa_lookup.get(gl_code, "")
         for desc in descriptions:
             all_texts.append(desc)
@@ -195,6 +319,7 @@ def _add_enriched_coa_vectors():
                 "gl_code": gl_code,
                 "gl_name": gl_name,
                 "text": desc,
+                "source": "enrichment",
             })
 
     if all_texts:
@@ -211,31 +336,207 @@ def classify_transaction(
     """
     Classify a single transaction.
 
+    Recurring transactions with a consistent review history are answered by
+    the exact-match fast path without touching the model; the rest go through
+    the centroid → linear head → k-NN cascade.
+
     Returns:
         {
             predicted_gl_code: str,
             predicted_gl_name: str,
             confidence_score: float,
-            top_candidates: [{gl_code, gl_name, score}, ...]
+            top_candidates: [{gl_code, gl_name, score}, ...],
+            method: "exact_match" | "vendor_match" | "centroid" | "linear" | "knn"
         }
     """
+    fast = lookup_exact_match(description, vendor, department)
+    if fast is not None:
+        return fast
+
     text = build_transaction_text(description, vendor, department)
-    query_vector = encode_text(text)
+    query_vector = batched_encode_text(text)
+
+    return classify_vectors(query_vector[None, :], k)[0]
+
+
+def classify_transactions(
+    transactions: list[dict],
+    k: int = FAISS_TOP_K,
+    chunk_size: int = CLASSIFY_CHUNK_SIZE,
+) -> list[dict]:
+    """
+    Classify N transactions in chunks.
+
+    Rows answered by the exact-match fast path are skipped; the rest are
+    embedded with one ``encode_texts`` call per chunk and classified with
+    matrix operations (see ``classify_vectors``), instead of one forward
+    pass + search per row.
 
-    distances, results = search(query_vector, k=k)
+    Args:
+        transactions: dicts with ``description`` and optional ``vendor`` / ``department``
 
+    Returns:
+        One prediction dict per transaction (same shape as ``classify_transaction``),
+        in input order.
+    """
+    predictions: list[dict] = []
+    for start in range(0, len(transactions), chunk_size):
+        chunk_predictions, misses, query_vectors = embed_transactions(transactions[start:start + chunk_size])
+        for i, prediction in zip(misses, classify_vectors(query_vectors, k)):
+            chunk_predictions[i] = prediction
+        predictions.extend(chunk_predictions)
+    return predictions
+
+
+def embed_transactions(transactions: list[dict]) -> tuple[list[dict | None], list[int], np.ndarray]:
+    """
+    First half of batch classification: exact-match fast path, then one
+    ``encode_texts`` call for the rows it could not answer.
+
+    Returns:
+        predictions: fast-path prediction per transaction, None for misses
+        misses: indices of the transactions that still need ``classify_vectors``
+        query_vectors: (len(misses), dim) embeddings of those transactions
+    """
+    predictions = [
+        lookup_exact_match(t["description"], t.get("vendor"), t.get("department"))
+        for t in transactions
+    ]
+    misses = [i for i, p in enumerate(predictions) if p is None]
+
+    texts = [
+        build_transaction_text(
+            transactions[i]["description"],
+            transactions[i].get("vendor") or "",
+            transactions[i].get("department") or "",
+        )
+        for i in misses
+    ]
+    if not texts:
+        query_vectors = np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+    elif len(texts) == 1:
+        # Single-row requests share a forward pass with concurrent callers
+        query_vectors = batched_encode_text(texts[0])[None, :]
+    else:
+        query_vectors = encode_texts(texts)
+    return predictions, misses, query_vectors
+
+
+def classify_vectors(query_vectors: np.ndarray, k: int = FAISS_TOP_K) -> list[dict]:
+    """
+    Cascade classification of N embedded queries.
+
+    1. Score every query against the per-GL centroids (one small matmul) and
+       accept the top GL when it beats the runner-up by CENTROID_MIN_MARGIN.
+    2. Run the remaining rows through the linear head (another small matmul)
+       and accept its answer when the probability reaches LINEAR_HEAD_MIN_PROB
+       (its calibrated probability becomes the confidence, so it is routed
+       by the usual thresholds).
+    3. Send only the rows both stages are unsure about to the full k-NN search.
+    """
+    # GL ids are resolved against the generation that produced them
+    generation = get_generation()
+    predictions: list[dict | None] = [None] * len(query_vectors)
+
+    if CENTROID_STAGE_ENABLED:
+        accepted, top_ids, probs = generation.prototypes.classify(
+            query_vectors, CENTROID_MIN_MARGIN, CENTROID_TEMPERATURE
+        )
+        for i in np.flatnonzero(accepted):
+            predictions[i] = _build_centroid_prediction(generation, top_ids[i], probs[i])
+
+    head = get_linear_head()
+    remaining = [i for i, p in enumerate(predictions) if p is None]
+    if head is not None and remaining:
+        top_classes, probs, calibrated = head.predict_calibrated(query_vectors[remaining])
+        for i, row_classes, row_probs, row_calibrated in zip(remaining, top_classes, probs, calibrated):
+            if row_probs[0] >= LINEAR_HEAD_MIN_PROB:
+                predictions[i] = _build_linear_prediction(head, row_classes, row_calibrated)
+
+    ambiguous = [i for i, p in enumerate(predictions) if p is None]
+    if not ambiguous:
+        return predictions
+
+    distances, gl_ids = generation.search_ids(query_vectors[ambiguous], k=k)
+    confidences, top_ids = compute_confidence_batch(distances, gl_ids, generation.n_gl)
+
+    for i, row_distances, row_ids, confidence, top_id in zip(
+        ambiguous, distances, gl_ids.tolist(), confidences.tolist(), top_ids.tolist()
+    ):
+        row_results = [generation.gl_label(g) for g in row_ids if g >= 0]
+        scored = (confidence, generation.gl_label(top_id)["gl_code"]) if top_id >= 0 else None
+        predictions[i] = _build_prediction(
+            row_distances[:len(row_results)].tolist(), row_results, scored
+        )
+    return predictions
+
+
+def _build_centroid_prediction(generation: IndexGeneration, top_ids: np.ndarray, probs: np.ndarray) -> dict:
+    """
+    Prediction dict from the centroid stage.
+
+    The softmax over centroid similarities ranks candidates but is not a
+    calibrated probability (the margin gate alone pushes it past 95%), so the
+    confidence is capped at CENTROID_MAX_CONFIDENCE and never auto-posts.
+    """
+    top_candidates = []
+    for gl_id, prob in zip(top_ids.tolist(), probs.tolist()):
+        label = generation.gl_label(gl_id)
+        top_candidates.append({
+            "gl_code": label["gl_code"],
+            "gl_name": label["gl_name"],
+            "score": round(prob * 100, 2),
+        })
+
+    return {
+        "predicted_gl_code": top_candidates[0]["gl_code"],
+        "predicted_gl_name": top_candidates[0]["gl_name"],
+        "confidence_score": min(top_candidates[0]["score"], CENTROID_MAX_CONFIDENCE),
+        "top_candidates": top_candidates,
+        "method": "centroid",
+    }
+
+
+def _build_linear_prediction(head: LinearHead, top_classes: np.ndarray, probs: np.ndarray) -> dict:
+    """Prediction dict from the linear head (confidence = its calibrated probability of the top GL)."""
+    top_candidates = [
+        {"gl_code": head.gl_codes[c], "gl_name": head.gl_names[c], "score": round(float(p) * 100, 2)}
+        for c, p in zip(top_classes.tolist(), probs.tolist())
+    ]
+    return {
+        "predicted_gl_code": top_candidates[0]["gl_code"],
+        "predicted_gl_name": top_candidates[0]["gl_name"],
+        "confidence_score": top_candidates[0]["score"],
+        "top_candidates": top_candidates,
+        "method": "linear",
+    }
+
+
+def _build_prediction(
+    distances: list[float],
+    results: list[dict],
+    scored: tuple[float, str] | None = None,
+) -> dict:
+    """
+    Turn the K nearest neighbors of one query into a prediction dict.
+
+    ``scored`` is a precomputed ``(confidence, top_code)`` from the batch scorer.
+    """
     if not results:
         return {
             "predicted_gl_code": "0000",
             "predicted_gl_name": "Unclassified",
             "confidence_score": 0.0,
             "top_candidates": [],
+            "method": "knn",
         }
 
     gl_codes = [r["gl_code"] for r in results]
     gl_names = {r["gl_code"]: r["gl_name"] for r in results}
 
-    confidence, top_code = compute_confidence(distances, gl_codes, k=len(results))
+    if scored is None:
+        scored = compute_confidence(distances, gl_codes, k=len(results))
+    confidence, top_code = scored
 
     # Build top candidates with individual scores
     seen = set()
@@ -259,4 +560,5 @@ def classify_transaction(
         "predicted_gl_name": gl_names.get(top_code, ""),
         "confidence_score": confidence,
         "top_candidates": top_candidates[:3],
+        "method": "knn",
     }
@@ -0,0 +1,125 @@
+"""Per-GL centroid prototypes for a cheap first classification stage."""
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+class GLPrototypes:
+    """
+    Centroid of the stored vectors of every GL code.
+
+    Kept as running per-GL sums and counts, so adding vectors costs
+    O(new vectors) and a retrain never needs a full recompute. Rows are
+    indexed by the label store's GL ids.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.sums = np.zeros((0, dim), dtype=np.float64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self._centroids: np.ndarray | None = None
+
+    @property
+    def n_gl(self) -> int:
+        return len(self.counts)
+
+    def add(self, vectors: np.ndarray, gl_ids: np.ndarray):
+        """Fold ``vectors`` (one per entry of ``gl_ids``) into the running sums."""
+        if len(gl_ids) == 0:
+            return
+        n_gl = int(gl_ids.max()) + 1
+        if n_gl > self.n_gl:
+            self.sums = np.vstack([self.sums, np.zeros((n_gl - self.n_gl, self.dim))])
+            self.counts = np.concatenate([self.counts, np.zeros(n_gl - len(self.counts), dtype=np.int64)])
+        np.add.at(self.sums, gl_ids, vectors)
+        np.add.at(self.counts, gl_ids, 1)
+        self._centroids = None
+
+    def copy(self) -> "GLPrototypes":
+        prototypes = GLPrototypes(self.dim)
+        prototypes.sums = self.sums.copy()
+        prototypes.counts = self.counts.copy()
+        return prototypes
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """(n_gl, dim) L2-normalized centroids (zero rows for GL ids without vectors)."""
+        if self._centroids is None:
+            norms = np.linalg.norm(self.sums, axis=1, keepdims=True)
+            self._centroids = (self.sums / np.where(norms > 0, norms, 1)).astype(np.float32)
+        return self._centroids
+
+    def classify(
+        self,
+        query_vectors: np.ndarray,
+        min_margin: float,
+        temperature: float,
+        top_n: int = 3,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Score N queries against every centroid with one (N×dim)·(dim×n_gl) matmul.
+
+        Returns:
+            accepted: (N,) bool – top-1 beats top-2 cosine similarity by ``min_margin``
+            top_ids: (N, top_n) GL ids, best first
+            probs: (N, top_n) softmax(similarity / temperature) of those GL ids
+        """
+        n = len(query_vectors)
+        populated = np.flatnonzero(self.counts)
+        if len(populated) < 2 or n == 0:
+            return np.zeros(n, dtype=bool), np.empty((n, 0), dtype=np.int64), np.empty((n, 0))
+
+        sims = query_vectors @ self.centroids[populated].T
+        top_n = min(top_n, len(populated))
+        order = np.argsort(-sims, axis=1, kind="stable")[:, :top_n]
+        top_sims = np.take_along_axis(sims, order, axis=1)
+
+        logits = (sims - top_sims[:, :1]) / temperature
+        probs = np.exp(np.take_along_axis(logits, order, axis=1)) / np.exp(logits).sum(axis=1, keepdims=True)
+        accepted = top_sims[:, 0] - top_sims[:, 1] >= min_margin
+        return accepted, populated[order], probs
+
+    # ── Persistence ──────────────────────────────────────────────────
+    @staticmethod
+    def fingerprint(gl_ids: np.ndarray, gl_codes: list[str]) -> str:
+        """Digest of the GL id of every covered row and of the GL code behind each id."""
+        digest = hashlib.sha256(np.ascontiguousarray(gl_ids, dtype=np.int64).tobytes())
+        digest.update("\n".join(gl_codes).encode("utf-8"))
+        return digest.hexdigest()
+
+    def save(self, path: Path, rows: int, fingerprint: str):
+        """Write sums/counts, tagged with the index rows they cover and their labels' fingerprint."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, sums=self.sums, counts=self.counts, rows=np.array(rows),
+                     fingerprint=np.array(fingerprint))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, dim: int, rows: int, fingerprint: str) -> "GLPrototypes | None":
+        """
+        Saved prototypes, or None if missing or written for a different index.
+
+        Matching ``rows`` alone is not enough: a rewrite with the same number
+        of vectors but other GL codes would silently reuse wrong centroids.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if (int(data["rows"]) != rows or "fingerprint" not in data.files
+                    or str(data["fingerprint"]) != fingerprint
+                    or int(data["counts"].sum()) != rows):
+                return None
+            prototypes = cls(dim)
+            prototypes.sums = data["sums"]
+            prototypes.counts = data["counts"]
+        return prototypes
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray, gl_ids: np.ndarray, dim: int) -> "GLPrototypes":
+        prototypes = cls(dim)
+        prototypes.add(vectors, np.asarray(gl_ids, dtype=np.int64))
+        return prototypes
@@ -1,68 +1,679 @@
 """FAISS vector index management for GL code similarity search."""
 
+import fcntl
 import json
+import math
 import os
+import threading
+import time
+from contextlib import contextmanager
 
 import faiss
 import numpy as np
 
-from app.config import EMBEDDING_DIMENSION, FAISS_INDEX_DIR, FAISS_TOP_K
+from app.config import (
+    EMBEDDING_DIMENSION, FAISS_INDEX_DIR, FAISS_TOP_K,
+    FAISS_INDEX_TYPE, FAISS_HNSW_MIN_VECTORS, FAISS_IVF_MIN_VECTORS,
+    FAISS_IVF_MIN_TRAIN, FAISS_IVF_RETRAIN_GROWTH,
+    FAISS_HNSW_M, FAISS_HNSW_EF_CONSTRUCTION, FAISS_HNSW_EF_SEARCH,
+    FAISS_IVF_NLIST, FAISS_IVF_NPROBE, FAISS_PQ_M, FAISS_MMAP,
+    FAISS_VERSION_CHECK_INTERVAL, FAISS_DELTA_COMPACT_SEGMENTS, FAISS_DELTA_COMPACT_FRACTION,
+)
+
+from app.ml.label_store import LabelStore
+from app.ml.prototypes import GLPrototypes
 
 # Global state
-_index: faiss.IndexFlatL2 | None = None
-_labels: list[dict] = []  # [{gl_code, gl_name, text}, ...]
-_LABELS_FILE = os.path.join(str(FAISS_INDEX_DIR), "labels.json")
+_current: "IndexGeneration | None" = None  # published generation, read without locks
+_dirty = False            # _current has changes that are not in a snapshot yet
+_last_version_check = 0.0
+_write_lock = threading.RLock()  # serializes writers (and reloads) within a process
+_compaction: threading.Thread | None = None
+_LEGACY_LABELS_FILE = os.path.join(str(FAISS_INDEX_DIR), "labels.json")
 _INDEX_FILE = os.path.join(str(FAISS_INDEX_DIR), "index.faiss")
+_VERSION_FILE = os.path.join(str(FAISS_INDEX_DIR), "VERSION")
+_SEGMENTS_FILE = os.path.join(str(FAISS_INDEX_DIR), "segments.json")
+_DELTA_DIR = os.path.join(str(FAISS_INDEX_DIR), "deltas")
+_PROTOTYPES_FILE = os.path.join(str(FAISS_INDEX_DIR), "prototypes.npz")
+_BASE_VECTORS_FILE = os.path.join(str(FAISS_INDEX_DIR), "base_vectors.npy")
+_LOCK_FILE = os.path.join(str(FAISS_INDEX_DIR), ".lock")
+# IO_FLAG_MMAP_IFC (faiss >= 1.11) maps every index type in place; IO_FLAG_MMAP only maps IVF
+# inverted lists, and the two cannot be combined (IVF reads then fail)
+_MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+class IndexGeneration:
+    """
+    One published version of the index together with its labels.
+
+    The index is a base (loaded from ``index.faiss``, possibly memory-mapped)
+    plus a small exact delta holding vectors added since the base was written;
+    searches merge the two. Labels cover base rows first, then delta rows, and
+    ``prototypes`` holds the per-GL centroids of all of them. An IVF-PQ base
+    only stores lossy codes, so its float vectors are kept beside it
+    (``raw_base``, memory-mapped from disk) for retraining and rebuilds.
+
+    A generation is never mutated once published. Readers take the current
+    generation once and run entirely against it, so searches need no lock and
+    always see labels that match the index. Writers build the next generation
+    on a private copy and publish it with a single reference swap; searches
+    already running finish on the generation they started with.
+    """
+
+    __slots__ = ("base", "delta", "labels", "prototypes", "trained_size", "mapped", "version",
+                 "base_dirty", "persisted_delta", "saved_rows", "dropped_sources", "replaces_disk",
+                 "raw_base")
+
+    def __init__(
+        self,
+        base: faiss.Index,
+        labels: LabelStore,
+        delta: faiss.Index | None = None,
+        trained_size: int | None = None,
+        mapped: bool = False,
+        version: int = 0,
+        base_dirty: bool = False,
+        persisted_delta: int | None = None,
+        prototypes: GLPrototypes | None = None,
+        saved_rows: int | None = None,
+        dropped_sources: frozenset = frozenset(),
+        replaces_disk: bool = False,
+        raw_base: np.ndarray | None = None,
+    ):
+        self.base = base
+        self.delta = delta if delta is not None else faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+        self.labels = labels
+        self.prototypes = prototypes if prototypes is not None else GLPrototypes(EMBEDDING_DIMENSION)
+        self.trained_size = base.ntotal if trained_size is None else trained_size  # IVF training size
+        self.mapped = mapped            # base is a read-only memory map of the on-disk snapshot
+        self.version = version          # snapshot version it was loaded from or saved as
+        self.base_dirty = base_dirty    # base differs from index.faiss (needs a full write)
+        # delta rows already written as segments
+        self.persisted_delta = self.delta.ntotal if persisted_delta is None else persisted_delta
+        # Unsaved changes, replayed onto a newer snapshot before a full write (see _merged_with_disk):
+        # rows from saved_rows on were added since the last save, dropped_sources removed since then
+        self.saved_rows = self.ntotal if saved_rows is None else saved_rows
+        self.dropped_sources = dropped_sources
+        self.replaces_disk = replaces_disk  # reset: the next save replaces the snapshot outright
+        self.raw_base = raw_base        # exact base rows when the base is lossy (IVF-PQ), else None
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal + self.delta.ntotal
+
+    @property
+    def n_gl(self) -> int:
+        return self.labels.n_gl
+
+    def gl_label(self, gl_id: int) -> dict:
+        return self.labels.gl_label(gl_id)
+
+    def search_ids(self, query_vectors: np.ndarray, k: int = FAISS_TOP_K) -> tuple[np.ndarray, np.ndarray]:
+        """See module-level ``search_ids``."""
+        n = len(query_vectors)
+        if self.ntotal == 0 or n == 0:
+            return np.empty((n, 0), dtype=np.float32), np.empty((n, 0), dtype=np.int64)
+
+        actual_k = min(k, self.ntotal)
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        if self.delta.ntotal == 0:
+            distances, indices = self.base.search(query_vectors, actual_k)
+        elif self.base.ntotal == 0:
+            distances, indices = self.delta.search(query_vectors, actual_k)
+        else:
+            distances, indices = _merge_results(
+                self.base.search(query_vectors, min(actual_k, self.base.ntotal)),
+                self.delta.search(query_vectors, min(actual_k, self.delta.ntotal)),
+                self.base.ntotal, actual_k,
+            )
+        return distances, self.labels.gl_id_matrix(indices)
+
+    def evolve(self, **changes) -> "IndexGeneration":
+        """A new generation sharing every field except ``changes``."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return IndexGeneration(**fields)
+
+    def vectors(self) -> np.ndarray:
+        """Every stored vector as it was added, base rows first."""
+        base = self.raw_base if self.raw_base is not None else _reconstruct_all(self.base)
+        return np.vstack([base, _reconstruct_all(self.delta)])
+
+    def writable_copy(self) -> "IndexGeneration":
+        """Private copy for a writer to build the next generation on (the base is shared, not copied)."""
+        return self.evolve(
+            labels=self.labels.copy(),
+            delta=faiss.clone_index(self.delta),
+            prototypes=self.prototypes.copy(),
+        )
+
+    def compacted(self) -> "IndexGeneration":
+        """A generation whose base holds every vector and whose delta is empty."""
+        if self.delta.ntotal == 0:
+            return self.evolve(persisted_delta=0)
+
+        wanted = choose_index_type(self.ntotal)
+        outgrown = (
+            index_type_of(self.base).startswith("ivf")
+            and self.ntotal >= self.trained_size * FAISS_IVF_RETRAIN_GROWTH
+        )
+        if wanted == index_type_of(self.base) and not outgrown:
+            # clone_index would keep viewing a mapped buffer; a serialize round trip owns it
+            base = faiss.deserialize_index(faiss.serialize_index(self.base))
+            _apply_search_params(base)
+            added = _reconstruct_all(self.delta)
+            base.add(added)
+            trained_size = self.trained_size
+            raw_base = None if self.raw_base is None else np.vstack([self.raw_base, added])
+        else:
+            vectors = self.vectors()
+            base = _build_index(wanted, vectors)
+            trained_size = base.ntotal
+            raw_base = _exact_base_rows(base, vectors)
+        return self.evolve(base=base, delta=faiss.IndexFlatL2(EMBEDDING_DIMENSION), trained_size=trained_size,
+                           mapped=False, base_dirty=True, persisted_delta=0, raw_base=raw_base)
+
+
+def _merge_results(base_result, delta_result, offset: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Merge base and delta top-k lists (delta ids shifted by ``offset``) into one top-k."""
+    base_distances, base_indices = base_result
+    delta_distances, delta_indices = delta_result
+    distances = np.hstack([base_distances, delta_distances])
+    indices = np.hstack([base_indices, np.where(delta_indices >= 0, delta_indices + offset, -1)])
+    # Stable sort: on equal distances base rows (lower ids) come first, as in a single index
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+def get_generation() -> IndexGeneration:
+    """
+    Return the current generation, loading (or creating) it on first use.
+
+    Also picks up snapshots published by other workers, see ``maybe_reload``.
+    """
+    if _current is None:
+        with _write_lock:
+            if _current is None:
+                _load_or_create()
+    else:
+        maybe_reload()
+    return _current
+
+
+def get_index() -> faiss.Index:
+    """Return the base FAISS index (vectors not yet compacted into it live in a delta)."""
+    return get_generation().base
+
+
+def _load_or_create():
+    global _current, _dirty
+    if os.path.exists(_INDEX_FILE):
+        _current, _dirty = _read_snapshot(), False
+        print(f"✓ FAISS index loaded from disk ({_current.ntotal} vectors, "
+              f"{index_type_of(_current.base)}, version {_current.version}, "
+              f"{_current.delta.ntotal} in delta segments)")
+    else:
+        _current, _dirty = IndexGeneration(faiss.IndexFlatL2(EMBEDDING_DIMENSION), LabelStore()), False
+        print("✓ New FAISS index created")
+
+
+# ── Snapshots ─────────────────────────────────────────────────────────
+#
+# On disk an index is a base snapshot (index.faiss + label columns) plus
+# append-only delta segments (deltas/<version>.npy vectors + .json labels)
+# listed in segments.json. Saving only writes a new segment; compaction
+# folds the segments back into a new base. VERSION is bumped last.
+
+@contextmanager
+def _snapshot_lock(operation: int):
+    """Cross-process lock on the snapshot files (LOCK_SH to read, LOCK_EX to write)."""
+    with open(_LOCK_FILE, "a") as f:
+        fcntl.flock(f, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_snapshot_version() -> int:
+    """Version of the latest published snapshot (0 = none, or a pre-versioning snapshot)."""
+    try:
+        with open(_VERSION_FILE, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
 
+def _write_snapshot_version(version: int):
+    tmp_file = f"{_VERSION_FILE}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(str(version))
+    os.replace(tmp_file, _VERSION_FILE)
 
-def get_index() -> faiss.IndexFlatL2:
-    """Return the FAISS index, creating one if needed."""
-    global _index
-    if _index is None:
-        if os.path.exists(_INDEX_FILE):
-            _index = faiss.read_index(_INDEX_FILE)
-            _load_labels()
-            print(f"✓ FAISS index loaded from disk ({_index.ntotal} vectors)")
+
+def _read_segments() -> list[str]:
+    try:
+        with open(_SEGMENTS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)["segments"]
+    except FileNotFoundError:
+        return []
+
+
+def _write_segments(segments: list[str]):
+    tmp_file = f"{_SEGMENTS_FILE}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"segments": segments}, f)
+    os.replace(tmp_file, _SEGMENTS_FILE)
+
+
+def _prototypes_fingerprint(labels: LabelStore, rows: int) -> str:
+    """Fingerprint of the labels behind the first ``rows`` vectors (the base snapshot)."""
+    return GLPrototypes.fingerprint(labels.gl_ids[:rows], labels.gl_codes)
+
+
+def _read_snapshot(locked: bool = False) -> IndexGeneration:
+    """Load the base snapshot and replay its delta segments as one consistent generation."""
+    if not locked:
+        with _snapshot_lock(fcntl.LOCK_SH):
+            return _read_snapshot(locked=True)
+
+    version = read_snapshot_version()
+    # Snapshots are only ever replaced, never rewritten in place, so
+    # every worker can map the same file and share its pages.
+    base = faiss.read_index(_INDEX_FILE, _MMAP_FLAGS if FAISS_MMAP else 0)
+    _apply_search_params(base)
+    labels = _read_labels()
+    raw_base = _read_base_vectors(base)
+    prototypes = GLPrototypes.load(_PROTOTYPES_FILE, EMBEDDING_DIMENSION, base.ntotal,
+                                   _prototypes_fingerprint(labels, base.ntotal))
+    if prototypes is None:
+        base_vectors = raw_base if raw_base is not None else _reconstruct_all(base)
+        prototypes = GLPrototypes.from_vectors(base_vectors, labels.gl_ids, EMBEDDING_DIMENSION)
+
+    delta = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+    for name in _read_segments():
+        vectors = np.load(os.path.join(_DELTA_DIR, f"{name}.npy"))
+        delta.add(vectors)
+        with open(os.path.join(_DELTA_DIR, f"{name}.json"), "r", encoding="utf-8") as f:
+            labels.append(json.load(f))
+        prototypes.add(vectors, labels.gl_ids[len(labels) - len(vectors):])
+    return IndexGeneration(base, labels, delta, mapped=FAISS_MMAP, version=version, prototypes=prototypes,
+                           raw_base=raw_base)
+
+
+def _read_base_vectors(base: faiss.Index) -> np.ndarray | None:
+    """The float vectors saved beside a lossy base (None if not lossy, or saved before they were kept)."""
+    if not isinstance(base, faiss.IndexIVFPQ) or not os.path.exists(_BASE_VECTORS_FILE):
+        return None
+    vectors = np.load(_BASE_VECTORS_FILE, mmap_mode="r" if FAISS_MMAP else None)
+    return vectors if len(vectors) == base.ntotal else None
+
+
+def maybe_reload(force: bool = False) -> bool:
+    """
+    Hot-swap to a newer snapshot saved by another worker (e.g. after a retrain).
+
+    The version file is checked at most every FAISS_VERSION_CHECK_INTERVAL
+    seconds. The new snapshot is loaded completely before it is published, so
+    in-flight searches finish on the generation they started with, and only
+    one thread per process loads while the others keep searching. Unsaved local
+    changes are never replaced.
+
+    Returns True if a newer snapshot was swapped in.
+    """
+    global _current, _last_version_check
+    if _current is None or _dirty:
+        return False
+    now = time.monotonic()
+    if not force and now - _last_version_check < FAISS_VERSION_CHECK_INTERVAL:
+        return False
+    _last_version_check = now
+    if read_snapshot_version() <= _current.version:
+        return False
+
+    if not _write_lock.acquire(blocking=force):
+        return False  # a writer or another reloader is busy; keep serving the current generation
+    try:
+        if _dirty or read_snapshot_version() <= _current.version:
+            return False
+        _current = _read_snapshot()
+    finally:
+        _write_lock.release()
+    print(f"⟳ FAISS index reloaded (version {_current.version}, {_current.ntotal} vectors)")
+    return True
+
+
+@contextmanager
+def _next_generation():
+    """
+    Build the next generation and publish it on success.
+
+    Writers are serialized; the draft starts from the latest snapshot (so a
+    retrain never drops another worker's vectors) and is invisible to readers
+    until the block finishes.
+    """
+    global _current, _dirty
+    with _write_lock:
+        get_generation()
+        maybe_reload(force=True)
+        draft = _current.writable_copy()
+        yield draft
+        _current, _dirty = draft, True
+
+
+# ── Index types ───────────────────────────────────────────────────────
+def choose_index_type(n_vectors: int) -> str:
+    """Pick the index type for an index holding ``n_vectors`` vectors."""
+    index_type = FAISS_INDEX_TYPE
+    if index_type == "auto":
+        if n_vectors >= FAISS_IVF_MIN_VECTORS:
+            index_type = "ivf_pq"
+        elif n_vectors >= FAISS_HNSW_MIN_VECTORS:
+            index_type = "hnsw"
         else:
-            _index = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
-            print("✓ New FAISS index created")
-    return _index
+            index_type = "flat"
+
+    if index_type.startswith("ivf") and n_vectors < FAISS_IVF_MIN_TRAIN:
+        return "flat"  # not enough vectors to train the coarse quantizer yet
+    return index_type
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
 
+def _build_index(index_type: str, vectors: np.ndarray) -> faiss.Index:
+    """Create (and train, for IVF) an index of ``index_type`` holding ``vectors``."""
+    dim = EMBEDDING_DIMENSION
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M)
+        index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        # ≈ 4·√N lists, keeping ≥ 39 training points per list as FAISS recommends
+        nlist = FAISS_IVF_NLIST or max(1, min(int(4 * math.sqrt(len(vectors))), len(vectors) // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, FAISS_PQ_M, 8)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlatL2(dim)
+
+    if len(vectors):
+        index.add(vectors)
+    _apply_search_params(index)
+    return index
+
+
+def _apply_search_params(index: faiss.Index):
+    """Apply query-time knobs (efSearch / nprobe) from config."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = FAISS_IVF_NPROBE
+
+
+def _exact_base_rows(base: faiss.Index, vectors: np.ndarray) -> np.ndarray | None:
+    """What to keep as ``raw_base`` for a base built from ``vectors``: only IVF-PQ codes are lossy."""
+    return vectors if isinstance(base, faiss.IndexIVFPQ) else None
+
+
+def _reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Read every stored vector back out of the index (lossy for IVF-PQ)."""
+    if index.ntotal == 0:
+        return np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
 
-def _load_labels():
-    """Load label metadata from disk."""
-    global _labels
-    if os.path.exists(_LABELS_FILE):
-        with open(_LABELS_FILE, "r", encoding="utf-8") as f:
-            _labels = json.load(f)
 
+def _maybe_rebuild(draft: IndexGeneration):
+    """Rebuild the draft index when its size crosses a type threshold or outgrows its IVF training."""
+    current = index_type_of(draft.base)
+    wanted = choose_index_type(draft.ntotal)
+    outgrown = (
+        current.startswith("ivf")
+        and draft.ntotal >= draft.trained_size * FAISS_IVF_RETRAIN_GROWTH
+    )
+    if wanted == current and not outgrown:
+        return
 
-def _save_labels():
+    print(f"⟳ Rebuilding FAISS index: {current} → {wanted} ({draft.ntotal} vectors)")
+    vectors = draft.vectors()
+    draft.base = _build_index(wanted, vectors)
+    draft.raw_base = _exact_base_rows(draft.base, vectors)
+    draft.delta = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+    draft.trained_size = draft.base.ntotal
+    draft.mapped = False
+    draft.base_dirty = True
+    draft.persisted_delta = 0
+
+
+def get_index_info() -> dict:
+    """Index type and search parameters, for status reporting."""
+    generation = get_generation()
+    base = generation.base
+    info = {
+        "type": index_type_of(base),
+        "total_vectors": generation.ntotal,
+        "delta_vectors": generation.delta.ntotal,
+        "version": generation.version,
+    }
+    if isinstance(base, faiss.IndexHNSW):
+        info["efSearch"] = base.hnsw.efSearch
+    elif isinstance(base, faiss.IndexIVF):
+        info.update(nlist=base.nlist, nprobe=base.nprobe)
+    return info
+
+
+def _read_labels() -> LabelStore:
+    """Load label metadata from disk (migrating a legacy labels.json)."""
+    if LabelStore.exists(FAISS_INDEX_DIR):
+        return LabelStore.load(FAISS_INDEX_DIR, memory_map=FAISS_MMAP)
+    if os.path.exists(_LEGACY_LABELS_FILE):
+        with open(_LEGACY_LABELS_FILE, "r", encoding="utf-8") as f:
+            return LabelStore.from_dicts(json.load(f))
+    return LabelStore()
+
+
+def _save_labels(labels: LabelStore):
     """Persist label metadata to disk."""
-    with open(_LABELS_FILE, "w", encoding="utf-8") as f:
-        json.dump(_labels, f, indent=2, ensure_ascii=False)
+    labels.save(FAISS_INDEX_DIR)
+    if os.path.exists(_LEGACY_LABELS_FILE):
+        os.remove(_LEGACY_LABELS_FILE)
 
 
 def save_index():
-    """Persist FAISS index to disk."""
-    index = get_index()
-    faiss.write_index(index, _INDEX_FILE)
-    _save_labels()
-    print(f"✓ FAISS index saved ({index.ntotal} vectors)")
+    """
+    Persist the index to disk as the next snapshot version.
+
+    Only vectors added since the last save are written, as a new delta segment;
+    the base is rewritten only after a rebuild or removal. Once the segments
+    grow past FAISS_DELTA_COMPACT_* they are folded into the base in the background.
+    """
+    global _current, _dirty
+    with _write_lock:
+        generation = get_generation()
+        with _snapshot_lock(fcntl.LOCK_EX):
+            disk_version = read_snapshot_version()
+            if generation.base_dirty or not os.path.exists(_INDEX_FILE):
+                generation = _write_base(_merged_with_disk(generation, disk_version).compacted(), disk_version)
+                written = "full snapshot"
+            elif generation.delta.ntotal > generation.persisted_delta:
+                written = f"{generation.delta.ntotal - generation.persisted_delta} vectors in a delta segment"
+                generation = _write_delta(generation, disk_version)
+            else:
+                _dirty = False
+                return
+        _current, _dirty = generation, False
+    print(f"✓ FAISS index saved ({generation.ntotal} vectors, {written}, version {read_snapshot_version()})")
+
+    if _needs_compaction(generation):
+        schedule_compaction()
+
+
+def _write_base(generation: IndexGeneration, disk_version: int) -> IndexGeneration:
+    """Write a compacted generation as the new base and drop every delta segment (EX lock held)."""
+    # Write-then-rename: workers mapping the previous snapshot keep a valid file
+    tmp_file = f"{_INDEX_FILE}.tmp"
+    faiss.write_index(generation.base, tmp_file)
+    os.replace(tmp_file, _INDEX_FILE)
+    _save_labels(generation.labels)
+    generation.prototypes.save(_PROTOTYPES_FILE, generation.base.ntotal,
+                               _prototypes_fingerprint(generation.labels, generation.base.ntotal))
+    if generation.raw_base is not None:
+        with open(f"{_BASE_VECTORS_FILE}.tmp", "wb") as f:
+            np.save(f, generation.raw_base)
+        os.replace(f"{_BASE_VECTORS_FILE}.tmp", _BASE_VECTORS_FILE)
+    elif os.path.exists(_BASE_VECTORS_FILE):
+        os.remove(_BASE_VECTORS_FILE)
+
+    stale = _read_segments()
+    _write_segments([])
+    # Bumped last: other workers only pick up a fully written snapshot
+    version = max(disk_version, generation.version) + 1
+    _write_snapshot_version(version)
+    for name in stale:
+        for ext in (".npy", ".json"):
+            path = os.path.join(_DELTA_DIR, name + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+    return generation.evolve(version=version, base_dirty=False, saved_rows=generation.ntotal,
+                             dropped_sources=frozenset(), replaces_disk=False)
+
+
+def _write_delta(generation: IndexGeneration, disk_version: int) -> IndexGeneration:
+    """Append the unsaved delta rows as a new segment (EX lock held)."""
+    start, end = generation.persisted_delta, generation.delta.ntotal
+    offset = generation.base.ntotal
+    version = max(disk_version, generation.version) + 1
+    name = f"{version:010d}"
+
+    os.makedirs(_DELTA_DIR, exist_ok=True)
+    np.save(os.path.join(_DELTA_DIR, f"{name}.npy"), generation.delta.reconstruct_n(start, end - start))
+    with open(os.path.join(_DELTA_DIR, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump([generation.labels.label(offset + i) for i in range(start, end)], f, ensure_ascii=False)
+    _write_segments(_read_segments() + [name])
+    _write_snapshot_version(version)
+
+    # Segments other workers appended since our last load are not in memory yet;
+    # keeping the old version makes the next check reload them.
+    published = version if disk_version == generation.version else generation.version
+    return generation.evolve(version=published, persisted_delta=end, saved_rows=generation.ntotal)
+
+
+def _merged_with_disk(generation: IndexGeneration, disk_version: int) -> IndexGeneration:
+    """
+    ``generation`` including what other workers published since it was loaded (EX lock held).
+
+    A full snapshot replaces every delta segment, so when the disk has moved
+    on, the latest snapshot is read and this generation's unsaved changes are
+    replayed on top: its source removals, then the rows it added since its
+    last save.
+    """
+    if generation.replaces_disk or disk_version <= generation.version:
+        return generation
+
+    merged = _read_snapshot(locked=True)
+    if generation.dropped_sources:
+        _drop_sources(merged, generation.dropped_sources)
+    start = generation.saved_rows
+    if start < generation.ntotal:
+        _append_rows(
+            merged,
+            _rows_from(generation, start),
+            [generation.labels.label(i) for i in range(start, generation.ntotal)],
+        )
+    return merged
+
+
+def _rows_from(generation: IndexGeneration, start: int) -> np.ndarray:
+    """Vectors of rows ``start``… of a generation (base rows first, then delta rows)."""
+    offset = generation.base.ntotal
+    if start >= offset:
+        return generation.delta.reconstruct_n(start - offset, generation.delta.ntotal - (start - offset))
+    return generation.vectors()[start:]
+
+
+# ── Compaction ────────────────────────────────────────────────────────
+def _needs_compaction(generation: IndexGeneration) -> bool:
+    return (
+        len(_read_segments()) >= FAISS_DELTA_COMPACT_SEGMENTS
+        or generation.persisted_delta > FAISS_DELTA_COMPACT_FRACTION * generation.base.ntotal
+    )
+
+
+def compact_index() -> bool:
+    """
+    Fold all delta segments into a new base snapshot.
+
+    Returns False if there was nothing to fold.
+    """
+    global _current, _dirty
+    with _write_lock:
+        generation = get_generation()
+        with _snapshot_lock(fcntl.LOCK_EX):
+            disk_version = read_snapshot_version()
+            # Include segments other workers appended since our last load
+            generation = _merged_with_disk(generation, disk_version)
+            if generation.delta.ntotal == 0 and not generation.base_dirty:
+                return False
+            folded = generation.delta.ntotal
+            generation = _write_base(generation.compacted(), disk_version)
+        _current, _dirty = generation, False
+    print(f"✓ FAISS index compacted ({folded} delta vectors folded into the base, version {generation.version})")
+    return True
+
+
+def schedule_compaction():
+    """Run ``compact_index`` in a background thread (at most one per process)."""
+    global _compaction
+    if _compaction is not None and _compaction.is_alive():
+        return
+    _compaction = threading.Thread(target=_compact_in_background, name="faiss-compaction", daemon=True)
+    _compaction.start()
+
+
+def wait_for_compaction():
+    """Block until a scheduled compaction has finished (e.g. before forking workers)."""
+    if _compaction is not None:
+        _compaction.join()
+
+
+def _compact_in_background():
+    try:
+        compact_index()
+    except Exception as e:
+        print(f"⚠ FAISS compaction failed: {e}")
 
 
 def add_vectors(embeddings: np.ndarray, labels: list[dict]):
     """
     Add vectors to the FAISS index.
 
+    New vectors go to the generation's delta; see ``save_index``.
+
     Args:
         embeddings: (N, dim) float32 array
         labels: list of dicts with at least {gl_code, gl_name}
     """
-    global _labels
-    index = get_index()
-    index.add(embeddings)
-    _labels.extend(labels)
+    with _next_generation() as draft:
+        _append_rows(draft, np.ascontiguousarray(embeddings, dtype=np.float32), labels)
+        _maybe_rebuild(draft)
+
+
+def _append_rows(draft: IndexGeneration, embeddings: np.ndarray, labels: list[dict]):
+    draft.delta.add(embeddings)
+    draft.labels.append(labels)
+    draft.prototypes.add(embeddings, draft.labels.gl_ids[len(draft.labels) - len(embeddings):])
 
 
 def search(query_vector: np.ndarray, k: int = FAISS_TOP_K) -> tuple[list[float], list[dict]]:
@@ -73,30 +684,122 @@ def search(query_vector: np.ndarray, k: int = FAISS_TOP_K) -> tuple[list[float],
         distances: list of L2 distances
         results: list of label dicts for each neighbor
     """
-    index = get_index()
-    if index.ntotal == 0:
-        return [], []
+    generation = get_generation()
 
     # Ensure proper shape
     if query_vector.ndim == 1:
         query_vector = query_vector.reshape(1, -1)
 
-    actual_k = min(k, index.ntotal)
-    distances, indices = index.search(query_vector, actual_k)
+    distances, gl_ids = generation.search_ids(query_vector, k)
+    if gl_ids.shape[1] == 0:
+        return [], []
 
-    result_distances = distances[0].tolist()
-    result_labels = [_labels[i] for i in indices[0] if i < len(_labels)]
+    result_labels = [generation.gl_label(g) for g in gl_ids[0].tolist() if g >= 0]
+    result_distances = distances[0][:len(result_labels)].tolist()
 
     return result_distances, result_labels
 
 
+def search_ids(query_vectors: np.ndarray, k: int = FAISS_TOP_K) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Search the K nearest neighbors for N queries with a single FAISS call.
+
+    Only touches the integer GL-id column of the label store. GL ids are only
+    stable within one generation: callers resolving them with ``get_gl_label``
+    while a retrain runs should use ``get_generation().search_ids`` instead.
+
+    Returns:
+        distances: (N, k) array of L2 distances
+        gl_ids: (N, k) array of neighbor GL ids (-1 = no neighbor), see ``get_gl_label``
+    """
+    return get_generation().search_ids(query_vectors, k)
+
+
+def search_batch(
+    query_vectors: np.ndarray, k: int = FAISS_TOP_K
+) -> tuple[np.ndarray, list[list[dict]]]:
+    """
+    Search the K nearest neighbors for N queries with a single FAISS call.
+
+    Returns:
+        distances: (N, k) array of L2 distances
+        results: per-query lists of label dicts for each neighbor
+    """
+    generation = get_generation()
+    distances, gl_ids = generation.search_ids(query_vectors, k)
+    results = [[generation.gl_label(g) for g in row if g >= 0] for row in gl_ids.tolist()]
+    return distances, results
+
+
+def get_gl_label(gl_id: int) -> dict:
+    """``{gl_code, gl_name}`` for a GL id returned by ``search_ids``."""
+    return get_generation().gl_label(gl_id)
+
+
+def get_gl_count() -> int:
+    """Number of distinct GL ids in the label store."""
+    return get_generation().n_gl
+
+
+def get_labels(sources) -> list[dict]:
+    """Materialize the full label dicts of every vector from ``sources``."""
+    labels = get_generation().labels
+    return [labels.label(int(i)) for i in np.flatnonzero(labels.source_mask(sources))]
+
+
+def remove_sources(sources) -> int:
+    """
+    Drop every vector whose label source is in ``sources`` and rebuild the index.
+
+    Returns the number of vectors removed.
+    """
+    with _write_lock:
+        if not get_generation().labels.source_mask(sources).any():
+            return 0
+
+        with _next_generation() as draft:
+            removed = _drop_sources(draft, sources)
+
+    print(f"✓ Removed {removed} vectors ({', '.join(sorted(s or 'untagged' for s in sources))})")
+    return removed
+
+
+def _drop_sources(draft: IndexGeneration, sources) -> int:
+    """Rebuild ``draft`` without the vectors from ``sources``; returns how many were dropped."""
+    remove = draft.labels.source_mask(sources)
+    keep = np.flatnonzero(~remove)
+    vectors = draft.vectors()[keep]
+    draft.labels = draft.labels.take(keep)
+    draft.prototypes = GLPrototypes.from_vectors(vectors, draft.labels.gl_ids, EMBEDDING_DIMENSION)
+    draft.base = _build_index(choose_index_type(len(keep)), vectors)
+    draft.raw_base = _exact_base_rows(draft.base, vectors)
+    draft.delta = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
+    draft.trained_size = draft.base.ntotal
+    draft.mapped = False
+    draft.base_dirty = True
+    draft.persisted_delta = 0
+    draft.saved_rows = int(np.count_nonzero(keep < draft.saved_rows))
+    draft.dropped_sources = draft.dropped_sources | frozenset(sources)
+    return int(remove.sum())
+
+
 def get_total_vectors() -> int:
     """Return the total number of vectors in the index."""
-    return get_index().ntotal
+    return get_generation().ntotal
+
+
+def release_index():
+    """Drop the in-memory index; the next access maps the on-disk snapshot again."""
+    global _current, _dirty
+    with _write_lock:
+        _current, _dirty = None, False
 
 
 def reset_index():
     """Reset the FAISS index (for testing)."""
-    global _index, _labels
-    _index = faiss.IndexFlatL2(EMBEDDING_DIMENSION)
-    _labels = []
+    global _current, _dirty
+    with _write_lock:
+        _current = IndexGeneration(
+            faiss.IndexFlatL2(EMBEDDING_DIMENSION), LabelStore(), base_dirty=True, replaces_disk=True
+        )
+        _dirty = True
@@ -3,7 +3,7 @@
 from datetime import datetime
 
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, Text, ForeignKey
+    Column, Integer, String, Float, DateTime, Text, ForeignKey, Index
 )
 from sqlalchemy.orm import relationship
 
@@ -44,11 +44,15 @@ class Transaction(Base):
         return f"<Transaction #{self.id}: {self.description[:40]}>"
 
 
+# Prediction statuses that wait in the human review queue
+REVIEW_STATUSES = ("pending_review", "manual_required")
+
+
 class Prediction(Base):
     __tablename__ = "predictions"
 
     id = Column(Integer, primary_key=True, index=True)
-    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=False)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=False, index=True)
     predicted_gl_code = Column(String(10), nullable=False)
     predicted_gl_name = Column(String(200), nullable=True)
     confidence_score = Column(Float, nullable=False)
@@ -63,6 +67,13 @@ class Prediction(Base):
     transaction = relationship("Transaction", back_populates="predictions")
     corrections = relationship("Correction", back_populates="prediction")
 
+    __table_args__ = (
+        # Newest-first listing filtered by status (keyset on id)
+        Index("ix_predictions_status_id", "status", "id"),
+        # Review queue: each queued status walked in (confidence_score, id) order
+        Index("ix_predictions_status_confidence", "status", "confidence_score", "id"),
+    )
+
     def __repr__(self):
         return f"<Prediction TXN#{self.transaction_id} → {self.predicted_gl_code} ({self.confidence_score}%)>"
 
@@ -112,9 +123,79 @@ class ERPPosting(Base):
     amount = Column(Float, nullable=False)
     erp_response_code = Column(String(10), nullable=True)
     erp_response_message = Column(Text, nullable=True)
+    erp_reference = Column(String(50), nullable=True)  # ERP document / line reference
+    journal_batch = Column(String(50), nullable=True)  # ERP journal batch the line was posted in
     posted_at = Column(DateTime, default=datetime.utcnow)
 
     transaction = relationship("Transaction", back_populates="erp_postings")
 
     def __repr__(self):
         return f"<ERPPosting TXN#{self.transaction_id} → {self.gl_code}>"
+
+
+class ERPOutbox(Base):
+    __tablename__ = "erp_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=False)
+    gl_code = Column(String(10), nullable=False)
+    amount = Column(Float, nullable=False)
+    description = Column(Text, nullable=True)
+    posting_date = Column(DateTime, nullable=True)  # transaction date; journal batches group by it
+    reason = Column(String(30), nullable=False)  # auto_posted | approved | rejected (what triggered it)
+    actor = Column(String(100), nullable=False, default="system")
+    status = Column(String(20), nullable=False, default="pending")
+    # Values: pending | in_flight | posted | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claim_id = Column(String(40), nullable=True)  # worker claim that holds the entry
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_erp_outbox_status_due", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<ERPOutbox #{self.id} TXN#{self.transaction_id} → {self.gl_code} [{self.status}]>"
+
+
+class ClassificationJob(Base):
+    __tablename__ = "classification_jobs"
+
+    id = Column(String(20), primary_key=True)  # JOB-XXXXXXXX
+    status = Column(String(20), nullable=False, default="queued", index=True)
+    # Values: queued | running | completed | failed | cancelled
+    batch_id = Column(String(50), nullable=True)
+    transaction_ids = Column(Text, nullable=True)  # JSON list, None = all unclassified
+    total = Column(Integer, nullable=True)  # unclassified rows at the first run
+    processed = Column(Integer, nullable=False, default=0)
+    auto_posted = Column(Integer, nullable=False, default=0)
+    pending_review = Column(Integer, nullable=False, default=0)
+    manual_required = Column(Integer, nullable=False, default=0)
+    checkpoint_id = Column(Integer, nullable=False, default=0)  # last transaction id committed
+    cancel_requested = Column(Integer, nullable=False, default=0)
+    owner = Column(String(100), nullable=True)  # claim token of the worker thread holding the job
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)  # start of the current run
+    run_start_processed = Column(Integer, nullable=False, default=0)  # ``processed`` at started_at
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ClassificationJob {self.id} [{self.status}] {self.processed}/{self.total}>"
+
+
+class DashboardCounter(Base):
+    """One dashboard number, kept up to date by the writes that change it."""
+
+    __tablename__ = "dashboard_counters"
+
+    name = Column(String(40), primary_key=True)  # see app.services.dashboard_stats.COUNTERS
+    value = Column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<DashboardCounter {self.name}={self.value}>"
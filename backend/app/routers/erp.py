@@ -2,47 +2,38 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from app.database import get_db
-from app.models import (
-    Transaction, Prediction, Correction, AuditLog, ERPPosting
-)
 from app.schemas import DashboardStats, RetrainResponse
-from app.services.erp_client import post_to_erp
+from app.services.dashboard_stats import dashboard_stats, read_counters, recompute_counters
 from app.services.retrainer import retrain_from_corrections
-from app.ml.vector_store import get_total_vectors
+from app.services.classifier import get_pipeline_stats
+from app.services.erp_outbox import get_outbox_stats
+from app.ml.vector_store import get_total_vectors, get_index_info
+from app.ml.embeddings import get_cache_stats, get_model_id
+from app.ml.batcher import get_batcher_stats
+from app.ml.exact_match import get_exact_match_stats
+from app.ml.linear_head import get_linear_head_stats
 
 router = APIRouter(prefix="/api", tags=["ERP & Dashboard"])
 
 
 @router.get("/dashboard/stats", response_model=DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db)):
-    """Get summary statistics for the dashboard."""
-    total_txn = db.query(func.count(Transaction.id)).scalar() or 0
-    total_pred = db.query(func.count(Prediction.id)).scalar() or 0
-    auto_posted = db.query(func.count(Prediction.id)).filter(Prediction.status == "auto_posted").scalar() or 0
-    pending_review = db.query(func.count(Prediction.id)).filter(Prediction.status == "pending_review").scalar() or 0
-    manual_required = db.query(func.count(Prediction.id)).filter(Prediction.status == "manual_required").scalar() or 0
-    approved = db.query(func.count(Prediction.id)).filter(Prediction.status == "approved").scalar() or 0
-    rejected = db.query(func.count(Prediction.id)).filter(Prediction.status == "rejected").scalar() or 0
-    avg_conf = db.query(func.avg(Prediction.confidence_score)).scalar() or 0.0
-    total_corrections = db.query(func.count(Correction.id)).scalar() or 0
-    correction_rate = (total_corrections / total_pred * 100) if total_pred > 0 else 0.0
-    total_erp = db.query(func.count(ERPPosting.id)).scalar() or 0
+def get_dashboard_stats(exact: bool = False, db: Session = Depends(get_db)):
+    """
+    Get summary statistics for the dashboard.
 
-    return DashboardStats(
-        total_transactions=total_txn,
-        total_predictions=total_pred,
-        auto_posted_count=auto_posted,
-        pending_review_count=pending_review,
-        manual_required_count=manual_required,
-        approved_count=approved,
-        rejected_count=rejected,
-        avg_confidence=round(avg_conf, 2),
-        correction_rate=round(correction_rate, 2),
-        total_erp_postings=total_erp,
-    )
+    Read from the incrementally maintained counters; ``exact=true`` recounts
+    them from the tables (and stores the recount) for verification.
+    """
+    counters = recompute_counters(db) if exact else read_counters(db)
+    return DashboardStats(**dashboard_stats(counters))
+
+
+@router.get("/erp/outbox")
+def erp_outbox_status(db: Session = Depends(get_db)):
+    """ERP outbox backlog and delivery counters."""
+    return get_outbox_stats(db)
 
 
 @router.post("/ml/retrain", response_model=RetrainResponse)
@@ -61,6 +52,12 @@ def ml_status():
     """Get ML model / vector store status."""
     return {
         "total_vectors": get_total_vectors(),
-        "model": "all-MiniLM-L6-v2",
+        "model": get_model_id(),
         "embedding_dimension": 384,
+        "index": get_index_info(),
+        "embedding_cache": get_cache_stats(),
+        "micro_batching": get_batcher_stats(),
+        "exact_match": get_exact_match_stats(),
+        "linear_head": get_linear_head_stats(),
+        "batch_pipeline": get_pipeline_stats(),
     }
@@ -0,0 +1,54 @@
+"""Background classification job endpoints."""
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models import ClassificationJob
+from app.schemas import JobRead
+from app.services.jobs import cancel_job, resume_job, job_progress
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+
+@router.get("", response_model=list[JobRead])
+def list_jobs(
+    limit: int = 20,
+    status: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Most recent classification jobs."""
+    query = db.query(ClassificationJob)
+    if status:
+        query = query.filter(ClassificationJob.status == status)
+    jobs = query.order_by(ClassificationJob.created_at.desc()).limit(limit).all()
+    return [job_progress(job) for job in jobs]
+
+
+@router.get("/{job_id}", response_model=JobRead)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    """Progress of one job: rows done, rows per second and ETA."""
+    job = db.get(ClassificationJob, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job_progress(job)
+
+
+@router.post("/{job_id}/cancel", response_model=JobRead)
+def cancel(job_id: str, db: Session = Depends(get_db)):
+    """Cancel a job (a running job stops after its current chunk)."""
+    job = cancel_job(db, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job_progress(job)
+
+
+@router.post("/{job_id}/resume", response_model=JobRead)
+def resume(job_id: str, db: Session = Depends(get_db)):
+    """Re-queue a cancelled or failed job from its last checkpoint."""
+    job = resume_job(db, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    if job.status not in ("queued", "running"):
+        raise HTTPException(400, f"Cannot resume job with status '{job.status}'")
+    return job_progress(job)
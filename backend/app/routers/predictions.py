@@ -2,23 +2,36 @@
 
 import json
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session, joinedload
 
 from app.database import get_db
-from app.models import Prediction, Transaction
-from app.schemas import PredictionRead, ClassifyRequest, ClassifyResponse, CandidateGL
-from app.services.classifier import classify_batch
+from app.models import Prediction
+from app.schemas import PredictionRead, ClassifyRequest, ClassifyResponse, CandidateGL, JobRead
+from app.services.classifier import classify_batch, stream_classify_batch
+from app.services.jobs import submit_job, job_progress
+from app.utils.pagination import decode_cursor, set_next_cursor
 
 router = APIRouter(prefix="/api/predictions", tags=["Predictions"])
 
 
-@router.post("/classify", response_model=ClassifyResponse)
+@router.post("/classify", response_model=ClassifyResponse | JobRead)
 def classify_transactions(
     request: ClassifyRequest,
     db: Session = Depends(get_db),
 ):
-    """Classify unclassified transactions and route based on confidence."""
+    """
+    Classify unclassified transactions and route based on confidence.
+
+    With ``background: true`` the run is queued as a job and the response is
+    202 with the job (poll ``/api/jobs/{job_id}`` for progress).
+    """
+    if request.background:
+        job = submit_job(db, transaction_ids=request.transaction_ids, batch_id=request.batch_id)
+        return JSONResponse(jsonable_encoder(JobRead(**job_progress(job))), status_code=202)
+
     result = classify_batch(
         db,
         transaction_ids=request.transaction_ids,
@@ -27,17 +40,57 @@ def classify_transactions(
     return ClassifyResponse(**result)
 
 
+@router.post("/classify/stream")
+def classify_transactions_stream(
+    request: ClassifyRequest,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    db: Session = Depends(get_db),
+):
+    """
+    Classify like ``/classify`` but stream each transaction's result as soon
+    as its chunk is committed.
+
+    ``format=ndjson`` (default) writes one JSON object per line;
+    ``format=sse`` writes Server-Sent Events. Every message has a ``type``:
+    ``prediction`` per transaction, then a final ``summary`` with the counts
+    (or ``error``).
+    """
+    events = stream_classify_batch(db, transaction_ids=request.transaction_ids, batch_id=request.batch_id)
+    if format == "sse":
+        return StreamingResponse(
+            _encode_events(events, sse=True), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+        )
+    return StreamingResponse(_encode_events(events, sse=False), media_type="application/x-ndjson")
+
+
+def _encode_events(events, sse: bool):
+    try:
+        for event in events:
+            payload = json.dumps(event)
+            yield f"event: {event['type']}\ndata: {payload}\n\n" if sse else payload + "\n"
+    finally:
+        events.close()  # client went away: stop the classification run
+
+
 @router.get("", response_model=list[PredictionRead])
 def list_predictions(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: str | None = None,
     status: str | None = None,
     min_confidence: float | None = None,
     max_confidence: float | None = None,
     db: Session = Depends(get_db),
 ):
-    """List predictions with optional filters."""
-    query = db.query(Prediction)
+    """
+    List predictions with optional filters, newest first.
+
+    Pages by keyset: pass the ``X-Next-Cursor`` response header back as
+    ``cursor`` to get the next page (no header = last page). ``skip`` still
+    works but makes the database walk every skipped row.
+    """
+    query = db.query(Prediction).options(joinedload(Prediction.transaction))
 
     if status:
         query = query.filter(Prediction.status == status)
@@ -45,13 +98,18 @@ def list_predictions(
         query = query.filter(Prediction.confidence_score >= min_confidence)
     if max_confidence is not None:
         query = query.filter(Prediction.confidence_score <= max_confidence)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        query = query.filter(Prediction.id < last_id)
+    elif skip:
+        query = query.offset(skip)
 
-    predictions = query.order_by(Prediction.id.desc()).offset(skip).limit(limit).all()
+    predictions = query.order_by(Prediction.id.desc()).limit(limit).all()
+    set_next_cursor(response, predictions, limit, lambda pred: (pred.id,))
 
-    # Parse top_candidates JSON and attach transaction data
+    # Parse top_candidates JSON; the transaction came with the same query
     result = []
     for pred in predictions:
-        txn = db.query(Transaction).get(pred.transaction_id)
         candidates = []
         if pred.top_candidates:
             try:
@@ -69,7 +127,7 @@ def list_predictions(
             routed_action=pred.routed_action,
             top_candidates=candidates,
             created_at=pred.created_at,
-            transaction=txn,
+            transaction=pred.transaction,
         ))
 
     return result
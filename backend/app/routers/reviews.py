@@ -1,39 +1,55 @@
 """Human review queue endpoints – approve / reject with corrections."""
 
+import heapq
 import json
 from datetime import datetime
+from itertools import islice
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, joinedload
 
 from app.database import get_db
-from app.models import Prediction, Correction, Transaction, ERPPosting
+from app.models import Prediction, Correction, Transaction, REVIEW_STATUSES
 from app.schemas import PredictionRead, ReviewAction, CandidateGL
-from app.services.erp_client import post_to_erp
+from app.services.erp_outbox import enqueue_posting
+from app.services.dashboard_stats import bump
+from app.ml.exact_match import record_review
 from app.utils.audit_logger import log_audit
+from app.utils.pagination import decode_cursor, set_next_cursor
 
 router = APIRouter(prefix="/api/reviews", tags=["Reviews"])
 
 
 @router.get("/queue", response_model=list[PredictionRead])
 def get_review_queue(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: str | None = None,
     db: Session = Depends(get_db),
 ):
-    """Get all predictions pending human review."""
-    predictions = (
-        db.query(Prediction)
-        .filter(Prediction.status.in_(["pending_review", "manual_required"]))
-        .order_by(Prediction.confidence_score.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    """
+    Get all predictions pending human review, most confident first.
+
+    Pages by keyset on (confidence_score, id): pass the ``X-Next-Cursor``
+    response header back as ``cursor`` for the next page.
+    """
+    after = tuple(decode_cursor(cursor, 2)) if cursor else None
+    if after:
+        skip = 0
+
+    # One index range per queued status (an IN over both would have to be
+    # sorted as a whole), merged into a single confidence-ordered page
+    pages = [_queue_page(db, status, after, skip + limit) for status in REVIEW_STATUSES]
+    predictions = list(islice(
+        heapq.merge(*pages, key=lambda pred: (-pred.confidence_score, -pred.id)),
+        skip, skip + limit,
+    ))
+    set_next_cursor(response, predictions, limit, lambda pred: (pred.confidence_score, pred.id))
 
     result = []
     for pred in predictions:
-        txn = db.query(Transaction).get(pred.transaction_id)
         candidates = []
         if pred.top_candidates:
             try:
@@ -51,56 +67,53 @@ def get_review_queue(
             routed_action=pred.routed_action,
             top_candidates=candidates,
             created_at=pred.created_at,
-            transaction=txn,
+            transaction=pred.transaction,
         ))
 
     return result
 
 
+def _queue_page(db: Session, status: str, after: tuple | None, limit: int) -> list[Prediction]:
+    """Top ``limit`` predictions of one review status below the ``after`` sort key."""
+    query = (
+        db.query(Prediction)
+        .options(joinedload(Prediction.transaction))
+        .filter(Prediction.status == status)
+    )
+    if after:
+        query = query.filter(tuple_(Prediction.confidence_score, Prediction.id) < after)
+    return query.order_by(Prediction.confidence_score.desc(), Prediction.id.desc()).limit(limit).all()
+
+
 @router.post("/{prediction_id}/approve")
 def approve_prediction(
     prediction_id: int,
     db: Session = Depends(get_db),
 ):
-    """Approve a prediction – post to ERP."""
+    """Approve a prediction – queue it for ERP posting."""
     prediction = db.query(Prediction).get(prediction_id)
     if not prediction:
         raise HTTPException(404, "Prediction not found")
-    if prediction.status not in ("pending_review", "manual_required"):
+    if prediction.status not in REVIEW_STATUSES:
         raise HTTPException(400, f"Cannot approve prediction with status '{prediction.status}'")
 
     transaction = db.query(Transaction).get(prediction.transaction_id)
 
-    # Update status
+    # Update status and queue the ERP posting – committed together with the audit entry
+    bump(db, {prediction.status: -1, "approved": 1})
     prediction.status = "approved"
-    db.commit()
-
-    # Post to mock ERP
-    erp_result = post_to_erp(
-        transaction_id=transaction.id,
-        gl_code=prediction.predicted_gl_code,
-        amount=transaction.amount,
-        description=transaction.description,
-    )
-
-    erp_posting = ERPPosting(
-        transaction_id=transaction.id,
-        gl_code=prediction.predicted_gl_code,
-        amount=transaction.amount,
-        erp_response_code=erp_result["erp_response_code"],
-        erp_response_message=erp_result["erp_response_message"],
-        posted_at=datetime.utcnow(),
-    )
-    db.add(erp_posting)
+    outbox_entry = enqueue_posting(db, transaction, prediction.predicted_gl_code, reason="approved", actor="analyst")
 
     # Audit
     log_audit(
         db, action="approved", actor="analyst",
         transaction_id=transaction.id,
-        details=f"Approved GL: {prediction.predicted_gl_code}. ERP: {erp_result['erp_response_code']}"
+        details=f"Approved GL: {prediction.predicted_gl_code}. Queued for ERP posting"
     )
+    record_review(transaction.description, transaction.vendor, transaction.department,
+                  prediction.predicted_gl_code, prediction.predicted_gl_name or "")
 
-    return {"message": "Prediction approved and posted to ERP", "erp_result": erp_result}
+    return {"message": "Prediction approved and queued for ERP posting", "outbox_id": outbox_entry.id}
 
 
 @router.post("/{prediction_id}/reject")
@@ -113,7 +126,7 @@ def reject_prediction(
     prediction = db.query(Prediction).get(prediction_id)
     if not prediction:
         raise HTTPException(404, "Prediction not found")
-    if prediction.status not in ("pending_review", "manual_required"):
+    if prediction.status not in REVIEW_STATUSES:
         raise HTTPException(400, f"Cannot reject prediction with status '{prediction.status}'")
     if not review.corrected_gl_code:
         raise HTTPException(400, "corrected_gl_code is required for rejection")
@@ -121,8 +134,8 @@ def reject_prediction(
     transaction = db.query(Transaction).get(prediction.transaction_id)
 
     # Update status
+    bump(db, {prediction.status: -1, "rejected": 1, "corrections": 1})
     prediction.status = "rejected"
-    db.commit()
 
     # Create correction record
     correction = Correction(
@@ -135,33 +148,22 @@ def reject_prediction(
     )
     db.add(correction)
 
-    # Post corrected entry to ERP
-    erp_result = post_to_erp(
-        transaction_id=transaction.id,
-        gl_code=review.corrected_gl_code,
-        amount=transaction.amount,
-        description=transaction.description,
+    # Queue the corrected entry for the ERP
+    outbox_entry = enqueue_posting(
+        db, transaction, review.corrected_gl_code, reason="rejected", actor=review.corrected_by or "analyst",
     )
 
-    erp_posting = ERPPosting(
-        transaction_id=transaction.id,
-        gl_code=review.corrected_gl_code,
-        amount=transaction.amount,
-        erp_response_code=erp_result["erp_response_code"],
-        erp_response_message=erp_result["erp_response_message"],
-        posted_at=datetime.utcnow(),
-    )
-    db.add(erp_posting)
-
-    # Audit
+    # Audit – commits the status change, correction and outbox entry together
     log_audit(
         db, action="rejected", actor=review.corrected_by or "analyst",
         transaction_id=transaction.id,
         details=f"Rejected GL: {prediction.predicted_gl_code} → Corrected to: {review.corrected_gl_code}. Reason: {review.reason or 'N/A'}"
     )
+    record_review(transaction.description, transaction.vendor, transaction.department,
+                  review.corrected_gl_code)
 
     return {
-        "message": "Prediction rejected, correction saved, and corrected entry posted to ERP",
+        "message": "Prediction rejected, correction saved, and corrected entry queued for ERP posting",
         "correction_id": correction.id,
-        "erp_result": erp_result,
+        "outbox_id": outbox_entry.id,
     }
@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Transaction, ChartOfAccounts
 from app.schemas import TransactionRead, TransactionUploadResponse, COARead, TransactionCreate
+from app.services.dashboard_stats import bump
 from app.utils.audit_logger import log_audit
 
 router = APIRouter(prefix="/api/transactions", tags=["Transactions"])
@@ -73,6 +74,7 @@ async def upload_transactions(
         db.add(txn)
         transactions_created += 1
 
+    bump(db, {"transactions": transactions_created})
     db.commit()
 
     # Audit log
@@ -104,6 +106,7 @@ def create_transaction(
         created_at=datetime.utcnow(),
     )
     db.add(txn)
+    bump(db, {"transactions": 1})
     db.commit()
     db.refresh(txn)
 
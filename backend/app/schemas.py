@@ -66,6 +66,7 @@ class PredictionRead(BaseModel):
 class ClassifyRequest(BaseModel):
     transaction_ids: Optional[List[int]] = None  # None = classify all unclassified
     batch_id: Optional[str] = None
+    background: bool = False  # True = queue a job and return its id instead of waiting
 
 class ClassifyResponse(BaseModel):
     total_classified: int
@@ -125,6 +126,24 @@ class ERPPostResponse(BaseModel):
     posting_id: Optional[int] = None
 
 
+# ── Classification Jobs ───────────────────────────────────────────────
+class JobRead(BaseModel):
+    job_id: str
+    status: str
+    batch_id: Optional[str] = None
+    total: Optional[int] = None
+    processed: int
+    auto_posted: int
+    pending_review: int
+    manual_required: int
+    rows_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
 # ── Dashboard Stats ───────────────────────────────────────────────────
 class DashboardStats(BaseModel):
     total_transactions: int
@@ -3,117 +3,405 @@ Classification service – orchestrates ML pipeline for single/batch transaction
 """
 
 import json
+import queue
+import threading
+import time
 import uuid
 from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Iterator
 
+from sqlalchemy import exists, insert
 from sqlalchemy.orm import Session
 
-from app.models import Transaction, Prediction, AuditLog
-from app.ml.pipeline import classify_transaction
+from app.config import (
+    CLASSIFY_CHUNK_SIZE,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_EMBED_WORKERS,
+    PIPELINE_SEARCH_WORKERS,
+    PIPELINE_PERSIST_WORKERS,
+)
+from app.models import Transaction, Prediction, AuditLog, ERPOutbox
+from app.ml.pipeline import (
+    classify_transaction, classify_transactions, embed_transactions, classify_vectors,
+)
 from app.services.router import route_prediction
-from app.services.erp_client import post_to_erp
-from app.models import ERPPosting
+from app.services.erp_outbox import outbox_row, notify_on_commit
+from app.services.dashboard_stats import bump, prediction_deltas
+from app.services.staged_pipeline import Stage, run_stages
 
 
-def classify_and_route(db: Session, transaction: Transaction) -> Prediction:
+def classify_and_route(
+    db: Session,
+    transaction: Transaction,
+    result: dict | None = None,
+) -> Prediction:
     """
     Classify a single transaction and route based on confidence.
 
     Steps:
-      1. Run ML prediction
+      1. Run ML prediction (skipped when ``result`` is precomputed)
       2. Determine routing action
-      3. If auto-post, call mock ERP
-      4. Save prediction + audit log
+      3. If auto-post, queue the ERP posting in the outbox
+      4. Save prediction + audit log (one commit with the outbox entry and
+         the dashboard counters)
     """
     # 1. ML prediction
-    result = classify_transaction(
-        description=transaction.description,
-        vendor=transaction.vendor or "",
-        department=transaction.department or "",
-    )
+    if result is None:
+        result = classify_transaction(
+            description=transaction.description,
+            vendor=transaction.vendor or "",
+            department=transaction.department or "",
+        )
 
     # 2. Route based on confidence
-    status, routed_action = route_prediction(result["confidence_score"])
-
-    # 3. Create prediction record
-    prediction = Prediction(
-        transaction_id=transaction.id,
-        predicted_gl_code=result["predicted_gl_code"],
-        predicted_gl_name=result["predicted_gl_name"],
-        confidence_score=result["confidence_score"],
-        status=status,
-        routed_action=routed_action,
-        top_candidates=json.dumps(result["top_candidates"]),
-        created_at=datetime.utcnow(),
-    )
+    now = datetime.utcnow()
+    prediction_row, audit_rows = _route_rows(transaction, result, now)
+    prediction = Prediction(**prediction_row)
     db.add(prediction)
+    bump(db, prediction_deltas([prediction_row]))
 
-    # 4. Audit log – prediction
-    audit = AuditLog(
-        transaction_id=transaction.id,
-        action="predicted",
-        actor="system",
-        details=f"GL: {result['predicted_gl_code']}, Confidence: {result['confidence_score']}%, Route: {routed_action}",
-        timestamp=datetime.utcnow(),
-    )
-    db.add(audit)
-
-    # 5. If auto-post, call ERP
-    if status == "auto_posted":
-        erp_result = post_to_erp(
-            transaction_id=transaction.id,
-            gl_code=result["predicted_gl_code"],
-            amount=transaction.amount,
-            description=transaction.description,
-        )
-
-        erp_posting = ERPPosting(
-            transaction_id=transaction.id,
-            gl_code=result["predicted_gl_code"],
-            amount=transaction.amount,
-            erp_response_code=erp_result["erp_response_code"],
-            erp_response_message=erp_result["erp_response_message"],
-            posted_at=datetime.utcnow(),
-        )
-        db.add(erp_posting)
-
-        # Audit log – ERP posting
-        erp_audit = AuditLog(
-            transaction_id=transaction.id,
-            action="auto_posted",
-            actor="system",
-            details=f"ERP response: {erp_result['erp_response_code']} – {erp_result['erp_response_message']}",
-            timestamp=datetime.utcnow(),
-        )
-        db.add(erp_audit)
+    # 3. If auto-post, queue for the ERP
+    if prediction.status == "auto_posted":
+        queued, queued_audit = _outbox_rows(transaction, prediction.predicted_gl_code, now)
+        db.add(ERPOutbox(**queued))
+        audit_rows.append(queued_audit)
+        notify_on_commit(db)
 
-    elif status == "pending_review":
-        # Audit log – sent for review
-        review_audit = AuditLog(
-            transaction_id=transaction.id,
-            action="sent_for_review",
-            actor="system",
-            details=f"Confidence {result['confidence_score']}% – routed to human review",
-            timestamp=datetime.utcnow(),
-        )
-        db.add(review_audit)
+    # 4. Save prediction + audit log
+    db.add_all(AuditLog(**row) for row in audit_rows)
 
     db.commit()
     db.refresh(prediction)
     return prediction
 
 
+def persist_routed_batch(
+    db: Session,
+    transactions: list[Transaction],
+    results: list[dict],
+) -> dict:
+    """
+    Route a chunk of classified transactions and stage all their rows.
+
+    Builds plain row dicts and writes predictions, audit logs and ERP outbox
+    entries with one Core ``insert()`` executemany per table – no ORM
+    identity-map bookkeeping. The caller commits, so a chunk costs a single
+    commit (one fsync on SQLite) together with whatever else belongs to it.
+
+    Returns:
+        {auto_posted, pending_review, manual_required} counts for the chunk
+    """
+    prediction_rows = _insert_routed_rows(db, transactions, results, datetime.utcnow())
+
+    counts = {"auto_posted": 0, "pending_review": 0, "manual_required": 0}
+    for row in prediction_rows:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    return counts
+
+
+def _insert_routed_rows(db: Session, transactions: list, results: list[dict], now: datetime) -> list[dict]:
+    """Route a chunk and stage its prediction, audit and outbox rows (and counter deltas) in ``db``; returns the prediction rows."""
+    prediction_rows, audit_rows, queued_rows = [], [], []
+    for transaction, result in zip(transactions, results):
+        prediction_row, audits = _route_rows(transaction, result, now)
+        prediction_rows.append(prediction_row)
+        audit_rows.extend(audits)
+        if prediction_row["status"] == "auto_posted":
+            queued, queued_audit = _outbox_rows(transaction, prediction_row["predicted_gl_code"], now)
+            queued_rows.append(queued)
+            audit_rows.append(queued_audit)
+
+    for model, rows in ((Prediction, prediction_rows), (ERPOutbox, queued_rows), (AuditLog, audit_rows)):
+        if rows:
+            db.execute(insert(model), rows)
+    bump(db, prediction_deltas(prediction_rows))
+    if queued_rows:
+        notify_on_commit(db)
+    return prediction_rows
+
+
+def _route_rows(
+    transaction: Transaction,
+    result: dict,
+    now: datetime,
+) -> tuple[dict, list[dict]]:
+    """
+    Route one classified transaction.
+
+    Returns:
+        (prediction row, audit log rows) as column dicts; auto-posted rows
+        still need ``_outbox_rows``
+    """
+    status, routed_action = route_prediction(result["confidence_score"])
+
+    prediction_row = {
+        "transaction_id": transaction.id,
+        "predicted_gl_code": result["predicted_gl_code"],
+        "predicted_gl_name": result["predicted_gl_name"],
+        "confidence_score": result["confidence_score"],
+        "status": status,
+        "routed_action": routed_action,
+        "top_candidates": json.dumps(result["top_candidates"]),
+        "created_at": now,
+    }
+
+    # Audit log – prediction
+    audit_rows = [{
+        "transaction_id": transaction.id,
+        "action": "predicted",
+        "actor": "system",
+        "details": f"GL: {result['predicted_gl_code']}, Confidence: {result['confidence_score']}%, Route: {routed_action}",
+        "timestamp": now,
+    }]
+
+    if status == "pending_review":
+        # Audit log – sent for review
+        audit_rows.append({
+            "transaction_id": transaction.id,
+            "action": "sent_for_review",
+            "actor": "system",
+            "details": f"Confidence {result['confidence_score']}% – routed to human review",
+            "timestamp": now,
+        })
+
+    return prediction_row, audit_rows
+
+
+def _outbox_rows(transaction: Transaction, gl_code: str, now: datetime) -> tuple[dict, dict]:
+    """
+    Queue an auto-routed transaction for ERP posting (see ``erp_outbox``).
+
+    Returns:
+        (outbox row, audit log row) as column dicts
+    """
+    audit_row = {
+        "transaction_id": transaction.id,
+        "action": "auto_posted",
+        "actor": "system",
+        "details": f"Queued for ERP posting to GL {gl_code}",
+        "timestamp": now,
+    }
+    return outbox_row(transaction, gl_code, now), audit_row
+
+
 def classify_batch(
     db: Session,
     transaction_ids: list[int] | None = None,
     batch_id: str | None = None,
+    on_persisted: Callable[[list[dict]], None] | None = None,
+    stop: threading.Event | None = None,
 ) -> dict:
     """
-    Classify a batch of transactions.
+    Classify a batch of transactions through a staged pipeline:
+
+      fetch + text build → embed → search + score → persist
+
+    Stages hand CLASSIFY_CHUNK_SIZE-row chunks to each other through bounded
+    queues and run PIPELINE_*_WORKERS threads each, so the model embeds the
+    next chunk while earlier ones are written to SQLite. Every persist step
+    is one DB transaction, including the chunk's ERP outbox entries.
+
+    Args:
+        on_persisted: called from the persist stage with one record per
+            transaction (see ``_result_record``) after each chunk commits
+        stop: once set, no further chunk is committed and the run raises
+            ``_RunStopped``; chunks committed before stay
 
     Returns summary counts.
     """
-    query = db.query(Transaction)
+    global _last_run_stats
+    bind = db.get_bind()
+    counts = {"auto_posted": 0, "pending_review": 0, "manual_required": 0}
+    counts_lock = threading.Lock()
+
+    def fetch():
+        with Session(bind=bind) as session:
+            for chunk in iter_unclassified(session, transaction_ids, batch_id, CLASSIFY_CHUNK_SIZE):
+                if stop is not None and stop.is_set():
+                    return
+                yield _WorkItem([dict(row._mapping) for row in chunk])
+
+    def embed(item: "_WorkItem") -> "_WorkItem":
+        item.results, item.misses, item.vectors = embed_transactions(item.transactions)
+        return item
+
+    def search(item: "_WorkItem") -> "_WorkItem":
+        for i, result in zip(item.misses, classify_vectors(item.vectors)):
+            item.results[i] = result
+        item.vectors = None
+        return item
+
+    def persist(item: "_WorkItem"):
+        if stop is not None and stop.is_set():
+            raise _RunStopped()
+        with Session(bind=bind) as session:
+            prediction_rows = _insert_routed_rows(session, item.rows(), item.results, datetime.utcnow())
+            session.commit()
+
+        with counts_lock:
+            for row in prediction_rows:
+                counts[row["status"]] = counts.get(row["status"], 0) + 1
+        if on_persisted is not None:
+            on_persisted([_result_record(row, result) for row, result in zip(prediction_rows, item.results)])
+
+    stages = [
+        Stage("embed", embed, PIPELINE_EMBED_WORKERS),
+        Stage("search", search, PIPELINE_SEARCH_WORKERS),
+        Stage("persist", persist, PIPELINE_PERSIST_WORKERS),
+    ]
+    started = time.perf_counter()
+    stage_stats = run_stages(fetch(), stages, PIPELINE_QUEUE_SIZE)
+    elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    _last_run_stats = {
+        "rows": total,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(total / elapsed, 1) if elapsed > 0 else None,
+        "stages": stage_stats,
+    }
+    return {
+        "total_classified": total,
+        **counts,
+    }
+
+
+def stream_classify_batch(
+    db: Session,
+    transaction_ids: list[int] | None = None,
+    batch_id: str | None = None,
+    finished: threading.Event | None = None,
+) -> Iterator[dict]:
+    """
+    Run ``classify_batch`` and yield its results as they are committed.
+
+    Yields ``{"type": "prediction", ...}`` per transaction (see
+    ``_result_record``), then one ``{"type": "summary", ...counts}`` – or
+    ``{"type": "error", "detail": ...}`` if the run fails.
+
+    Chunks are handed over through a queue of PIPELINE_QUEUE_SIZE chunks, so
+    a slow reader backs the pipeline up instead of buffering results.
+    Closing the generator (client disconnect) stops the run: chunks not
+    committed yet are dropped, and their transactions stay unclassified.
+    ``finished`` is set once the background run has ended.
+    """
+    events: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    closed = threading.Event()
+
+    def emit(event) -> bool:
+        while not closed.is_set():
+            try:
+                events.put(event, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def on_persisted(records: list[dict]):
+        if not emit(records):
+            raise _RunStopped()
+
+    def run():
+        try:
+            summary = classify_batch(db, transaction_ids, batch_id, on_persisted=on_persisted, stop=closed)
+            emit({"type": "summary", **summary})
+        except _RunStopped:
+            pass
+        except Exception as e:
+            print(f"⚠ Streaming classification failed: {e}")
+            emit({"type": "error", "detail": str(e)})
+        finally:
+            emit(_STREAM_END)
+            if finished is not None:
+                finished.set()
+
+    threading.Thread(target=run, name="classify-stream", daemon=True).start()
+    try:
+        while True:
+            event = events.get()
+            if event is _STREAM_END:
+                return
+            if isinstance(event, list):
+                for record in event:
+                    yield {"type": "prediction", **record}
+            else:
+                yield event
+    finally:
+        closed.set()
+
+
+class _RunStopped(Exception):
+    """A ``classify_batch`` run was stopped early (its ``stop`` event was set)."""
+
+
+_STREAM_END = object()
+
+
+def _result_record(prediction_row: dict, result: dict) -> dict:
+    """Per-transaction outcome reported to streaming callers."""
+    return {
+        "transaction_id": prediction_row["transaction_id"],
+        "predicted_gl_code": prediction_row["predicted_gl_code"],
+        "predicted_gl_name": prediction_row["predicted_gl_name"],
+        "confidence_score": prediction_row["confidence_score"],
+        "status": prediction_row["status"],
+        "routed_action": prediction_row["routed_action"],
+        "top_candidates": result["top_candidates"],
+        "method": result.get("method"),
+    }
+
+
+class _WorkItem:
+    """One chunk of transactions (plain dicts) on its way through the stages."""
+
+    __slots__ = ("transactions", "results", "misses", "vectors")
+
+    def __init__(self, transactions: list[dict]):
+        self.transactions = transactions
+        self.results: list[dict | None] = []
+        self.misses: list[int] = []
+        self.vectors = None
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def rows(self) -> list[SimpleNamespace]:
+        """Transactions with attribute access, as ``_route_rows`` / ``_outbox_rows`` expect."""
+        return [SimpleNamespace(**t) for t in self.transactions]
+
+
+_last_run_stats: dict | None = None
+
+
+def get_pipeline_stats() -> dict | None:
+    """Per-stage throughput of the most recent ``classify_batch`` run in this process."""
+    return _last_run_stats
+
+
+# Columns the classification path reads – selected as plain rows, not ORM objects
+_WORK_COLUMNS = (
+    Transaction.id,
+    Transaction.description,
+    Transaction.vendor,
+    Transaction.department,
+    Transaction.amount,
+    Transaction.transaction_date,
+)
+
+
+def unclassified_query(
+    db: Session,
+    transaction_ids: list[int] | None = None,
+    batch_id: str | None = None,
+):
+    """
+    Transactions (optionally limited to ids or a batch) without a prediction yet, by id.
+
+    Uses a NOT EXISTS anti-join that probes ``ix_predictions_transaction_id``
+    per candidate row, instead of materializing every classified id.
+    """
+    query = db.query(*_WORK_COLUMNS)
 
     if transaction_ids:
         query = query.filter(Transaction.id.in_(transaction_ids))
@@ -121,19 +409,41 @@ def classify_batch(
         query = query.filter(Transaction.batch_id == batch_id)
 
     # Only classify transactions without predictions
-    classified_ids = (
-        db.query(Prediction.transaction_id)
-        .subquery()
-    )
-    transactions = query.filter(~Transaction.id.in_(classified_ids)).all()
+    classified = exists().where(Prediction.transaction_id == Transaction.id)
+    return query.filter(~classified).order_by(Transaction.id)
 
-    counts = {"auto_posted": 0, "pending_review": 0, "manual_required": 0}
 
-    for txn in transactions:
-        prediction = classify_and_route(db, txn)
-        counts[prediction.status] = counts.get(prediction.status, 0) + 1
+def iter_unclassified(
+    db: Session,
+    transaction_ids: list[int] | None = None,
+    batch_id: str | None = None,
+    chunk_size: int = CLASSIFY_CHUNK_SIZE,
+    after_id: int = 0,
+):
+    """
+    Yield unclassified transactions in id order, ``chunk_size`` rows at a time.
 
-    return {
-        "total_classified": len(transactions),
-        **counts,
-    }
+    Keyset pagination (``id > last id``) over the primary key: each chunk is a
+    short indexed query, memory stays O(chunk) and no read cursor is held open
+    across chunks, so SQLite writers are never blocked by the reader.
+    """
+    query = unclassified_query(db, transaction_ids, batch_id)
+    while True:
+        chunk = query.filter(Transaction.id > after_id).limit(chunk_size).all()
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1].id
+
+
+def classify_chunk(db: Session, transactions: list) -> dict:
+    """Classify one chunk with a single batched model call and stage its rows (caller commits)."""
+    results = classify_transactions([
+        {
+            "description": txn.description,
+            "vendor": txn.vendor,
+            "department": txn.department,
+        }
+        for txn in transactions
+    ])
+    return persist_routed_batch(db, transactions, results)
@@ -0,0 +1,112 @@
+"""
+Dashboard counters, maintained incrementally.
+
+Every write that changes a dashboard number adds its delta to the
+``dashboard_counters`` table in the same DB transaction (``bump``), so a
+dashboard load reads one small table instead of aggregating predictions,
+corrections and ERP postings. ``recompute_counters`` recounts everything
+from the source tables: on first read of a database without counters, and
+on demand (``GET /api/dashboard/stats?exact=true``) to verify and resync.
+"""
+
+from collections import Counter
+
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.orm import Session
+
+from app.models import Correction, DashboardCounter, ERPPosting, Prediction, Transaction
+
+PREDICTION_STATUSES = ("auto_posted", "pending_review", "manual_required", "approved", "rejected")
+COUNTERS = (
+    "transactions",
+    "predictions",
+    "confidence_sum",
+    "corrections",
+    "erp_postings",
+    *PREDICTION_STATUSES,  # predictions currently in each status
+)
+
+
+def bump(db: Session, deltas: dict):
+    """
+    Add ``deltas`` ({counter name: change}) to the counters.
+
+    Runs in the caller's transaction, so the counters commit or roll back
+    together with the change they describe. ``value = value + delta`` is a
+    single UPDATE, safe against concurrent writers in other threads and
+    processes. Before the counters are first computed it is a no-op – the
+    recount includes the change anyway.
+    """
+    for name, delta in deltas.items():
+        if delta:
+            db.execute(
+                update(DashboardCounter)
+                .where(DashboardCounter.name == name)
+                .values(value=DashboardCounter.value + delta)
+            )
+
+
+def prediction_deltas(rows: list[dict]) -> Counter:
+    """Counter deltas for inserting prediction rows ({status, confidence_score, ...})."""
+    deltas = Counter()
+    for row in rows:
+        deltas["predictions"] += 1
+        deltas["confidence_sum"] += row["confidence_score"]
+        deltas[row["status"]] += 1
+    return deltas
+
+
+def read_counters(db: Session) -> dict:
+    """Current counters – one indexed read; recounted if any is missing."""
+    counters = dict(db.query(DashboardCounter.name, DashboardCounter.value).all())
+    if not set(COUNTERS) <= counters.keys():
+        return recompute_counters(db)
+    return counters
+
+
+def recompute_counters(db: Session) -> dict:
+    """
+    Recount every counter from the source tables and store the result.
+
+    Clearing the counters first takes SQLite's write lock, so no other
+    writer can commit (and bump) between the recount and the store.
+
+    Returns:
+        {counter name: value}
+    """
+    db.execute(delete(DashboardCounter))
+
+    counters = dict.fromkeys(COUNTERS, 0)
+    by_status = (
+        db.query(Prediction.status, func.count(Prediction.id), func.sum(Prediction.confidence_score))
+        .group_by(Prediction.status)
+        .all()
+    )
+    for status, count, confidence_sum in by_status:
+        counters[status] = count
+        counters["predictions"] += count
+        counters["confidence_sum"] += confidence_sum or 0.0
+    counters["transactions"] = db.query(func.count(Transaction.id)).scalar() or 0
+    counters["corrections"] = db.query(func.count(Correction.id)).scalar() or 0
+    counters["erp_postings"] = db.query(func.count(ERPPosting.id)).scalar() or 0
+
+    db.execute(insert(DashboardCounter), [{"name": name, "value": value} for name, value in counters.items()])
+    db.commit()
+    return counters
+
+
+def dashboard_stats(counters: dict) -> dict:
+    """Turn counters into the ``DashboardStats`` fields."""
+    total_pred = int(counters["predictions"])
+    return {
+        "total_transactions": int(counters["transactions"]),
+        "total_predictions": total_pred,
+        "auto_posted_count": int(counters["auto_posted"]),
+        "pending_review_count": int(counters["pending_review"]),
+        "manual_required_count": int(counters["manual_required"]),
+        "approved_count": int(counters["approved"]),
+        "rejected_count": int(counters["rejected"]),
+        "avg_confidence": round(counters["confidence_sum"] / total_pred, 2) if total_pred else 0.0,
+        "correction_rate": round(counters["corrections"] / total_pred * 100, 2) if total_pred else 0.0,
+        "total_erp_postings": int(counters["erp_postings"]),
+    }
@@ -1,45 +1,139 @@
-"""Mock ERP API client for simulated posting."""
+"""
+ERP API client.
 
-import random
-import uuid
-from datetime import datetime
+Posts through a pluggable transport (see ``erp_transport``): the HTTP
+endpoint at ERP_API_URL when it is set (e.g. the local
+``scripts/mock_erp_server.py``), otherwise the in-process mock. Single
+journal entries go through ``post_to_erp``; ``post_journal_batch`` submits
+many lines as one journal batch (SAP / Oracle batch journal import).
 
-from app.config import ERP_SUCCESS_RATE
+The calls are coroutines (``apost_to_erp`` / ``apost_journal_batch``) that
+never block the event loop. The sync versions used by worker threads hand
+them to the app's event loop once ``start_erp_client`` has run, so every
+thread shares one connection pool.
+"""
 
+import asyncio
+import threading
 
-def post_to_erp(
+from app.config import ERP_API_URL
+from app.services.erp_transport import ERPTransport, HttpTransport, MockTransport
+
+_transport: ERPTransport | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_thread: int | None = None
+
+
+def get_transport() -> ERPTransport:
+    """The active transport (created from the config on first use)."""
+    global _transport
+    if _transport is None:
+        _transport = HttpTransport(ERP_API_URL) if ERP_API_URL else MockTransport()
+    return _transport
+
+
+def set_transport(transport: ERPTransport | None):
+    """Plug in another transport (``None`` = back to the configured one)."""
+    global _transport
+    _transport = transport
+
+
+async def start_erp_client():
+    """Route sync callers' ERP calls through the running (app) event loop."""
+    global _loop, _loop_thread
+    _loop = asyncio.get_running_loop()
+    _loop_thread = threading.get_ident()
+
+
+async def stop_erp_client():
+    """Close the transport's pooled connections."""
+    global _loop, _loop_thread
+    if _transport is not None:
+        await _transport.aclose()
+    _loop = _loop_thread = None
+
+
+async def apost_to_erp(
     transaction_id: int,
     gl_code: str,
     amount: float,
     description: str = "",
+    idempotency_key: str | None = None,
 ) -> dict:
     """
-    Simulate posting a transaction to an ERP system.
+    Post a transaction to the ERP as a journal entry.
 
-    Returns a mock response mimicking real ERP APIs like SAP or Oracle.
+    The ERP books an ``idempotency_key`` at most once: posting the same key
+    again returns the first posting's response instead of a second entry.
+
+    Returns a response mimicking real ERP APIs like SAP or Oracle. Network
+    errors, timeouts and an open circuit (``CircuitOpenError``) are raised,
+    not returned.
     """
-    # Simulate network latency + processing
-    erp_ref = f"ERP-{uuid.uuid4().hex[:8].upper()}"
-
-    if random.random() < ERP_SUCCESS_RATE:
-        return {
-            "success": True,
-            "erp_response_code": "200",
-            "erp_response_message": f"Posted successfully. ERP Reference: {erp_ref}",
-            "erp_reference": erp_ref,
-            "posted_at": datetime.utcnow().isoformat(),
-            "journal_entry": {
-                "debit_account": gl_code,
-                "credit_account": "1100",  # Cash & Bank (default offset)
-                "amount": amount,
-                "memo": description[:100] if description else "",
-            },
-        }
-    else:
-        return {
-            "success": False,
-            "erp_response_code": "500",
-            "erp_response_message": "ERP posting failed: Temporary service unavailability. Retry recommended.",
-            "erp_reference": None,
-            "posted_at": None,
-        }
+    entry = {
+        "transaction_id": transaction_id,
+        "gl_code": gl_code,
+        "amount": amount,
+        "description": description,
+    }
+    if idempotency_key:
+        entry["idempotency_key"] = idempotency_key
+    return await get_transport().post_entry(entry)
+
+
+async def apost_journal_batch(lines: list[dict]) -> dict:
+    """
+    Post several journal lines as one ERP journal batch.
+
+    Args:
+        lines: {line_id, transaction_id, gl_code, amount, description,
+            posting_date, idempotency_key} per line; a line whose key the ERP
+            has already booked is answered with that booking, not re-posted
+
+    Returns:
+        {"batch_reference", "erp_response_code", "erp_response_message",
+        "lines": {line_id: per-line response shaped like ``post_to_erp``'s}}.
+        The ERP accepts or rejects each line on its own; a batch-level error
+        (e.g. 500) comes back without line results. Network errors, timeouts
+        and an open circuit are raised.
+    """
+    response = await get_transport().post_batch(lines)
+    response["lines"] = {line["line_id"]: line for line in response.get("lines") or []}
+    return response
+
+
+def post_to_erp(
+    transaction_id: int,
+    gl_code: str,
+    amount: float,
+    description: str = "",
+    idempotency_key: str | None = None,
+) -> dict:
+    """Blocking ``apost_to_erp`` for worker threads."""
+    return _run(apost_to_erp(transaction_id, gl_code, amount, description, idempotency_key))
+
+
+def post_journal_batch(lines: list[dict]) -> dict:
+    """Blocking ``apost_journal_batch`` for worker threads."""
+    return _run(apost_journal_batch(lines))
+
+
+def _run(coro):
+    if _loop is not None and _loop.is_running():
+        if _loop_thread == threading.get_ident():
+            coro.close()
+            raise RuntimeError("Blocking ERP call on the event loop thread – await the async version instead")
+        return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+    # No app loop (scripts, tests): a private loop for this one call
+    return asyncio.run(_once(coro))
+
+
+async def _once(coro):
+    try:
+        return await coro
+    finally:
+        await get_transport().aclose()  # its connections die with the private loop
+
+
+def get_transport_stats() -> dict:
+    return get_transport().stats()
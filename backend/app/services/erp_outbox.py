@@ -0,0 +1,427 @@
+"""
+Transactional outbox for ERP postings.
+
+Request paths never call the ERP themselves: they insert an ``erp_outbox``
+entry in the same DB transaction as the prediction or review that caused it,
+so a posting is neither lost nor sent for a change that was rolled back.
+ERP_OUTBOX_WORKERS threads per process claim due entries with an atomic
+UPDATE, post them – as ERP journal batches when ERP_BATCH_ENABLED, so one
+round trip carries up to ERP_BATCH_MAX_LINES lines – and record each line's
+outcome in one DB transaction per claim:
+
+  - success            → ``ERPPosting`` row + ``erp_posted`` audit entry
+  - 5xx / network error → retried after a jittered exponential backoff
+  - retries exhausted,
+    or any other error  → ``ERPPosting`` row with the last response + ``erp_failed`` audit entry
+
+Delivery is at-least-once: an entry is posted again when its worker dies
+(or its outcome fails to commit) after the ERP accepted it. Every posting
+therefore carries the entry's idempotency key, which the ERP books only
+once. A worker also keeps refreshing its claim while it works through a
+long one, so the entry is not presumed dead and re-claimed meanwhile.
+"""
+
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import (
+    ERP_BATCH_ENABLED,
+    ERP_BATCH_GROUPING,
+    ERP_BATCH_MAX_LINES,
+    ERP_OUTBOX_WORKERS,
+    ERP_OUTBOX_CLAIM_SIZE,
+    ERP_OUTBOX_MAX_ATTEMPTS,
+    ERP_OUTBOX_BACKOFF_BASE,
+    ERP_OUTBOX_BACKOFF_MAX,
+    ERP_OUTBOX_POLL_SECONDS,
+    ERP_OUTBOX_STALE_SECONDS,
+)
+from app.database import SessionLocal
+from app.models import AuditLog, ERPOutbox, ERPPosting
+from app.services.dashboard_stats import bump
+from app.services.erp_client import get_transport_stats, post_journal_batch, post_to_erp
+
+_workers: list[threading.Thread] = []
+_wake = threading.Event()
+_stop = threading.Event()
+
+_stats_lock = threading.Lock()
+_stats = {"posted": 0, "retried": 0, "failed": 0, "calls": 0, "lines": 0, "call_seconds": 0.0}
+
+
+# ── Enqueueing ───────────────────────────────────────────────────────
+def outbox_row(
+    transaction,
+    gl_code: str,
+    now: datetime,
+    reason: str = "auto_posted",
+    actor: str = "system",
+) -> dict:
+    """Column dict of an outbox entry posting ``transaction`` to ``gl_code``."""
+    return {
+        "transaction_id": transaction.id,
+        "gl_code": gl_code,
+        "amount": transaction.amount,
+        "description": transaction.description,
+        "posting_date": getattr(transaction, "transaction_date", None),
+        "reason": reason,
+        "actor": actor,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+
+
+def enqueue_posting(
+    db: Session,
+    transaction,
+    gl_code: str,
+    reason: str,
+    actor: str = "system",
+) -> ERPOutbox:
+    """Stage an outbox entry in ``db``; it is posted once the caller commits."""
+    entry = ERPOutbox(**outbox_row(transaction, gl_code, datetime.utcnow(), reason, actor))
+    db.add(entry)
+    notify_on_commit(db)
+    return entry
+
+
+def notify_on_commit(db: Session):
+    """Wake this process's outbox workers as soon as ``db`` commits new entries."""
+    event.listen(db, "after_commit", lambda session: _wake.set(), once=True)
+
+
+def backoff_seconds(attempts: int, rng: random.Random | None = None) -> float:
+    """
+    Delay before the next try after ``attempts`` failed ones.
+
+    Exponential (ERP_OUTBOX_BACKOFF_BASE · 2^(attempts-1), capped at
+    ERP_OUTBOX_BACKOFF_MAX) with "equal jitter": a random 50–100% of it, so
+    entries that failed together during an outage do not all retry together.
+    """
+    delay = min(ERP_OUTBOX_BACKOFF_MAX, ERP_OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0))
+    return delay * (rng or random).uniform(0.5, 1.0)
+
+
+# ── Delivery ─────────────────────────────────────────────────────────
+def claim_due(db: Session, limit: int | None = None) -> list[ERPOutbox]:
+    """
+    Atomically take up to ``limit`` due entries – pending ones whose backoff
+    has passed, or in-flight ones whose worker stopped reporting – and count
+    the attempt. ``limit`` defaults to one journal batch (or
+    ERP_OUTBOX_CLAIM_SIZE single postings).
+    """
+    limit = limit or (ERP_BATCH_MAX_LINES if ERP_BATCH_ENABLED else ERP_OUTBOX_CLAIM_SIZE)
+    now = datetime.utcnow()
+    claim_id = uuid.uuid4().hex
+    claimable = or_(
+        and_(ERPOutbox.status == "pending", ERPOutbox.next_attempt_at <= now),
+        and_(
+            ERPOutbox.status == "in_flight",
+            ERPOutbox.claimed_at < now - timedelta(seconds=ERP_OUTBOX_STALE_SECONDS),
+        ),
+    )
+    due = select(ERPOutbox.id).where(claimable).order_by(ERPOutbox.next_attempt_at).limit(limit)
+    db.execute(
+        update(ERPOutbox)
+        .where(ERPOutbox.id.in_(due), claimable)
+        .values(status="in_flight", claim_id=claim_id, claimed_at=now, attempts=ERPOutbox.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.query(ERPOutbox).filter(ERPOutbox.claim_id == claim_id).order_by(ERPOutbox.id).all()
+
+
+def idempotency_key(entry: ERPOutbox) -> str:
+    """Key the ERP dedupes postings on – the same for every attempt at an entry."""
+    return f"autoledger-outbox-{entry.id}"
+
+
+def deliver(db: Session, entries: list[ERPOutbox]) -> dict:
+    """
+    Post claimed entries and record their outcomes in one DB transaction.
+
+    An entry re-claimed by another worker in the meantime (this one was
+    presumed dead) is left to that worker.
+
+    Returns:
+        {posted, retried, failed} counts
+    """
+    claim = _ClaimKeeper(db, entries)
+    outcomes = _send_batches(entries, claim) if ERP_BATCH_ENABLED else _send_each(entries, claim)
+
+    now = datetime.utcnow()
+    counts = {"posted": 0, "retried": 0, "failed": 0}
+    postings, audits = [], []
+    for entry, result, error in outcomes:
+        try:
+            status, code, message = _outcome(entry, result, error)
+        except Exception as e:
+            # One unreadable response must not leave the whole claim in flight
+            print(f"⚠ Unreadable ERP response for outbox entry {entry.id}: {e}")
+            result = None
+            status, code, message = _outcome(entry, None, f"unreadable ERP response: {type(e).__name__}: {e}")
+
+        values = {"status": status, "claim_id": None, "last_error": None if status == "posted" else message}
+        if status == "pending":
+            values["next_attempt_at"] = now + timedelta(seconds=backoff_seconds(entry.attempts))
+        else:
+            values["completed_at"] = now
+        recorded = db.execute(
+            update(ERPOutbox)
+            .where(ERPOutbox.id == entry.id, ERPOutbox.claim_id == entry.claim_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if recorded.rowcount != 1:
+            continue
+
+        counts["retried" if status == "pending" else status] += 1
+        if status == "pending":
+            continue
+        postings.append({
+            "transaction_id": entry.transaction_id,
+            "gl_code": entry.gl_code,
+            "amount": entry.amount,
+            "erp_response_code": code,
+            "erp_response_message": message,
+            "erp_reference": result.get("erp_reference") if result else None,
+            "journal_batch": result.get("batch_reference") if result else None,
+            "posted_at": now,
+        })
+        audits.append({
+            "transaction_id": entry.transaction_id,
+            "action": "erp_posted" if status == "posted" else "erp_failed",
+            "actor": "system",
+            "details": f"{entry.reason} → GL {entry.gl_code}. ERP response: {code} – {message} "
+                       f"(attempt {entry.attempts})",
+            "timestamp": now,
+        })
+
+    if postings:
+        db.execute(insert(ERPPosting), postings)
+        db.execute(insert(AuditLog), audits)
+        bump(db, {"erp_postings": len(postings)})
+    db.commit()
+
+    with _stats_lock:
+        for key, value in counts.items():
+            _stats[key] += value
+    return counts
+
+
+def _outcome(entry: ERPOutbox, result: dict | None, error: str | None) -> tuple[str, str, str]:
+    """
+    (status, response code, message) of one posting attempt.
+
+    Server errors and unreachable ERPs are retried until ERP_OUTBOX_MAX_ATTEMPTS;
+    any other rejection is final.
+    """
+    if result is None:
+        code, message = "error", f"ERP unreachable: {error}"
+    else:
+        code = str(result.get("erp_response_code") or "error")
+        message = result.get("erp_response_message") or f"ERP response {code}"
+
+    if result is not None and result.get("success"):
+        return "posted", code, message
+    if (result is None or code.startswith("5")) and entry.attempts < ERP_OUTBOX_MAX_ATTEMPTS:
+        return "pending", code, message
+    return "failed", code, message
+
+
+class _ClaimKeeper:
+    """
+    Refreshes ``claimed_at`` of a claim still being worked through.
+
+    ``claim_due`` re-claims in-flight entries untouched for
+    ERP_OUTBOX_STALE_SECONDS; a long claim (many batches, slow ERP) is
+    touched every quarter of that, in its own short transaction.
+    """
+
+    def __init__(self, db: Session, entries: list[ERPOutbox]):
+        self.bind = db.get_bind()
+        self.claim_id = entries[0].claim_id if entries else None
+        self.touched = time.monotonic()
+
+    def keep(self):
+        if time.monotonic() - self.touched < ERP_OUTBOX_STALE_SECONDS / 4:
+            return
+        with Session(bind=self.bind) as session:
+            session.execute(
+                update(ERPOutbox)
+                .where(ERPOutbox.claim_id == self.claim_id, ERPOutbox.status == "in_flight")
+                .values(claimed_at=datetime.utcnow())
+            )
+            session.commit()
+        self.touched = time.monotonic()
+
+
+def _send_each(entries: list[ERPOutbox], claim: _ClaimKeeper) -> list[tuple]:
+    """Post every entry as its own journal entry; returns (entry, response or None, error or None)."""
+    outcomes = []
+    for entry in entries:
+        claim.keep()
+        started = time.perf_counter()
+        try:
+            result, error = post_to_erp(
+                transaction_id=entry.transaction_id,
+                gl_code=entry.gl_code,
+                amount=entry.amount,
+                description=entry.description or "",
+                idempotency_key=idempotency_key(entry),
+            ), None
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        _count_call(1, time.perf_counter() - started)
+        outcomes.append((entry, result, error))
+    return outcomes
+
+
+def _send_batches(entries: list[ERPOutbox], claim: _ClaimKeeper) -> list[tuple]:
+    """
+    Post entries as journal batches (see ``group_journal_batches``) and map
+    each line's response back to its entry. A batch-level error, or a line
+    missing from the response, counts as that line's failure.
+    """
+    outcomes = []
+    for batch in group_journal_batches(entries):
+        claim.keep()
+        started = time.perf_counter()
+        try:
+            response, error = post_journal_batch([
+                {
+                    "line_id": entry.id,
+                    "transaction_id": entry.transaction_id,
+                    "gl_code": entry.gl_code,
+                    "amount": entry.amount,
+                    "description": entry.description or "",
+                    "posting_date": entry.posting_date.date().isoformat() if entry.posting_date else None,
+                    "idempotency_key": idempotency_key(entry),
+                }
+                for entry in batch
+            ]), None
+        except Exception as e:
+            response, error = None, f"{type(e).__name__}: {e}"
+        _count_call(len(batch), time.perf_counter() - started)
+
+        for entry in batch:
+            line = response["lines"].get(entry.id) if response else None
+            if line is not None:
+                outcomes.append((entry, {**line, "batch_reference": response.get("batch_reference")}, None))
+            elif response is not None and response.get("lines"):
+                outcomes.append((entry, None, f"line missing from journal batch {response.get('batch_reference')}"))
+            elif response is not None:
+                outcomes.append((entry, {
+                    "success": False,
+                    "erp_response_code": response.get("erp_response_code", "500"),
+                    "erp_response_message": response.get("erp_response_message", "Journal batch rejected"),
+                }, None))
+            else:
+                outcomes.append((entry, None, error))
+    return outcomes
+
+
+def group_journal_batches(
+    entries: list[ERPOutbox],
+    grouping: str = ERP_BATCH_GROUPING,
+    max_lines: int = ERP_BATCH_MAX_LINES,
+) -> list[list[ERPOutbox]]:
+    """
+    Split entries into journal batches of at most ``max_lines`` lines.
+
+    ``gl_date`` keeps one GL code and posting date per batch (how batch
+    journal imports are usually keyed); ``size`` just fills batches in order.
+    """
+    if grouping == "gl_date":
+        groups: dict[tuple, list[ERPOutbox]] = {}
+        for entry in entries:
+            posting_day = entry.posting_date.date() if entry.posting_date else None
+            groups.setdefault((entry.gl_code, posting_day), []).append(entry)
+        ordered = list(groups.values())
+    else:
+        ordered = [entries]
+    return [group[i:i + max_lines] for group in ordered for i in range(0, len(group), max_lines)]
+
+
+def _count_call(lines: int, seconds: float):
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["lines"] += lines
+        _stats["call_seconds"] += seconds
+
+
+def drain_outbox(db: Session) -> dict:
+    """Deliver every entry that is due now (used by tests and scripts)."""
+    totals = {"posted": 0, "retried": 0, "failed": 0}
+    while entries := claim_due(db):
+        for key, value in deliver(db, entries).items():
+            totals[key] += value
+    return totals
+
+
+def get_outbox_stats(db: Session) -> dict:
+    """Entries per status, age of the oldest due entry, and this process's delivery counters."""
+    by_status = dict(db.query(ERPOutbox.status, func.count(ERPOutbox.id)).group_by(ERPOutbox.status).all())
+    oldest = (
+        db.query(func.min(ERPOutbox.created_at))
+        .filter(ERPOutbox.status.in_(["pending", "in_flight"]))
+        .scalar()
+    )
+    with _stats_lock:
+        stats = dict(_stats)
+    calls = stats.pop("calls")
+    call_seconds = stats.pop("call_seconds")
+    return {
+        "workers": len(_workers),
+        "by_status": {s: by_status.get(s, 0) for s in ("pending", "in_flight", "posted", "failed")},
+        "oldest_undelivered_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else None,
+        "process": {**stats, "calls": calls, "avg_call_ms": round(call_seconds / calls * 1000, 2) if calls else None},
+        "transport": get_transport_stats(),
+    }
+
+
+# ── Workers ──────────────────────────────────────────────────────────
+def _worker_loop():
+    while not _stop.is_set():
+        db = SessionLocal()
+        try:
+            entries = claim_due(db)
+            if entries:
+                deliver(db, entries)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠ ERP outbox delivery failed: {e}")
+            entries = []
+        finally:
+            db.close()
+
+        if len(entries) == (ERP_BATCH_MAX_LINES if ERP_BATCH_ENABLED else ERP_OUTBOX_CLAIM_SIZE):
+            continue  # probably more due right away
+        _wake.wait(ERP_OUTBOX_POLL_SECONDS)
+        _wake.clear()
+
+
+def start_outbox_workers():
+    """Start this process's outbox threads (they pick up entries left by a restart too)."""
+    _stop.clear()
+    while len(_workers) < ERP_OUTBOX_WORKERS:
+        worker = threading.Thread(target=_worker_loop, name=f"erp-outbox-{len(_workers)}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def stop_outbox_workers():
+    """Stop the outbox threads after their current claim; undelivered entries stay queued."""
+    _stop.set()
+    _wake.set()
+    for worker in _workers:
+        worker.join()
+    _workers.clear()
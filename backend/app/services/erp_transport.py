@@ -0,0 +1,362 @@
+"""
+ERP transports behind ``erp_client``.
+
+A transport turns one journal entry or one journal batch into an ERP
+response dict. ``MockTransport`` answers in-process (random failures, no
+network); ``HttpTransport`` talks to a real endpoint through a pooled
+keep-alive ``httpx.AsyncClient`` with a per-host concurrency limit, timeouts
+and a circuit breaker. Both keep latency / throughput counters.
+"""
+
+import asyncio
+import math
+import random
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import (
+    ERP_SUCCESS_RATE,
+    ERP_TIMEOUT_SECONDS,
+    ERP_CONNECT_TIMEOUT_SECONDS,
+    ERP_HTTP_MAX_CONNECTIONS,
+    ERP_HTTP_MAX_KEEPALIVE,
+    ERP_HTTP_PER_HOST_LIMIT,
+    ERP_BREAKER_FAILURE_THRESHOLD,
+    ERP_BREAKER_RESET_SECONDS,
+)
+
+
+class CircuitOpenError(Exception):
+    """The ERP failed repeatedly; calls are rejected until the breaker lets a probe through."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed → open after ``failure_threshold`` failures in a row; open rejects
+    every call for ``reset_seconds``, then half-open lets a single probe
+    through: its success closes the circuit, its failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = ERP_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = ERP_BREAKER_RESET_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the probe slot when half-open)."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._probing or self._failures >= self.failure_threshold:
+            if self._opened_at is None or self._probing:
+                self.times_opened += 1
+            self._opened_at = self._clock()
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures, "times_opened": self.times_opened}
+
+
+class TransportStats:
+    """Latency / throughput counters of one transport."""
+
+    def __init__(self, window: int = 1000):
+        self.started = time.monotonic()
+        self.calls = 0
+        self.lines = 0
+        self.errors = 0    # network errors, timeouts and 5xx responses
+        self.rejected = 0  # short-circuited by an open breaker
+        self.busy_seconds = 0.0
+        self._recent = deque(maxlen=window)  # latencies of the last ``window`` calls
+
+    def record(self, lines: int, seconds: float, ok: bool):
+        self.calls += 1
+        self.lines += lines
+        self.busy_seconds += seconds
+        self._recent.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        recent = sorted(self._recent)
+        return {
+            "calls": self.calls,
+            "lines": self.lines,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "avg_ms": round(self.busy_seconds / self.calls * 1000, 2) if self.calls else None,
+            "p95_ms": round(recent[math.ceil(len(recent) * 0.95) - 1] * 1000, 2) if recent else None,
+            "calls_per_second": round(self.calls / elapsed, 2) if elapsed > 0 else None,
+            "lines_per_second": round(self.lines / elapsed, 2) if elapsed > 0 else None,
+        }
+
+
+class ERPTransport:
+    """Interface of an ERP transport; responses follow ``erp_client.post_to_erp``."""
+
+    name = "base"
+
+    def __init__(self):
+        self.counters = TransportStats()
+
+    async def post_entry(self, entry: dict) -> dict:
+        """Post one journal entry {transaction_id, gl_code, amount, description}."""
+        raise NotImplementedError
+
+    async def post_batch(self, lines: list[dict]) -> dict:
+        """Post a journal batch; line results come back as a list carrying each ``line_id``."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"transport": self.name, **self.counters.snapshot()}
+
+
+class MockTransport(ERPTransport):
+    """
+    In-process mock ERP: ``success_rate`` of entries post, the rest fail with
+    a 500. Like a real ERP it books each ``idempotency_key`` once.
+    """
+
+    name = "mock"
+
+    def __init__(self, success_rate: float = ERP_SUCCESS_RATE, latency_ms: float = 0.0):
+        super().__init__()
+        self.success_rate = success_rate
+        self.latency_ms = latency_ms
+        self.booked: dict[str, dict] = {}  # idempotency key → response of its posting
+        self.duplicates = 0
+
+    async def post_entry(self, entry: dict) -> dict:
+        started = time.perf_counter()
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        result = self._respond(entry)
+        self.counters.record(1, time.perf_counter() - started, True)
+        return result
+
+    async def post_batch(self, lines: list[dict]) -> dict:
+        started = time.perf_counter()
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        batch_ref = f"JB-{uuid.uuid4().hex[:8].upper()}"
+        results = [{"line_id": line["line_id"], **self._respond(line)} for line in lines]
+        self.counters.record(len(lines), time.perf_counter() - started, True)
+        return {
+            "success": True,
+            "batch_reference": batch_ref,
+            "erp_response_code": "200",
+            "erp_response_message": f"Journal batch {batch_ref} processed: "
+                                    f"{sum(r['success'] for r in results)}/{len(results)} lines posted",
+            "lines": results,
+        }
+
+    def _respond(self, entry: dict) -> dict:
+        key = entry.get("idempotency_key")
+        if key in self.booked:
+            self.duplicates += 1
+            return self.booked[key]
+
+        erp_ref = f"ERP-{uuid.uuid4().hex[:8].upper()}"
+        description = entry.get("description") or ""
+
+        if random.random() < self.success_rate:
+            response = {
+                "success": True,
+                "erp_response_code": "200",
+                "erp_response_message": f"Posted successfully. ERP Reference: {erp_ref}",
+                "erp_reference": erp_ref,
+                "posted_at": datetime.utcnow().isoformat(),
+                "journal_entry": {
+                    "debit_account": entry["gl_code"],
+                    "credit_account": "1100",  # Cash & Bank (default offset)
+                    "amount": entry["amount"],
+                    "memo": description[:100],
+                },
+            }
+            if key:
+                self.booked[key] = response
+            return response
+        else:
+            return {
+                "success": False,
+                "erp_response_code": "500",
+                "erp_response_message": "ERP posting failed: Temporary service unavailability. Retry recommended.",
+                "erp_reference": None,
+                "posted_at": None,
+            }
+
+    def stats(self) -> dict:
+        return {**super().stats(), "duplicates_ignored": self.duplicates}
+
+
+class HttpTransport(ERPTransport):
+    """
+    ERP REST endpoint at ``base_url`` (POST /journal-entries, /journal-batches).
+
+    One pooled keep-alive client per event loop, at most ``per_host_limit``
+    requests in flight to the host, and a circuit breaker that rejects calls
+    with ``CircuitOpenError`` while the ERP keeps failing (5xx, timeouts,
+    connection errors). ``http_transport`` swaps the network layer, e.g. for
+    an ``httpx.MockTransport`` in tests.
+    """
+
+    name = "http"
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = ERP_TIMEOUT_SECONDS,
+        connect_timeout: float = ERP_CONNECT_TIMEOUT_SECONDS,
+        max_connections: int = ERP_HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = ERP_HTTP_MAX_KEEPALIVE,
+        per_host_limit: int = ERP_HTTP_PER_HOST_LIMIT,
+        breaker: CircuitBreaker | None = None,
+        http_transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.host = urlsplit(self.base_url).netloc
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.per_host_limit = per_host_limit
+        self.breaker = breaker or CircuitBreaker()
+        self._http_transport = http_transport
+        self._clients: dict[asyncio.AbstractEventLoop, tuple[httpx.AsyncClient, asyncio.Semaphore]] = {}
+        self.in_flight = 0
+
+    async def post_entry(self, entry: dict) -> dict:
+        return await self._post("/journal-entries", entry, 1)
+
+    async def post_batch(self, lines: list[dict]) -> dict:
+        return await self._post("/journal-batches", {"lines": lines}, len(lines))
+
+    async def _post(self, path: str, body: dict, lines: int) -> dict:
+        if not self.breaker.allow():
+            self.counters.rejected += 1
+            raise CircuitOpenError(f"ERP circuit open for {self.host}")
+
+        client, slots = self._for_running_loop()
+        async with slots:
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+            except httpx.HTTPError:
+                self.breaker.record_failure()
+                self.counters.record(lines, time.perf_counter() - started, False)
+                raise
+            finally:
+                self.in_flight -= 1
+
+        failed = response.status_code >= 500
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self.counters.record(lines, time.perf_counter() - started, not failed)
+        return _posting_response(response)
+
+    def _for_running_loop(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        # Connections belong to the loop that opened them: every loop (the
+        # app's, a one-off ``asyncio.run``) keeps a client of its own until
+        # ``aclose`` runs on it, so no client is ever replaced while still open
+        loop = asyncio.get_running_loop()
+        pooled = self._clients.get(loop)
+        if pooled is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self._http_transport,
+            )
+            pooled = self._clients[loop] = (client, asyncio.Semaphore(self.per_host_limit))
+        return pooled
+
+    async def aclose(self):
+        """Close the running loop's client (and forget those of loops already closed)."""
+        loop = asyncio.get_running_loop()
+        pooled = self._clients.pop(loop, None)
+        for other in list(self._clients):
+            if other.is_closed():
+                self._clients.pop(other, None)
+        if pooled is not None:
+            await pooled[0].aclose()
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "host": self.host,
+            "in_flight": self.in_flight,
+            "circuit": self.breaker.stats(),
+        }
+
+
+def _posting_response(response: httpx.Response) -> dict:
+    """
+    The ERP's JSON body, or – for an error or malformed response – a rejected
+    posting in the same {success, erp_response_code, erp_response_message} shape.
+
+    Error bodies in the ERP's own shape are kept (with ``success`` forced off);
+    anything else, e.g. a framework's ``{"detail": ...}``, falls back to the
+    status line. A 2xx body without a response code reads as 502, so it is retried.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and "erp_response_code" in body:
+        body["erp_response_code"] = str(body["erp_response_code"])
+        return body if response.is_success else {**body, "success": False}
+
+    if response.is_success:
+        code, detail = "502", "malformed ERP response"
+    else:
+        code = str(response.status_code)
+        detail = (body.get("detail") if isinstance(body, dict) else None) or response.reason_phrase
+    return {
+        "success": False,
+        "erp_response_code": code,
+        "erp_response_message": f"ERP posting failed: {detail}",
+        "erp_reference": None,
+        "posted_at": None,
+    }
@@ -0,0 +1,286 @@
+"""
+Background classification jobs.
+
+Jobs live in the ``classification_jobs`` table, so they survive restarts and
+are visible to every worker process. Each process runs a small pool of job
+threads that claim queued jobs with an atomic UPDATE and classify
+CLASSIFY_CHUNK_SIZE transactions at a time. After every chunk the last
+transaction id is checkpointed in the same DB transaction as the chunk's
+predictions, so a job whose worker died (no checkpoint for
+CLASSIFY_JOB_STALE_SECONDS) is picked up by another worker and resumes right
+after its checkpoint.
+"""
+
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+
+from app.config import (
+    CLASSIFY_CHUNK_SIZE,
+    CLASSIFY_JOB_WORKERS,
+    CLASSIFY_JOB_POLL_SECONDS,
+    CLASSIFY_JOB_STALE_SECONDS,
+)
+from app.database import SessionLocal
+from app.models import ClassificationJob
+from app.services.classifier import classify_chunk, iter_unclassified, unclassified_query
+
+_workers: list[threading.Thread] = []
+_wake = threading.Event()
+_stop = threading.Event()
+
+
+def _claim_token() -> str:
+    """
+    Owner value for one claim. Unique per claim, not just per process: after a
+    stale reclaim the stalled thread and the new owner may share a process.
+    """
+    # Evaluated per call: gunicorn workers fork from a master that imported this module
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# ── Job API ──────────────────────────────────────────────────────────
+def submit_job(
+    db: Session,
+    transaction_ids: list[int] | None = None,
+    batch_id: str | None = None,
+) -> ClassificationJob:
+    """Queue a classification run; any worker process may pick it up."""
+    job = ClassificationJob(
+        id=f"JOB-{uuid.uuid4().hex[:8].upper()}",
+        status="queued",
+        batch_id=batch_id,
+        transaction_ids=json.dumps(transaction_ids) if transaction_ids else None,
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _wake.set()
+    return job
+
+
+def cancel_job(db: Session, job_id: str) -> ClassificationJob | None:
+    """
+    Cancel a job. A queued job stops right away; a running job stops after
+    its current chunk (everything committed so far is kept).
+    """
+    job = db.get(ClassificationJob, job_id)
+    if job is None:
+        return None
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+    elif job.status == "running":
+        job.cancel_requested = 1
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def resume_job(db: Session, job_id: str) -> ClassificationJob | None:
+    """Re-queue a cancelled or failed job; it continues after its checkpoint."""
+    job = db.get(ClassificationJob, job_id)
+    if job is None:
+        return None
+    if job.status in ("cancelled", "failed"):
+        job.status = "queued"
+        job.cancel_requested = 0
+        job.error = None
+        job.finished_at = None
+        db.commit()
+        db.refresh(job)
+        _wake.set()
+    return job
+
+
+def job_progress(job: ClassificationJob) -> dict:
+    """
+    Job row plus throughput of the current run.
+
+    Returns:
+        dict matching ``JobRead`` (rows_per_second / eta_seconds are None until measurable)
+    """
+    rate = eta = None
+    if job.started_at is not None:
+        until = job.finished_at or (datetime.utcnow() if job.status == "running" else job.heartbeat_at)
+        elapsed = ((until or job.started_at) - job.started_at).total_seconds()
+        done = job.processed - job.run_start_processed
+        if elapsed > 0 and done > 0:
+            rate = round(done / elapsed, 2)
+            if job.status == "running" and job.total is not None:
+                eta = round(max(job.total - job.processed, 0) / rate, 1)
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "batch_id": job.batch_id,
+        "total": job.total,
+        "processed": job.processed,
+        "auto_posted": job.auto_posted,
+        "pending_review": job.pending_review,
+        "manual_required": job.manual_required,
+        "rows_per_second": rate,
+        "eta_seconds": eta,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# ── Execution ────────────────────────────────────────────────────────
+def claim_next_job(db: Session) -> tuple[str, str] | None:
+    """
+    Atomically take the oldest queued job, or a running job whose owner
+    stopped checkpointing.
+
+    Returns:
+        (job id, claim token) to pass to ``run_job``, or None when there is nothing to do
+    """
+    now = datetime.utcnow()
+    claimable = or_(
+        ClassificationJob.status == "queued",
+        and_(
+            ClassificationJob.status == "running",
+            ClassificationJob.heartbeat_at < now - timedelta(seconds=CLASSIFY_JOB_STALE_SECONDS),
+        ),
+    )
+    candidates = (
+        db.query(ClassificationJob.id)
+        .filter(claimable)
+        .order_by(ClassificationJob.created_at)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        owner = _claim_token()
+        claimed = db.execute(
+            update(ClassificationJob)
+            .where(ClassificationJob.id == job_id, claimable)
+            .values(
+                status="running",
+                owner=owner,
+                started_at=now,
+                heartbeat_at=now,
+                run_start_processed=ClassificationJob.processed,
+            )
+        )
+        db.commit()
+        if claimed.rowcount == 1:
+            return job_id, owner
+    return None
+
+
+def run_job(job_id: str, owner: str):
+    """
+    Process a claimed job chunk by chunk until it completes, is cancelled or fails.
+
+    Stops as soon as the job's owner is no longer ``owner`` (the claim token
+    from ``claim_next_job``), i.e. another thread or worker took it over.
+    """
+    db = SessionLocal()
+    try:
+        while True:
+            job = db.get(ClassificationJob, job_id)
+            if job.status != "running" or job.owner != owner:
+                return  # taken over by another worker
+            if job.cancel_requested:
+                _finish(db, job, "cancelled")
+                return
+            if _stop.is_set():
+                # Shutting down: hand the job back so the next worker resumes it immediately
+                job.status, job.owner = "queued", None
+                db.commit()
+                return
+
+            transaction_ids = json.loads(job.transaction_ids) if job.transaction_ids else None
+            if job.total is None:
+                job.total = unclassified_query(db, transaction_ids, job.batch_id).count()
+                db.commit()
+
+            chunks = iter_unclassified(db, transaction_ids, job.batch_id, CLASSIFY_CHUNK_SIZE, job.checkpoint_id)
+            chunk = next(chunks, [])
+            if not chunk:
+                _finish(db, job, "completed")
+                return
+
+            counts = classify_chunk(db, chunk)
+            checkpoint = db.execute(
+                update(ClassificationJob)
+                .where(
+                    ClassificationJob.id == job_id,
+                    ClassificationJob.owner == owner,
+                    ClassificationJob.status == "running",
+                )
+                .values(
+                    processed=ClassificationJob.processed + len(chunk),
+                    auto_posted=ClassificationJob.auto_posted + counts["auto_posted"],
+                    pending_review=ClassificationJob.pending_review + counts["pending_review"],
+                    manual_required=ClassificationJob.manual_required + counts["manual_required"],
+                    checkpoint_id=chunk[-1].id,
+                    heartbeat_at=datetime.utcnow(),
+                )
+            )
+            if checkpoint.rowcount != 1:
+                db.rollback()  # lost the job – its new owner redoes this chunk
+                return
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠ Classification job {job_id} failed: {e}")
+        job = db.get(ClassificationJob, job_id)
+        if job is not None and job.owner == owner:
+            job.error = str(e)
+            _finish(db, job, "failed")
+    finally:
+        db.close()
+
+
+def _finish(db: Session, job: ClassificationJob, status: str):
+    job.status = status
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    print(f"✓ Classification job {job.id} {status} ({job.processed}/{job.total} rows)")
+
+
+def _worker_loop():
+    while not _stop.is_set():
+        db = SessionLocal()
+        try:
+            claim = claim_next_job(db)
+        except Exception as e:
+            print(f"⚠ Job queue poll failed: {e}")
+            claim = None
+        finally:
+            db.close()
+
+        if claim is not None:
+            run_job(*claim)
+            continue
+        _wake.wait(CLASSIFY_JOB_POLL_SECONDS)
+        _wake.clear()
+
+
+def start_job_workers():
+    """Start this process's job threads (they resume interrupted jobs too)."""
+    _stop.clear()
+    while len(_workers) < CLASSIFY_JOB_WORKERS:
+        worker = threading.Thread(target=_worker_loop, name=f"classify-job-{len(_workers)}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def stop_job_workers():
+    """Stop the job threads; a running job is re-queued after its current chunk."""
+    _stop.set()
+    _wake.set()
+    for worker in _workers:
+        worker.join()
+    _workers.clear()
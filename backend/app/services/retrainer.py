@@ -9,12 +9,14 @@ from sqlalchemy.orm import Session
 from app.models import Correction, Prediction, Transaction, AuditLog
 from app.ml.embeddings import encode_texts, build_transaction_text
 from app.ml.vector_store import add_vectors, save_index, get_total_vectors
+from app.ml.linear_head import schedule_training
 
 
 def retrain_from_corrections(db: Session) -> dict:
     """
     Incremental retraining: take all unused corrections and add them
     to the FAISS index so future predictions benefit from human feedback.
+    The linear classifier head is then refit on the new snapshot in the background.
 
     Returns:
         {corrections_used: int, new_vectors_added: int}
@@ -59,6 +61,7 @@ def retrain_from_corrections(db: Session) -> dict:
         embeddings = encode_texts(texts)
         add_vectors(embeddings, labels)
         save_index()
+        schedule_training()
 
         # Mark corrections as used
         for correction in corrections:
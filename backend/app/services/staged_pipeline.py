@@ -0,0 +1,152 @@
+"""
+Producer/consumer stages connected by bounded queues.
+
+Each stage runs its own worker threads and pulls work items (lists of rows)
+from the queue in front of it, so a CPU-bound stage (embedding) overlaps with
+I/O-bound ones (SQLite writes, ERP calls). The bounded queues give
+backpressure: a fast producer blocks instead of buffering a whole batch in
+memory.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class Stage:
+    """
+    One pipeline stage.
+
+    ``fn`` takes a work item and returns the item for the next stage (or None
+    to drop it). The last stage's return value is ignored.
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self.items = 0
+        self.rows = 0
+        self.busy_seconds = 0.0     # inside ``fn``
+        self.idle_seconds = 0.0     # waiting for input
+        self.blocked_seconds = 0.0  # waiting for room in the next queue
+
+    def _record(self, rows: int, busy: float, idle: float, blocked: float):
+        with self._lock:
+            self.items += 1
+            self.rows += rows
+            self.busy_seconds += busy
+            self.idle_seconds += idle
+            self.blocked_seconds += blocked
+
+    def stats(self) -> dict:
+        """Counters of the last run; ``rows_per_second`` is per second of busy worker time."""
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "rows": self.rows,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "idle_seconds": round(self.idle_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "rows_per_second": round(self.rows / self.busy_seconds, 1) if self.busy_seconds else None,
+        }
+
+
+def run_stages(source: Iterable, stages: list[Stage], queue_size: int = 4) -> list[dict]:
+    """
+    Feed every item of ``source`` through ``stages`` and wait for all of them.
+
+    ``source`` is consumed in its own thread. The first exception raised by
+    the source or any stage stops the pipeline and is re-raised here.
+
+    Returns:
+        Per-stage stats (see ``Stage.stats``), in stage order
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    abort = threading.Event()
+    errors: list[BaseException] = []
+    remaining = [stage.workers for stage in stages]
+    remaining_lock = threading.Lock()
+
+    def put(q: queue.Queue, item) -> bool:
+        # Time out periodically so a full queue cannot hang the pipeline after an abort
+        while not abort.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: queue.Queue):
+        while True:
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if abort.is_set():
+                    return _DONE
+
+    def fail(error: BaseException):
+        errors.append(error)
+        abort.set()
+
+    def close(i: int):
+        """Signal end-of-input to every worker of stage ``i``."""
+        if i < len(stages):
+            for _ in range(stages[i].workers):
+                put(queues[i], _DONE)
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            fail(e)
+        finally:
+            close(0)
+
+    def work(i: int):
+        stage = stages[i]
+        try:
+            while True:
+                waited = time.perf_counter()
+                item = get(queues[i])
+                if item is _DONE:
+                    return
+
+                started = time.perf_counter()
+                result = stage.fn(item)
+                finished = time.perf_counter()
+                if result is not None and i + 1 < len(stages):
+                    put(queues[i + 1], result)
+                stage._record(len(item), finished - started, started - waited, time.perf_counter() - finished)
+        except BaseException as e:
+            fail(e)
+        finally:
+            with remaining_lock:
+                remaining[i] -= 1
+                last = remaining[i] == 0
+            if last:
+                close(i + 1)
+
+    threads = [threading.Thread(target=feed, name="stage-source", daemon=True)]
+    for i, stage in enumerate(stages):
+        threads += [
+            threading.Thread(target=work, args=(i,), name=f"stage-{stage.name}-{n}", daemon=True)
+            for n in range(stage.workers)
+        ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return [stage.stats() for stage in stages]
@@ -0,0 +1,47 @@
+"""Keyset (cursor) pagination helpers for list endpoints."""
+
+import base64
+import json
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Opaque cursor holding the sort key of the last row of a page."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """
+    Sort key from a cursor made by ``encode_cursor``.
+
+    Args:
+        cursor: value of the ``cursor`` query parameter
+        size: number of values the endpoint's sort key has
+
+    Returns:
+        The sort key values; a malformed cursor is a 400.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(400, "Invalid cursor")
+    return values
+
+
+def set_next_cursor(response: Response, rows: list, limit: int, key) -> str | None:
+    """
+    Point the client at the next page via the ``X-Next-Cursor`` header.
+
+    A short page is the last one and gets no cursor. ``key`` maps a row to
+    its sort key tuple. The list response body itself stays a plain array.
+    """
+    if len(rows) < limit or not rows:
+        return None
+    cursor = encode_cursor(*key(rows[-1]))
+    response.headers[NEXT_CURSOR_HEADER] = cursor
+    return cursor
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings.
+
+The app is imported once in the master and workers fork from it:
+  - the DB and FAISS index are prepared once, before any worker starts
+  - every worker memory-maps the same read-only index snapshot (FAISS_MMAP)
+  - the master encodes on one torch thread and keeps no model, so no OpenMP
+    or onnxruntime thread pool crosses the fork; each worker loads its model
+    right after fork (EMBEDDING_PRELOAD) instead of on its first request
+"""
+
+preload_app = True
+
+
+def when_ready(server):
+    from app.main import prepare_shared_state
+    prepare_shared_state()
+
+
+def post_fork(server, worker):
+    # Pooled SQLite connections must not cross the fork
+    from app.database import engine
+    engine.dispose()
+
+    from app.main import prepare_worker
+    prepare_worker()
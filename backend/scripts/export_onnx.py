@@ -0,0 +1,48 @@
+"""
+Export the embedding model to int8-quantized ONNX and verify parity with PyTorch.
+Produces:
+  - data/onnx/<model>/model.onnx, model_int8.onnx, tokenizer.json
+
+Run from backend/:  python scripts/export_onnx.py
+Then start the app with EMBEDDING_BACKEND=onnx.
+"""
+
+import csv
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sentence_transformers import SentenceTransformer  # noqa: E402
+
+from app.config import (  # noqa: E402
+    DATA_DIR, EMBEDDING_MODEL_NAME, ONNX_MODEL_DIR, ONNX_PARITY_THRESHOLD,
+)
+from app.ml.embeddings import build_transaction_text  # noqa: E402
+from app.ml.onnx_backend import OnnxEmbedder, check_parity, export_quantized_onnx  # noqa: E402
+
+
+def load_sample_texts(limit: int = 500) -> list[str]:
+    """Transaction texts used for the parity check."""
+    txn_file = DATA_DIR / "synthetic_transactions.csv"
+    texts = []
+    with open(txn_file, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            texts.append(build_transaction_text(row["description"], row["vendor"], row["department"]))
+            if len(texts) >= limit:
+                break
+    return texts
+
+
+if __name__ == "__main__":
+    reference = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    export_quantized_onnx(reference, ONNX_MODEL_DIR)
+
+    result = check_parity(reference, OnnxEmbedder(ONNX_MODEL_DIR), load_sample_texts(), ONNX_PARITY_THRESHOLD)
+    print(f"Parity: min cosine {result['min_cosine']}, mean {result['mean_cosine']} "
+          f"(threshold {result['threshold']})")
+
+    if not result["passed"]:
+        print("✗ Quantized model drifts too far from PyTorch – do not enable EMBEDDING_BACKEND=onnx")
+        sys.exit(1)
+    print("✓ Parity check passed")
@@ -0,0 +1,172 @@
+"""
+Local mock ERP HTTP server for offline load tests of the ERP outbox.
+
+Accepts POST /journal-entries with {transaction_id, gl_code, amount,
+description} and POST /journal-batches with {"lines": [...]} and answers
+like ``app.services.erp_client`` does, after a configurable latency and with
+a configurable share of 500 responses – per request, and per line within a
+batch. An entry or line whose ``idempotency_key`` was already posted gets
+that posting's response again instead of a second booking. GET /stats
+returns request counters.
+
+Run from backend/:  python scripts/mock_erp_server.py --latency-ms 80 --failure-rate 0.2
+Then start the app with ERP_API_URL=http://localhost:8900.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_lock = threading.Lock()
+_counts = {"requests": 0, "lines": 0, "posted": 0, "failed": 0, "duplicates": 0}
+_booked: dict[str, dict] = {}  # idempotency key → response of its posting
+
+
+_UNAVAILABLE = {
+    "success": False,
+    "erp_response_code": "500",
+    "erp_response_message": "ERP posting failed: Temporary service unavailability. Retry recommended.",
+    "erp_reference": None,
+    "posted_at": None,
+}
+
+
+def _book(entry: dict, failure_rate: float = 0.0) -> dict:
+    """Post one entry – or answer with the earlier posting of its idempotency key."""
+    key = entry.get("idempotency_key")
+    with _lock:
+        if key in _booked:
+            _counts["duplicates"] += 1
+            return _booked[key]
+    if random.random() < failure_rate:
+        with _lock:
+            _counts["failed"] += 1
+        return _UNAVAILABLE
+    response = _posted(entry)
+    with _lock:
+        if key and _booked.setdefault(key, response) is not response:
+            _counts["duplicates"] += 1  # the same key raced in on another connection
+            return _booked[key]
+        _counts["posted"] += 1
+    return response
+
+
+def _posted(entry: dict) -> dict:
+    erp_ref = f"ERP-{uuid.uuid4().hex[:8].upper()}"
+    return {
+        "success": True,
+        "erp_response_code": "200",
+        "erp_response_message": f"Posted successfully. ERP Reference: {erp_ref}",
+        "erp_reference": erp_ref,
+        "posted_at": datetime.utcnow().isoformat(),
+        "journal_entry": {
+            "debit_account": entry.get("gl_code"),
+            "credit_account": "1100",  # Cash & Bank (default offset)
+            "amount": entry.get("amount"),
+            "memo": (entry.get("description") or "")[:100],
+        },
+    }
+
+
+class MockERPHandler(BaseHTTPRequestHandler):
+    latency_ms = 50.0
+    jitter_ms = 25.0
+    per_line_ms = 0.2
+    failure_rate = 0.05
+    line_failure_rate = 0.01
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path not in ("/journal-entries", "/journal-batches"):
+            self._reply(404, {"detail": "Not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self._reply(400, {"success": False, "erp_response_code": "400",
+                              "erp_response_message": "Malformed journal entry"})
+            return
+
+        lines = body.get("lines", []) if path == "/journal-batches" else [body]
+        latency_ms = random.gauss(self.latency_ms, self.jitter_ms) + self.per_line_ms * len(lines)
+        time.sleep(max(0.0, latency_ms) / 1000)
+        failed = random.random() < self.failure_rate
+        with _lock:
+            _counts["requests"] += 1
+            _counts["lines"] += len(lines)
+        if failed:
+            with _lock:
+                _counts["failed"] += len(lines)
+            self._reply(500, _UNAVAILABLE)
+            return
+
+        if path == "/journal-entries":
+            self._reply(200, _book(body))
+            return
+
+        # Each line of a batch is accepted or rejected on its own
+        results = [{"line_id": line.get("line_id"), **_book(line, self.line_failure_rate)} for line in lines]
+        posted = sum(r["success"] for r in results)
+        batch_ref = f"JB-{uuid.uuid4().hex[:8].upper()}"
+        self._reply(200, {
+            "success": True,
+            "batch_reference": batch_ref,
+            "erp_response_code": "200",
+            "erp_response_message": f"Journal batch {batch_ref} processed: {posted}/{len(results)} lines posted",
+            "lines": results,
+        })
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with _lock:
+                self._reply(200, dict(_counts))
+        else:
+            self._reply(404, {"detail": "Not found"})
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # one line per request would dominate a load test
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=25.0, help="standard deviation of the latency")
+    parser.add_argument("--per-line-ms", type=float, default=0.2, help="extra latency per journal batch line")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="share of requests answered with 500")
+    parser.add_argument("--line-failure-rate", type=float, default=0.01,
+                        help="share of journal batch lines rejected with 500")
+    args = parser.parse_args()
+
+    MockERPHandler.latency_ms = args.latency_ms
+    MockERPHandler.jitter_ms = args.jitter_ms
+    MockERPHandler.per_line_ms = args.per_line_ms
+    MockERPHandler.failure_rate = args.failure_rate
+    MockERPHandler.line_failure_rate = args.line_failure_rate
+
+    server = ThreadingHTTPServer((args.host, args.port), MockERPHandler)
+    print(f"✓ Mock ERP listening on http://{args.host}:{args.port} "
+          f"(latency {args.latency_ms}±{args.jitter_ms} ms, failure rate {args.failure_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {_counts['requests']} requests ({_counts['lines']} lines): "
+              f"{_counts['posted']} posted, {_counts['failed']} failed, "
+              f"{_counts['duplicates']} duplicates ignored")
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.config import FAISS_INDEX_DIR
+from app.database import Base
+from app.ml import linear_head, pipeline, vector_store
+
+
+@pytest.fixture
+def make_session_factory(tmp_path):
+    """
+    Build session factories on fresh, empty databases.
+
+    ``make_session_factory()`` is one in-memory DB whose single connection
+    (StaticPool) every session and thread shares. ``file=True`` gives a
+    SQLite file instead, for sessions that must really run concurrently.
+    """
+    engines = []
+
+    def make(file: bool = False) -> sessionmaker:
+        if file:
+            url, pool = f"sqlite:///{tmp_path / f'test-{len(engines)}.db'}", {}
+        else:
+            url, pool = "sqlite://", {"poolclass": StaticPool}
+        engine = create_engine(url, connect_args={"check_same_thread": False}, **pool)
+        Base.metadata.create_all(engine)
+        engines.append(engine)
+        return sessionmaker(bind=engine)
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def session_factory(request, make_session_factory):
+    """
+    Session factory on a fresh DB, in memory by default.
+
+    For a file DB: ``@pytest.mark.parametrize("session_factory", ["file"], indirect=True)``.
+    """
+    return make_session_factory(file=getattr(request, "param", "memory") == "file")
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """
+    Point every index snapshot path at an empty directory.
+
+    Rebases each module-level path under FAISS_INDEX_DIR, so a snapshot file
+    added later is covered too and tests never write into the real index.
+    """
+    directory = tmp_path / "faiss_index"
+    directory.mkdir()
+    real = str(FAISS_INDEX_DIR)
+    for module in (vector_store, pipeline, linear_head):
+        for name, value in list(vars(module).items()):
+            if isinstance(value, (str, Path)) and str(value).startswith(real):
+                rebased = str(directory) + str(value)[len(real):]
+                monkeypatch.setattr(module, name, type(value)(rebased))
+    return directory
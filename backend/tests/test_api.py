@@ -21,3 +21,26 @@ def test_coa_endpoint():
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
+
+def test_gunicorn_master_forks_without_model_or_thread_pool(monkeypatch):
+    import torch
+    from app import main
+    from app.ml import embeddings
+
+    threads = torch.get_num_threads()
+    seen = []
+    for name in ("init_db", "seed_chart_of_accounts", "wait_for_compaction", "release_index"):
+        monkeypatch.setattr(main, name, lambda: None)
+    monkeypatch.setattr(main, "initialize_index_from_coa", lambda: seen.append(torch.get_num_threads()))
+    monkeypatch.setattr(main, "_worker_torch_threads", None)
+    monkeypatch.setattr(main, "EMBEDDING_PRELOAD", False)
+    monkeypatch.setattr(embeddings, "_model", object())
+    try:
+        main.prepare_shared_state()
+        assert seen == [1]  # index built on a single torch thread
+        assert embeddings._model is None
+
+        main.prepare_worker()
+        assert torch.get_num_threads() == threads
+    finally:
+        torch.set_num_threads(threads)
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.ml.batcher import MicroBatcher
+
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    calls = []
+
+    def encode_fn(texts):
+        calls.append(len(texts))
+        return np.array([[float(len(t))] for t in texts], dtype=np.float32)
+
+    async def run():
+        batcher = MicroBatcher(encode_fn, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        texts = ["a" * i for i in range(1, 21)]
+        vectors = await asyncio.gather(*[batcher.encode(t) for t in texts])
+        await batcher.stop()
+        return texts, vectors, batcher
+
+    texts, vectors, batcher = asyncio.run(run())
+
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert sum(calls) == 20
+    assert max(calls) <= 8
+    assert batcher.batches == len(calls) < 20
+
+
+def test_stop_fails_queued_and_inflight_requests():
+    release = threading.Event()
+
+    def encode_fn(texts):
+        release.wait(5)
+        return np.zeros((len(texts), 1), dtype=np.float32)
+
+    async def run():
+        batcher = MicroBatcher(encode_fn, max_batch_size=1, max_wait_ms=0)
+        await batcher.start()
+        requests = [asyncio.ensure_future(batcher.encode(t)) for t in ("a", "b", "c")]
+        await asyncio.sleep(0.05)  # "a" is being encoded, "b" and "c" are queued
+        await batcher.stop()
+        results = await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), 1)
+        with pytest.raises(RuntimeError):
+            await batcher.encode("d")
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        release.set()
+    assert [type(r) for r in results] == [RuntimeError] * 3
@@ -1,9 +1,11 @@
+import threading
+
 import pytest
 import numpy as np
 
 from app.database import init_db
 from app.ml.vector_store import get_total_vectors, reset_index
-from app.ml.pipeline import initialize_index_from_coa, classify_transaction
+from app.ml.pipeline import initialize_index_from_coa, classify_transaction, classify_transactions
 
 def test_ml_pipeline():
     # Reset state
@@ -34,3 +36,223 @@ def test_ml_pipeline():
     )
 
     assert res2["predicted_gl_code"] == "5400"
+
+
+def test_batch_classification_matches_single():
+    reset_index()
+    initialize_index_from_coa()
+
+    transactions = [
+        {"description": "Flight booking to New York", "vendor": "Delta Airlines", "department": "Sales"},
+        {"description": "Monthly Cloud hosting charges", "vendor": "AWS", "department": "Engineering"},
+        {"description": "Printer paper and toner", "vendor": None, "department": None},
+    ]
+
+    batch = classify_transactions(transactions, chunk_size=2)
+    single = [
+        classify_transaction(t["description"], t["vendor"] or "", t["department"] or "")
+        for t in transactions
+    ]
+
+    assert len(batch) == len(transactions)
+    for b, s in zip(batch, single):
+        assert b["predicted_gl_code"] == s["predicted_gl_code"]
+        assert b["confidence_score"] == pytest.approx(s["confidence_score"], abs=0.01)
+
+
+def test_index_initialization_is_idempotent():
+    reset_index()
+    initialize_index_from_coa()
+    total = get_total_vectors()
+
+    # A restart with unchanged inputs must not append the seed vectors again
+    initialize_index_from_coa()
+    assert get_total_vectors() == total
+
+
+def test_legacy_index_upgrade_keeps_untagged_corrections(index_dir):
+    import csv
+    import json
+
+    import faiss
+
+    from app.config import DATA_DIR
+    from app.ml.embeddings import encode_texts
+    from app.ml.vector_store import get_labels, release_index
+
+    # Baseline snapshot: index.faiss + labels.json without source tags or a manifest
+    with open(DATA_DIR / "chart_of_accounts.csv", "r", encoding="utf-8") as f:
+        coa_rows = list(csv.DictReader(f))
+    coa = coa_rows[0]
+    legacy = [
+        {"gl_code": coa["gl_code"], "gl_name": coa["gl_name"],
+         "text": f"{coa['gl_name']} {coa['category']} {coa['sub_category']}"},
+        {"gl_code": "5100", "gl_name": "Office Supplies", "text": "office supplies stationery printer paper toner"},
+        {"gl_code": "6100", "gl_name": "Insurance", "text": "Hiscox annual cyber policy renewal"},
+    ]
+    index = faiss.IndexFlatL2(encode_texts(["x"]).shape[1])
+    index.add(encode_texts([label["text"] for label in legacy]))
+    faiss.write_index(index, str(index_dir / "index.faiss"))
+    with open(index_dir / "labels.json", "w", encoding="utf-8") as f:
+        json.dump(legacy, f)
+
+    release_index()
+    try:
+        initialize_index_from_coa()
+
+        corrections = get_labels(("correction",))
+        assert [(c["text"], c["gl_code"]) for c in corrections] == [("Hiscox annual cyber policy renewal", "6100")]
+        assert get_labels(("",)) == []
+        # The legacy seed vectors were dropped, not kept next to the fresh ones
+        coa_texts = [label["text"] for label in get_labels(("coa",))]
+        assert coa_texts.count(legacy[0]["text"]) == sum(
+            f"{r['gl_name']} {r['category']} {r['sub_category']}" == legacy[0]["text"] for r in coa_rows
+        )
+    finally:
+        reset_index()
+
+
+def test_centroid_confidence_is_capped_below_auto_post(monkeypatch):
+    from app.config import CENTROID_MAX_CONFIDENCE, EMBEDDING_DIMENSION
+    from app.ml import pipeline
+    from app.ml.vector_store import add_vectors
+    from app.services.router import route_prediction
+
+    monkeypatch.setattr(pipeline, "get_linear_head", lambda: None)
+    reset_index()
+    vectors = np.zeros((3, EMBEDDING_DIMENSION), dtype=np.float32)
+    vectors[[0, 1, 2], [0, 1, 2]] = 1.0
+    add_vectors(vectors, [{"gl_code": code, "gl_name": code} for code in ("5100", "5200", "5400")])
+
+    # Clear margin: the raw softmax is ~100%, far above what the centroids can back up
+    query = vectors[:1] + 0.05 * vectors[1:2]
+    query /= np.linalg.norm(query)
+    prediction = pipeline.classify_vectors(query)[0]
+    reset_index()
+
+    assert prediction["method"] == "centroid" and prediction["predicted_gl_code"] == "5100"
+    assert prediction["top_candidates"][0]["score"] > 99
+    assert prediction["confidence_score"] == CENTROID_MAX_CONFIDENCE
+    assert route_prediction(prediction["confidence_score"])[0] == "pending_review"
+
+
+def test_bulk_persistence_matches_per_row(make_session_factory):
+    from datetime import datetime
+
+    from app import models
+    from app.services import classifier
+
+    results = [
+        {"predicted_gl_code": "5200", "predicted_gl_name": "Travel", "confidence_score": 91.0, "top_candidates": []},
+        {"predicted_gl_code": "5400", "predicted_gl_name": "Software", "confidence_score": 65.0, "top_candidates": []},
+        {"predicted_gl_code": "5100", "predicted_gl_name": "Supplies", "confidence_score": 20.0, "top_candidates": []},
+    ]
+
+    def persisted(bulk):
+        db = make_session_factory()()
+        txns = [
+            models.Transaction(transaction_date=datetime(2024, 1, 1), description=f"txn {i}", amount=10.0 * i)
+            for i in range(3)
+        ]
+        db.add_all(txns)
+        db.commit()
+
+        if bulk:
+            counts = classifier.persist_routed_batch(db, txns, results)
+        else:
+            statuses = [classifier.classify_and_route(db, t, result=r).status for t, r in zip(txns, results)]
+            counts = {s: statuses.count(s) for s in ("auto_posted", "pending_review", "manual_required")}
+
+        rows = {
+            "predictions": [(p.transaction_id, p.predicted_gl_code, p.status) for p in db.query(models.Prediction)],
+            "audits": sorted((a.transaction_id, a.action) for a in db.query(models.AuditLog)),
+            "outbox": [(e.transaction_id, e.gl_code, e.amount, e.status) for e in db.query(models.ERPOutbox)],
+        }
+        db.close()
+        return counts, rows
+
+    assert persisted(bulk=True) == persisted(bulk=False)
+    counts, rows = persisted(bulk=True)
+    assert counts == {"auto_posted": 1, "pending_review": 1, "manual_required": 1}
+    assert len(rows["audits"]) == 5 and rows["outbox"] == [(1, "5200", 0.0, "pending")]
+
+
+def _staged_batch(monkeypatch, db, n=10, chunk_size=3, batch_id="B1"):
+    """Add ``n`` transactions in ``batch_id`` to ``db`` and stub the model (confidence = amount)."""
+    from datetime import datetime
+
+    import numpy as np
+
+    from app import models
+    from app.services import classifier
+
+    monkeypatch.setattr(classifier, "CLASSIFY_CHUNK_SIZE", chunk_size)
+    monkeypatch.setattr(classifier, "embed_transactions", lambda rows: (
+        [None] * len(rows), list(range(len(rows))), np.array([[float(r["amount"])] for r in rows]),
+    ))
+    monkeypatch.setattr(classifier, "classify_vectors", lambda vectors: [
+        {"predicted_gl_code": "5100", "predicted_gl_name": "Supplies",
+         "confidence_score": float(v[0]), "top_candidates": []}
+        for v in vectors
+    ])
+
+    db.add_all(
+        models.Transaction(batch_id=batch_id, transaction_date=datetime(2024, 1, 1), description=f"txn {i}",
+                           amount=[95.0, 60.0, 10.0][i % 3])
+        for i in range(n)
+    )
+    db.commit()
+
+
+# A file, not a shared in-memory connection: stages use separate sessions concurrently
+@pytest.mark.parametrize("session_factory", ["file"], indirect=True)
+def test_staged_batch_classification(monkeypatch, db):
+    from app import models
+    from app.services import classifier
+
+    _staged_batch(monkeypatch, db)
+    summary = classifier.classify_batch(db, batch_id="B1")
+
+    assert summary == {"total_classified": 10, "auto_posted": 4, "pending_review": 3, "manual_required": 3}
+    assert db.query(models.Prediction).count() == 10
+    assert db.query(models.ERPOutbox).count() == 4
+    assert db.query(models.ERPPosting).count() == 0  # posted later by the outbox workers
+    assert db.query(models.AuditLog).count() == 10 + 3 + 4
+    stages = classifier.get_pipeline_stats()["stages"]
+    assert [s["stage"] for s in stages] == ["embed", "search", "persist"]
+    assert stages[2]["rows"] == 10
+    assert classifier.classify_batch(db, batch_id="B1")["total_classified"] == 0
+
+
+@pytest.mark.parametrize("session_factory", ["file"], indirect=True)
+def test_streamed_batch_yields_each_prediction_then_summary(monkeypatch, db):
+    from app import models
+    from app.services import classifier
+
+    _staged_batch(monkeypatch, db)
+    events = list(classifier.stream_classify_batch(db, batch_id="B1"))
+
+    predictions = [e for e in events if e["type"] == "prediction"]
+    assert sorted(e["transaction_id"] for e in predictions) == list(range(1, 11))
+    assert {e["status"] for e in predictions} == {"auto_posted", "pending_review", "manual_required"}
+    assert events[-1] == {"type": "summary", "total_classified": 10,
+                          "auto_posted": 4, "pending_review": 3, "manual_required": 3}
+
+    # Closing the stream early commits nothing after the chunk it had received
+    _staged_batch(monkeypatch, db, n=1000, chunk_size=256, batch_id="B2")
+    scored, closed, finished = threading.Event(), threading.Event(), threading.Event()
+    classify_vectors = classifier.classify_vectors
+
+    def hold_later_chunks(vectors):
+        if scored.is_set():
+            closed.wait(5)  # later chunks wait until the client has gone away
+        scored.set()
+        return classify_vectors(vectors)
+
+    monkeypatch.setattr(classifier, "classify_vectors", hold_later_chunks)
+    stream = classifier.stream_classify_batch(db, batch_id="B2", finished=finished)
+    next(stream)
+    stream.close()
+    closed.set()
+    assert finished.wait(5)
+    assert db.query(models.Prediction).count() == 10 + 256
@@ -1,5 +1,7 @@
 import pytest
-from app.services.confidence import compute_confidence
+import numpy as np
+
+from app.services.confidence import compute_confidence, compute_confidence_batch
 
 def test_compute_confidence():
     # 1. High confidence case: highly similar neighbors, all agree
@@ -32,3 +34,37 @@ def test_compute_confidence():
     conf, top_code = compute_confidence([], [], k=3)
     assert conf == 0.0
     assert top_code == "0000"
+
+
+def test_compute_confidence_batch_matches_scalar():
+    rng = np.random.default_rng(42)
+    n, k, n_codes = 200, 5, 4
+    codes = [f"{5100 + 100 * i}" for i in range(n_codes)]
+
+    distances = np.sort(rng.uniform(0.0, 2.0, size=(n, k)).astype(np.float32), axis=1)
+    label_ids = rng.integers(0, n_codes, size=(n, k))
+    # Short rows are padded at the end by FAISS
+    label_ids[-5:, 3:] = -1
+    label_ids[-1, :] = -1
+
+    confidences, top_ids = compute_confidence_batch(distances, label_ids, n_codes)
+
+    for i in range(n):
+        valid = label_ids[i] >= 0
+        conf, top_code = compute_confidence(
+            distances[i][valid].tolist(),
+            [codes[j] for j in label_ids[i][valid]],
+            k=int(valid.sum()),
+        )
+        assert confidences[i] == conf
+        assert (codes[top_ids[i]] if top_ids[i] >= 0 else "0000") == top_code
+
+
+def test_compute_confidence_tie_goes_to_nearest():
+    conf, top_code = compute_confidence([0.1, 0.2, 0.3, 0.4], ["5300", "5100", "5100", "5300"], k=4)
+    assert top_code == "5300"
+
+    _, top_ids = compute_confidence_batch(
+        np.array([[0.1, 0.2, 0.3, 0.4]]), np.array([[1, 0, 0, 1]])
+    )
+    assert top_ids[0] == 1
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from app import models
+from app.routers.erp import get_dashboard_stats
+from app.routers.reviews import approve_prediction, reject_prediction
+from app.schemas import ReviewAction
+from app.services import classifier, erp_outbox
+from app.services.dashboard_stats import bump, read_counters, recompute_counters
+
+OK = {"success": True, "erp_response_code": "200", "erp_response_message": "Posted successfully."}
+
+
+def _classified(db, scores):
+    txns = [
+        models.Transaction(transaction_date=datetime(2024, 1, 1), description=f"txn {i}", amount=10.0 * i)
+        for i in range(len(scores))
+    ]
+    db.add_all(txns)
+    bump(db, {"transactions": len(txns)})  # as the upload endpoint does
+    db.commit()
+    results = [
+        {"predicted_gl_code": "5100", "predicted_gl_name": "Supplies", "confidence_score": s, "top_candidates": []}
+        for s in scores
+    ]
+    classifier.persist_routed_batch(db, txns, results)
+    db.commit()
+
+
+def test_counters_follow_inserts_reviews_and_postings(db, monkeypatch):
+    monkeypatch.setattr(erp_outbox, "ERP_BATCH_ENABLED", False)
+    monkeypatch.setattr(erp_outbox, "post_to_erp", lambda **kw: OK)
+
+    _classified(db, [95.0, 70.0, 65.0, 20.0])
+    assert read_counters(db)["predictions"] == 4  # first read counts from the tables
+
+    _classified(db, [92.0, 60.0])
+    queued = db.query(models.Prediction).filter(models.Prediction.status.in_(models.REVIEW_STATUSES)).all()
+    approve_prediction(queued[0].id, db=db)
+    reject_prediction(queued[1].id, ReviewAction(corrected_gl_code="5400"), db=db)
+    erp_outbox.deliver(db, erp_outbox.claim_due(db))
+
+    incremental = get_dashboard_stats(db=db)
+    assert incremental == get_dashboard_stats(exact=True, db=db)
+    assert (incremental.total_transactions, incremental.total_predictions) == (6, 6)
+    assert (incremental.approved_count, incremental.rejected_count) == (1, 1)
+    assert incremental.total_erp_postings == 4  # 2 auto-posted + approved + corrected
+    assert incremental.correction_rate == round(100 / 6, 2)
+    assert incremental.avg_confidence == round((95 + 70 + 65 + 20 + 92 + 60) / 6, 2)
+
+
+def test_exact_recount_repairs_drifted_counters(db):
+    _classified(db, [95.0, 20.0])
+    recompute_counters(db)
+    db.query(models.DashboardCounter).filter(models.DashboardCounter.name == "predictions").update({"value": 99})
+    db.commit()
+
+    assert get_dashboard_stats(db=db).total_predictions == 99
+    assert get_dashboard_stats(exact=True, db=db).total_predictions == 2
+    assert get_dashboard_stats(db=db).total_predictions == 2
@@ -0,0 +1,31 @@
+import numpy as np
+
+from app.ml.embedding_cache import EmbeddingCache
+
+
+def test_embedding_cache_tiers(tmp_path):
+    cache = EmbeddingCache("test-model", tmp_path, capacity=2, dim=4)
+    texts = ["Monthly Cloud hosting | vendor: AWS", "Office rent", "Team lunch"]
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    keys, found = cache.get_many(texts)
+    assert found == {}
+    cache.put_many(keys, vectors)
+
+    # Whitespace differences share an entry; LRU only holds the last 2
+    _, found = cache.get_many(["Monthly  Cloud hosting | vendor: AWS ", "Team lunch"])
+    np.testing.assert_array_equal(found[0], vectors[0])
+    np.testing.assert_array_equal(found[1], vectors[2])
+    assert cache.hits_disk == 1 and cache.hits_memory == 1
+
+    # A fresh process reads everything back from the memory-mapped store
+    reopened = EmbeddingCache("test-model", tmp_path, capacity=2, dim=4)
+    _, found = reopened.get_many(texts)
+    assert len(found) == 3
+    np.testing.assert_array_equal(found[1], vectors[1])
+
+    # Keys are scoped to the model name
+    other = EmbeddingCache("other-model", tmp_path, capacity=2, dim=4)
+    _, found = other.get_many(texts)
+    assert found == {}
+    assert other.stats()["misses"] == 3
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import threading
+from datetime import datetime
+
+import httpx
+import pytest
+
+from app import main, models
+from app.services import erp_client, erp_outbox
+from app.services.erp_transport import CircuitBreaker, CircuitOpenError, HttpTransport, MockTransport
+
+
+@pytest.fixture(autouse=True)
+def restore_transport():
+    yield
+    erp_client.set_transport(None)
+
+
+def _ok(request):
+    body = json.loads(request.content)
+    if request.url.path == "/journal-batches":
+        lines = [{"line_id": line["line_id"], "success": True, "erp_response_code": "200",
+                  "erp_response_message": "Posted", "erp_reference": f"ERP-{line['line_id']}"}
+                 for line in body["lines"]]
+        return httpx.Response(200, json={"batch_reference": "JB-1", "erp_response_code": "200", "lines": lines})
+    return httpx.Response(200, json={"success": True, "erp_response_code": "200",
+                                     "erp_response_message": "Posted", "erp_reference": "ERP-1"})
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10, clock=lambda: now[0])
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 11
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()  # a single probe
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 22
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_http_transport_parses_responses_and_maps_batch_lines():
+    erp_client.set_transport(HttpTransport("http://erp.test", http_transport=httpx.MockTransport(_ok)))
+
+    assert erp_client.post_to_erp(1, "5100", 10.0, "Paper")["erp_reference"] == "ERP-1"
+    response = erp_client.post_journal_batch([
+        {"line_id": 7, "transaction_id": 1, "gl_code": "5100", "amount": 10.0, "description": ""},
+        {"line_id": 8, "transaction_id": 2, "gl_code": "5100", "amount": 20.0, "description": ""},
+    ])
+    assert response["batch_reference"] == "JB-1"
+    assert {line_id: line["erp_reference"] for line_id, line in response["lines"].items()} == {7: "ERP-7", 8: "ERP-8"}
+
+    stats = erp_client.get_transport_stats()
+    assert (stats["transport"], stats["calls"], stats["lines"], stats["errors"]) == ("http", 2, 3, 0)
+    assert stats["circuit"]["state"] == "closed"
+
+
+def test_http_transport_trips_breaker_on_server_errors():
+    calls = []
+
+    def unavailable(request):
+        calls.append(request)
+        return httpx.Response(503, text="Service Unavailable")
+
+    transport = HttpTransport(
+        "http://erp.test",
+        breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60),
+        http_transport=httpx.MockTransport(unavailable),
+    )
+    erp_client.set_transport(transport)
+
+    for _ in range(2):
+        response = erp_client.post_to_erp(1, "5100", 10.0)
+        assert (response["success"], response["erp_response_code"]) == (False, "503")
+    with pytest.raises(CircuitOpenError):
+        erp_client.post_to_erp(1, "5100", 10.0)
+
+    assert len(calls) == 2  # the open circuit never reached the ERP
+    stats = transport.stats()
+    assert (stats["errors"], stats["rejected"], stats["circuit"]["state"]) == (2, 1, "open")
+
+
+def test_http_transport_shapes_error_and_malformed_bodies():
+    bodies = iter([
+        httpx.Response(422, json={"detail": [{"loc": ["body", "amount"], "msg": "field required"}]}),
+        httpx.Response(400, json={"success": True, "erp_response_code": 400, "erp_response_message": "Closed period"}),
+        httpx.Response(200, json={"status": "queued"}),
+    ])
+    erp_client.set_transport(HttpTransport("http://erp.test", http_transport=httpx.MockTransport(lambda r: next(bodies))))
+
+    rejected = erp_client.post_to_erp(1, "5100", 10.0)
+    assert (rejected["success"], rejected["erp_response_code"]) == (False, "422")
+    assert "field required" in rejected["erp_response_message"]
+
+    own_shape = erp_client.post_to_erp(1, "5100", 10.0)
+    assert (own_shape["success"], own_shape["erp_response_code"], own_shape["erp_response_message"]) == (
+        False, "400", "Closed period")
+
+    malformed = erp_client.post_to_erp(1, "5100", 10.0)
+    assert (malformed["success"], malformed["erp_response_code"]) == (False, "502")
+
+
+def test_http_transport_limits_requests_in_flight_per_host():
+    in_flight, peak = [0], [0]
+
+    async def slow(request):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return _ok(request)
+
+    transport = HttpTransport("http://erp.test", per_host_limit=3, http_transport=httpx.MockTransport(slow))
+    erp_client.set_transport(transport)
+
+    async def burst():
+        await erp_client.start_erp_client()
+        results = await asyncio.gather(*(erp_client.apost_to_erp(i, "5100", 1.0) for i in range(12)))
+        await erp_client.stop_erp_client()
+        return results
+
+    assert all(r["success"] for r in asyncio.run(burst()))
+    assert peak[0] == 3
+
+
+def test_http_transport_keeps_one_client_per_loop_and_closes_each():
+    transport = HttpTransport("http://erp.test", http_transport=httpx.MockTransport(_ok))
+    app_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=app_loop.run_forever, daemon=True)
+    thread.start()
+
+    def on_app_loop(coro):
+        return asyncio.run_coroutine_threadsafe(coro, app_loop).result()
+
+    try:
+        assert on_app_loop(transport.post_entry({}))["success"]
+        app_client = transport._clients[app_loop][0]
+
+        # A one-off call on a private loop neither replaces nor leaks a client
+        private = []
+
+        async def one_off():
+            response = await transport.post_entry({})
+            private.append(transport._clients[asyncio.get_running_loop()][0])
+            await transport.aclose()
+            return response
+
+        assert asyncio.run(one_off())["success"]
+        assert private[0].is_closed and not app_client.is_closed
+        assert on_app_loop(transport.post_entry({}))["success"]
+        assert transport._clients[app_loop][0] is app_client
+
+        on_app_loop(transport.aclose())
+        assert app_client.is_closed and transport._clients == {}
+    finally:
+        app_loop.call_soon_threadsafe(app_loop.stop)
+        thread.join()
+        app_loop.close()
+
+
+def test_mock_transport_is_pluggable():
+    erp_client.set_transport(MockTransport(success_rate=0.0))
+    response = erp_client.post_journal_batch([
+        {"line_id": 1, "transaction_id": 1, "gl_code": "5100", "amount": 1.0, "description": ""},
+    ])
+    assert response["lines"][1]["erp_response_code"] == "500"
+    assert erp_client.get_transport_stats()["transport"] == "mock"
+
+
+@pytest.mark.parametrize("session_factory", ["file"], indirect=True)
+def test_lifespan_shutdown_finishes_inflight_posting(session_factory, monkeypatch):
+    SessionLocal = session_factory
+    monkeypatch.setattr(erp_outbox, "SessionLocal", SessionLocal)
+    monkeypatch.setattr(erp_outbox, "ERP_BATCH_ENABLED", False)
+    for name in ("init_db", "seed_chart_of_accounts", "initialize_index_from_coa", "load_exact_match_index",
+                 "ensure_linear_head", "start_job_workers", "stop_job_workers"):
+        monkeypatch.setattr(main, name, lambda: None)
+
+    async def nothing():
+        pass
+    monkeypatch.setattr(main, "start_batcher", nothing)
+    monkeypatch.setattr(main, "stop_batcher", nothing)
+
+    transport = MockTransport(success_rate=1.0, latency_ms=300)
+    erp_client.set_transport(transport)
+
+    async def run_app():
+        async with main.lifespan(main.app):
+            db = SessionLocal()
+            txn = models.Transaction(transaction_date=datetime(2024, 1, 1), description="Laptop", amount=1200.0)
+            db.add(txn)
+            db.commit()
+            erp_outbox.enqueue_posting(db, txn, "1500", reason="approved")
+            db.commit()
+            db.close()
+            while True:  # shut down once a worker has claimed the entry and is posting it
+                with SessionLocal() as check:
+                    if check.query(models.ERPOutbox).filter_by(status="in_flight").count():
+                        break
+                await asyncio.sleep(0.01)
+
+    runner = threading.Thread(target=asyncio.run, args=(run_app(),), daemon=True)
+    runner.start()
+    runner.join(timeout=15)
+
+    assert not runner.is_alive(), "lifespan shutdown deadlocked"
+    with SessionLocal() as db:
+        assert [e.status for e in db.query(models.ERPOutbox)] == ["posted"]
@@ -0,0 +1,210 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.config import ERP_OUTBOX_BACKOFF_BASE, ERP_OUTBOX_BACKOFF_MAX, ERP_OUTBOX_MAX_ATTEMPTS
+from app.services import erp_client, erp_outbox
+from app.services.erp_transport import MockTransport
+
+OK = {"success": True, "erp_response_code": "200", "erp_response_message": "Posted successfully."}
+UNAVAILABLE = {"success": False, "erp_response_code": "500", "erp_response_message": "Unavailable."}
+
+
+def _journal_batch(line_response):
+    """Stub ``post_journal_batch`` answering every line with ``line_response``."""
+    return lambda lines: {
+        "batch_reference": "JB-1",
+        "erp_response_code": "200",
+        "lines": {line["line_id"]: {**line_response, "erp_reference": f"ERP-{line['line_id']}"} for line in lines},
+    }
+
+
+@pytest.fixture
+def db(db):
+    """The shared ``db`` with one approved posting queued."""
+    txn = models.Transaction(transaction_date=datetime(2024, 1, 1), description="Laptop", amount=1200.0)
+    db.add(txn)
+    db.commit()
+    erp_outbox.enqueue_posting(db, txn, "1500", reason="approved", actor="analyst")
+    db.commit()
+    return db
+
+
+def _make_due(db):
+    db.query(models.ERPOutbox).update({"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+
+def test_backoff_grows_exponentially_with_jitter_and_cap():
+    rng = random.Random(0)
+    for attempts in range(1, 12):
+        delay = min(ERP_OUTBOX_BACKOFF_MAX, ERP_OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+        assert delay / 2 <= erp_outbox.backoff_seconds(attempts, rng) <= delay
+    assert erp_outbox.backoff_seconds(50, rng) <= ERP_OUTBOX_BACKOFF_MAX
+
+
+def test_claim_is_exclusive_and_success_records_posting(db, monkeypatch):
+    monkeypatch.setattr(erp_outbox, "ERP_BATCH_ENABLED", False)
+    monkeypatch.setattr(erp_outbox, "post_to_erp", lambda **kw: OK)
+
+    entries = erp_outbox.claim_due(db)
+    assert [(e.gl_code, e.status, e.attempts) for e in entries] == [("1500", "in_flight", 1)]
+    assert erp_outbox.claim_due(db) == []
+
+    assert erp_outbox.deliver(db, entries) == {"posted": 1, "retried": 0, "failed": 0}
+    entry = db.query(models.ERPOutbox).one()
+    assert (entry.status, entry.claim_id, entry.completed_at is not None) == ("posted", None, True)
+    posting = db.query(models.ERPPosting).one()
+    assert (posting.transaction_id, posting.gl_code, posting.erp_response_code) == (1, "1500", "200")
+    assert [a.action for a in db.query(models.AuditLog)] == ["erp_posted"]
+
+
+def test_server_errors_are_retried_with_backoff_until_the_cap(db, monkeypatch):
+    monkeypatch.setattr(erp_outbox, "post_journal_batch", _journal_batch(UNAVAILABLE))
+
+    assert erp_outbox.drain_outbox(db) == {"posted": 0, "retried": 1, "failed": 0}
+    entry = db.query(models.ERPOutbox).one()
+    assert (entry.status, entry.attempts, entry.last_error) == ("pending", 1, "Unavailable.")
+    assert entry.next_attempt_at > datetime.utcnow()
+    assert erp_outbox.claim_due(db) == []  # still backing off
+
+    for _ in range(ERP_OUTBOX_MAX_ATTEMPTS - 1):
+        _make_due(db)
+        erp_outbox.drain_outbox(db)
+    db.expire_all()
+    entry = db.query(models.ERPOutbox).one()
+    assert (entry.status, entry.attempts) == ("failed", ERP_OUTBOX_MAX_ATTEMPTS)
+    assert db.query(models.ERPPosting).one().erp_response_code == "500"
+    assert [a.action for a in db.query(models.AuditLog)] == ["erp_failed"]
+
+
+def test_unexpected_response_bodies_settle_every_entry(db, monkeypatch):
+    for description in ("Chair", "Desk"):
+        txn = models.Transaction(transaction_date=datetime(2024, 1, 1), description=description, amount=10.0)
+        db.add(txn)
+        db.commit()
+        erp_outbox.enqueue_posting(db, txn, "1500", reason="approved", actor="analyst")
+    db.commit()
+    responses = {1: {"detail": "Unprocessable Entity"}, 2: ["not", "an", "object"], 3: OK}
+    monkeypatch.setattr(erp_outbox, "ERP_BATCH_ENABLED", False)
+    monkeypatch.setattr(erp_outbox, "post_to_erp", lambda **kw: responses[kw["transaction_id"]])
+
+    assert erp_outbox.drain_outbox(db) == {"posted": 1, "retried": 1, "failed": 1}
+    db.expire_all()
+    entries = db.query(models.ERPOutbox).order_by(models.ERPOutbox.transaction_id).all()
+    assert [e.status for e in entries] == ["failed", "pending", "posted"]
+    assert entries[0].last_error == "ERP response error"
+    assert entries[1].last_error.startswith("ERP unreachable: unreadable ERP response")
+
+
+def test_network_errors_are_retried_and_stale_claims_reclaimed(db, session_factory, monkeypatch):
+    def unreachable(lines):
+        raise ConnectionRefusedError("connection refused")
+
+    monkeypatch.setattr(erp_outbox, "post_journal_batch", unreachable)
+    assert erp_outbox.drain_outbox(db)["retried"] == 1
+
+    # A worker that died mid-claim leaves the entry in flight; it is claimed again once stale
+    _make_due(db)
+    dead_worker = session_factory()
+    stale = erp_outbox.claim_due(dead_worker)
+    assert erp_outbox.claim_due(db) == []
+    db.query(models.ERPOutbox).update({"claimed_at": datetime.utcnow() - timedelta(hours=1)})
+    db.commit()
+
+    monkeypatch.setattr(erp_outbox, "post_journal_batch", _journal_batch(OK))
+    assert erp_outbox.drain_outbox(db)["posted"] == 1
+    assert erp_outbox.deliver(dead_worker, stale)["posted"] == 0  # its claim was lost
+    assert db.query(models.ERPPosting).count() == 1
+
+
+def test_journal_batches_group_by_gl_and_date_and_map_lines_back(db, monkeypatch):
+    txns = [
+        models.Transaction(transaction_date=datetime(2024, 1, day), description=f"txn {i}", amount=float(i))
+        for i, day in enumerate([1, 1, 1, 2, 2], start=2)
+    ]
+    db.add_all(txns)
+    db.commit()
+    for txn, gl_code in zip(txns, ["1500", "1500", "5100", "1500", "1500"]):
+        erp_outbox.enqueue_posting(db, txn, gl_code, reason="auto_posted")
+    db.commit()
+
+    entries = erp_outbox.claim_due(db)
+    batches = erp_outbox.group_journal_batches(entries, "gl_date", max_lines=2)
+    assert [[e.transaction_id for e in batch] for batch in batches] == [[1, 2], [3], [4], [5, 6]]
+    assert [len(b) for b in erp_outbox.group_journal_batches(entries, "size", max_lines=4)] == [4, 2]
+
+    # The ERP rejects one line of a batch: only that line is retried
+    calls = []
+
+    def partially_failing(lines):
+        calls.append([line["line_id"] for line in lines])
+        response = _journal_batch(OK)(lines)
+        response["lines"][3] = {**UNAVAILABLE, "line_id": 3}
+        return response
+
+    monkeypatch.setattr(erp_outbox, "post_journal_batch", partially_failing)
+    assert erp_outbox.deliver(db, entries) == {"posted": 5, "retried": 1, "failed": 0}
+    assert calls == [[1, 2, 3], [4], [5, 6]]  # one call per (GL, date), not per line
+
+    postings = {p.transaction_id: (p.erp_reference, p.journal_batch) for p in db.query(models.ERPPosting)}
+    assert postings[1] == ("ERP-1", "JB-1") and postings[6] == ("ERP-6", "JB-1")
+    assert 3 not in postings
+    assert db.get(models.ERPOutbox, 3).status == "pending"
+
+
+@pytest.mark.parametrize("batched", [True, False])
+def test_reposted_entry_is_booked_once_by_the_erp(db, monkeypatch, batched):
+    monkeypatch.setattr(erp_outbox, "ERP_BATCH_ENABLED", batched)
+    transport = MockTransport(success_rate=1.0)
+    erp_client.set_transport(transport)
+    try:
+        # The ERP accepts the posting, but recording the outcome fails to commit
+        entries = erp_outbox.claim_due(db)
+        with monkeypatch.context() as m:
+            m.setattr(db, "commit", lambda: (_ for _ in ()).throw(RuntimeError("disk I/O error")))
+            with pytest.raises(RuntimeError):
+                erp_outbox.deliver(db, entries)
+        db.rollback()
+
+        # …so the entry is still in flight and is posted again once stale
+        db.query(models.ERPOutbox).update({"claimed_at": datetime.utcnow() - timedelta(hours=1)})
+        db.commit()
+        assert erp_outbox.drain_outbox(db)["posted"] == 1
+    finally:
+        erp_client.set_transport(None)
+
+    assert (len(transport.booked), transport.duplicates) == (1, 1)
+    (booked,) = transport.booked.values()
+    assert db.query(models.ERPPosting).one().erp_reference == booked["erp_reference"]
+
+
+@pytest.mark.parametrize("session_factory", ["file"], indirect=True)
+def test_long_claims_are_kept_alive(session_factory, monkeypatch):
+    worker, other_worker = session_factory(), session_factory()
+    for i, gl_code in enumerate(["1500", "5100", "5200"]):
+        txn = models.Transaction(transaction_date=datetime(2024, 1, 1), description=f"txn {i}", amount=1.0)
+        worker.add(txn)
+        worker.flush()
+        erp_outbox.enqueue_posting(worker, txn, gl_code, reason="auto_posted")
+    worker.commit()
+
+    monkeypatch.setattr(erp_outbox, "ERP_BATCH_ENABLED", True)
+    monkeypatch.setattr(erp_outbox, "ERP_OUTBOX_STALE_SECONDS", 0.4)
+    stolen = []
+
+    def slow_batch(lines):
+        time.sleep(0.25)  # three of these outlast the stale timeout
+        stolen.extend(erp_outbox.claim_due(other_worker))
+        return _journal_batch(OK)(lines)
+
+    monkeypatch.setattr(erp_outbox, "post_journal_batch", slow_batch)
+    entries = erp_outbox.claim_due(worker)
+    assert len(erp_outbox.group_journal_batches(entries)) == 3
+    assert erp_outbox.deliver(worker, entries)["posted"] == 3
+    assert stolen == []
+    worker.close()
+    other_worker.close()
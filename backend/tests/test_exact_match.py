@@ -0,0 +1,72 @@
+import threading
+
+from app.ml.exact_match import ExactMatchIndex, normalize_field
+
+
+def test_normalization_masks_digits_and_case():
+    assert normalize_field("  Office RENT  March 2024 ") == "office rent march #"
+    assert normalize_field(None) == ""
+
+
+def test_exact_match_needs_consistent_history():
+    index = ExactMatchIndex({"5300": "Rent Expense", "5200": "Travel Expense"})
+    assert index.lookup("Office rent 03/2024", "WeWork", "Ops") is None
+
+    index.record("Office rent 01/2024", "WeWork", "Ops", "5300")
+    assert index.lookup("Office rent 03/2024", "WeWork", "Ops") is None  # one review is not enough
+
+    index.record("Office rent 02/2024", "WeWork", "Ops", "5300")
+    result = index.lookup("Office rent 03/2024", "WeWork", "Ops")
+    assert result["predicted_gl_code"] == "5300"
+    assert result["predicted_gl_name"] == "Rent Expense"
+    assert result["method"] == "exact_match"
+    assert result["confidence_score"] == 75.0  # (2 + 1) / (2 + 2)
+
+    # A conflicting correction drops the share below the bar
+    index.record("Office rent 04/2024", "WeWork", "Ops", "5200")
+    assert index.lookup("Office rent 05/2024", "WeWork", "Ops") is None
+
+
+def test_vendor_match_falls_back_on_unseen_description():
+    index = ExactMatchIndex()
+    for month in range(5):
+        index.record(f"Ride {month}", "Uber", "Sales", "5200")
+
+    result = index.lookup("Airport transfer", "uber", "Marketing")
+    assert result["predicted_gl_code"] == "5200"
+    assert result["method"] == "vendor_match"
+    assert index.stats()["hits_vendor"] == 1
+
+
+def test_refresh_rebuilds_in_the_background(monkeypatch):
+    from app.ml import exact_match
+
+    current = ExactMatchIndex()
+    for month in range(5):
+        current.record(f"Ride {month}", "Uber", "Sales", "5200")
+    rebuilt = ExactMatchIndex()
+    for month in range(5):
+        rebuilt.record(f"Ride {month}", "Uber", "Sales", "5300")
+
+    building, release = threading.Event(), threading.Event()
+
+    def slow_build(db):
+        building.set()
+        release.wait(5)
+        return rebuilt
+
+    monkeypatch.setattr(exact_match, "build_exact_match_index", slow_build)
+    monkeypatch.setattr(exact_match, "EXACT_MATCH_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(exact_match, "_index", current)
+    monkeypatch.setattr(exact_match, "_built_at", 0.0)
+
+    # The due refresh must not hold up the lookup that triggered it
+    assert exact_match.lookup_exact_match("Airport transfer", "Uber")["predicted_gl_code"] == "5200"
+    assert building.wait(5)
+    assert exact_match.lookup_exact_match("Airport transfer", "Uber")["predicted_gl_code"] == "5200"
+
+    release.set()
+    exact_match.wait_for_refresh()
+    assert exact_match._index is rebuilt
+    monkeypatch.setattr(exact_match, "EXACT_MATCH_REFRESH_SECONDS", 3600)
+    assert exact_match.lookup_exact_match("Airport transfer", "Uber")["predicted_gl_code"] == "5300"
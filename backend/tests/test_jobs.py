@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+from app import models
+from app.services import classifier, jobs
+
+
+@pytest.fixture
+def session_factory(session_factory, monkeypatch):
+    """The shared in-memory DB with 10 transactions in batch B1, used by the job threads."""
+    factory = session_factory
+    monkeypatch.setattr(jobs, "SessionLocal", factory)
+    monkeypatch.setattr(jobs, "CLASSIFY_CHUNK_SIZE", 4)
+    monkeypatch.setattr(classifier, "classify_transactions", lambda rows: [
+        {"predicted_gl_code": "5100", "predicted_gl_name": "Supplies", "confidence_score": 90.0, "top_candidates": []}
+        for _ in rows
+    ])
+
+    db = factory()
+    db.add_all(
+        models.Transaction(batch_id="B1", transaction_date=datetime(2024, 1, 1), description=f"txn {i}", amount=1.0)
+        for i in range(10)
+    )
+    db.commit()
+    db.close()
+    return factory
+
+
+def test_job_runs_to_completion_in_chunks(session_factory):
+    db = session_factory()
+    job = jobs.submit_job(db, batch_id="B1")
+
+    job_id, owner = jobs.claim_next_job(db)
+    assert job_id == job.id
+    assert jobs.claim_next_job(db) is None  # already owned
+    jobs.run_job(job.id, owner)
+
+    db.expire_all()
+    progress = jobs.job_progress(db.get(models.ClassificationJob, job.id))
+    assert progress["status"] == "completed"
+    assert (progress["total"], progress["processed"], progress["auto_posted"]) == (10, 10, 10)
+    assert db.query(models.Prediction).count() == 10
+
+
+def test_cancelled_job_resumes_from_checkpoint(session_factory, monkeypatch):
+    db = session_factory()
+    job = jobs.submit_job(db, batch_id="B1")
+    _, owner = jobs.claim_next_job(db)
+
+    # Cancel once the first chunk is checkpointed
+    chunk = classifier.classify_chunk
+
+    def classify_then_cancel(session, transactions):
+        counts = chunk(session, transactions)
+        # Close right away: the sessions share one connection, and a session
+        # reset later by garbage collection would roll back the checkpoint
+        other = session_factory()
+        jobs.cancel_job(other, job.id)
+        other.close()
+        return counts
+
+    monkeypatch.setattr(jobs, "classify_chunk", classify_then_cancel)
+    jobs.run_job(job.id, owner)
+    db.expire_all()
+    stopped = db.get(models.ClassificationJob, job.id)
+    assert (stopped.status, stopped.processed, stopped.checkpoint_id) == ("cancelled", 4, 4)
+
+    monkeypatch.setattr(jobs, "classify_chunk", chunk)
+    jobs.resume_job(db, job.id)
+    job_id, owner = jobs.claim_next_job(db)
+    assert job_id == job.id
+    jobs.run_job(job.id, owner)
+
+    db.expire_all()
+    finished = db.get(models.ClassificationJob, job.id)
+    assert (finished.status, finished.processed, finished.total) == ("completed", 10, 10)
+    assert db.query(models.Prediction).count() == 10
+
+
+def test_stale_reclaim_in_the_same_process_fences_the_old_claim(session_factory):
+    db = session_factory()
+    job = jobs.submit_job(db, batch_id="B1")
+    _, stalled = jobs.claim_next_job(db)
+
+    # The job thread stalls past the stale timeout; another thread of this process reclaims the job
+    db.query(models.ClassificationJob).update({"heartbeat_at": datetime(2000, 1, 1)})
+    db.commit()
+    job_id, owner = jobs.claim_next_job(db)
+    assert job_id == job.id and owner != stalled
+
+    jobs.run_job(job.id, stalled)  # wakes up no longer owning the job
+    assert db.query(models.Prediction).count() == 0
+
+    jobs.run_job(job.id, owner)
+    db.expire_all()
+    assert db.get(models.ClassificationJob, job.id).status == "completed"
+    assert db.query(models.Prediction).count() == 10
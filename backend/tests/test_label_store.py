@@ -0,0 +1,76 @@
+import numpy as np
+
+from app.ml.label_store import LabelStore
+
+
+def test_label_store_roundtrip(tmp_path):
+    store = LabelStore()
+    store.append([
+        {"gl_code": "5200", "gl_name": "Travel Expense", "text": "flight to NYC", "source": "coa"},
+        {"gl_code": "5400", "gl_name": "Software", "text": "AWS hosting", "source": "coa"},
+    ])
+    store.save(tmp_path)
+
+    # Corrections arrive without a GL name; the interned name is kept
+    store.append([{"gl_code": "5200", "gl_name": "", "text": "Uber – café", "source": "correction"}])
+    assert store.text(2) == "Uber – café"
+    store.save(tmp_path)
+
+    loaded = LabelStore.load(tmp_path)
+    assert len(loaded) == 3
+    assert loaded.n_gl == 2
+    np.testing.assert_array_equal(loaded.gl_ids, [0, 1, 0])
+    assert loaded.label(2) == {
+        "gl_code": "5200", "gl_name": "Travel Expense", "text": "Uber – café", "source": "correction",
+    }
+    assert loaded.text(1) == "AWS hosting"
+
+    # FAISS pads missing neighbors with -1
+    ids = loaded.gl_id_matrix(np.array([[2, 1, -1]]))
+    np.testing.assert_array_equal(ids, [[0, 1, -1]])
+    assert loaded.gl_label(1) == {"gl_code": "5400", "gl_name": "Software"}
+
+
+def test_rewrites_never_touch_a_texts_file_others_have_mapped(tmp_path):
+    store = LabelStore()
+    store.append([{"gl_code": "5100", "gl_name": "Supplies", "text": f"text {i}", "source": "coa"} for i in range(4)])
+    store.save(tmp_path)
+    reader = LabelStore.load(tmp_path, memory_map=True)  # another worker holding offsets into the file
+
+    # A removal rebuilds the labels from a subset and saves them over the snapshot
+    subset = LabelStore.load(tmp_path).take(np.array([1, 3]))
+    subset.save(tmp_path)
+
+    assert [reader.text(i) for i in range(4)] == ["text 0", "text 1", "text 2", "text 3"]
+    assert [reader.copy().text(i) for i in range(4)] == ["text 0", "text 1", "text 2", "text 3"]
+    loaded = LabelStore.load(tmp_path)
+    assert [loaded.text(i) for i in range(2)] == ["text 1", "text 3"]
+    assert len(list(tmp_path.glob("labels_texts*.bin"))) == 1
+
+    # The owner of the current file keeps appending in place
+    loaded.append([{"gl_code": "5100", "text": "text 4"}])
+    loaded.save(tmp_path)
+    assert LabelStore.load(tmp_path).text(2) == "text 4"
+    assert [reader.text(i) for i in range(4)] == ["text 0", "text 1", "text 2", "text 3"]
+
+
+def test_copies_share_columns_until_they_diverge():
+    def labels(gl_code, n):
+        return [{"gl_code": gl_code, "gl_name": "GL", "text": f"{gl_code} {i}"} for i in range(n)]
+
+    parent = LabelStore()
+    parent.append(labels("5100", 3))
+
+    # A writer's copy appends in place: no O(N) copy of the id columns…
+    child = parent.copy()
+    child.append(labels("5200", 2))
+    assert np.shares_memory(child.gl_ids, parent.gl_ids)
+    # …and readers of the parent never see its rows
+    assert len(parent) == 3 and parent.copy().label(2)["gl_code"] == "5100"
+
+    # A second copy of the same parent diverges instead of overwriting the first's rows
+    sibling = parent.copy()
+    sibling.append(labels("5300", 1))
+    assert not np.shares_memory(sibling.gl_ids, child.gl_ids)
+    assert [child.label(i)["text"] for i in (3, 4)] == ["5200 0", "5200 1"]
+    assert sibling.label(3)["text"] == "5300 0" and len(sibling) == 4
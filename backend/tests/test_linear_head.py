@@ -0,0 +1,64 @@
+import numpy as np
+
+from app.config import LINEAR_HEAD_C, LINEAR_HEAD_MAX_ITER, LINEAR_HEAD_MIN_PROB
+from app.ml.linear_head import LinearHead, train_linear_head
+from app.ml.pipeline import _build_linear_prediction
+from app.services.router import route_prediction
+
+
+def _clusters(n_per_class=30, dim=16, seed=0, spread=0.5):
+    rng = np.random.default_rng(seed)
+    centers = np.eye(dim, dtype=np.float32)[:3] * 4
+    vectors = np.vstack([c + rng.normal(scale=spread, size=(n_per_class, dim)) for c in centers])
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    codes = [code for code in ("5100", "5200", "5300") for _ in range(n_per_class)]
+    return vectors, codes
+
+
+def test_head_matches_sklearn_probabilities():
+    from sklearn.linear_model import LogisticRegression
+
+    vectors, codes = _clusters()
+    head = train_linear_head(vectors, codes, {"5100": "Office Supplies"})
+    reference = LogisticRegression(C=LINEAR_HEAD_C, max_iter=LINEAR_HEAD_MAX_ITER).fit(vectors, codes)
+
+    top_classes, probs = head.predict(vectors[:5], top_n=3)
+    expected = reference.predict_proba(vectors[:5])
+
+    assert head.gl_codes == ["5100", "5200", "5300"]
+    assert head.gl_names[0] == "Office Supplies"
+    assert np.allclose(np.sort(expected, axis=1)[:, ::-1], probs, atol=1e-4)
+    assert [head.gl_codes[c] for c in top_classes[:, 0]] == ["5100"] * 5
+
+
+def test_binary_head_and_round_trip(tmp_path):
+    vectors, codes = _clusters()
+    vectors, codes = vectors[:60], codes[:60]
+
+    head = train_linear_head(vectors, codes, {}, index_version=7, model_id="m")
+    head.save(tmp_path / "head.npz")
+    loaded = LinearHead.load(tmp_path / "head.npz")
+
+    top_classes, probs = loaded.predict(vectors, top_n=3)
+    assert probs.shape == (60, 2) and np.allclose(probs.sum(axis=1), 1)
+    assert [loaded.gl_codes[c] for c in top_classes[:, 0]] == codes
+    assert (loaded.index_version, loaded.model_id) == (7, "m")
+    assert loaded.temperature == head.temperature
+
+    assert train_linear_head(vectors[:30], codes[:30], {}) is None
+
+
+def test_head_answers_can_still_go_to_review():
+    # Overlapping clusters: the raw probabilities are overconfident on unseen rows
+    vectors, codes = _clusters(n_per_class=60, seed=1, spread=3.0)
+    head = train_linear_head(vectors, codes, {})
+    assert head.temperature > 1
+
+    top_classes, probs, calibrated = head.predict_calibrated(vectors)
+    answered = probs[:, 0] >= LINEAR_HEAD_MIN_PROB
+    assert answered.any()
+    statuses = {
+        route_prediction(_build_linear_prediction(head, c, p)["confidence_score"])[0]
+        for c, p in zip(top_classes[answered], calibrated[answered])
+    }
+    assert "pending_review" in statuses
@@ -0,0 +1,71 @@
+import numpy as np
+import onnx
+import pytest
+from onnx import TensorProto, helper
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+from app.ml.onnx_backend import ONNX_INT8_FILE, TOKENIZER_FILE, OnnxEmbedder, check_parity
+
+VOCAB = {"[PAD]": 0, "[UNK]": 1, "uber": 2, "ride": 3, "aws": 4, "hosting": 5}
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    """A tiny stand-in model: token embeddings are rows of a fixed table."""
+    tokenizer = Tokenizer(WordLevel(VOCAB, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.save(str(tmp_path / TOKENIZER_FILE))
+
+    table = np.random.default_rng(0).normal(size=(len(VOCAB), 8)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "token_embeddings",
+        [helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"]),
+         helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "sequence"])],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", 8])],
+        initializer=[onnx.numpy_helper.from_array(table, "table")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 14)], ir_version=8)
+    onnx.save(model, str(tmp_path / ONNX_INT8_FILE))
+    return tmp_path, table
+
+
+def test_onnx_embedder_mean_pools_real_tokens_and_normalizes(model_dir):
+    directory, table = model_dir
+    embedder = OnnxEmbedder(directory, batch_size=2)
+
+    texts = ["uber ride", "aws", "aws hosting uber"]
+    raw = embedder.encode(texts, normalize_embeddings=False)
+    assert raw.shape == (3, 8) and raw.dtype == np.float32
+    # Padding of the shorter texts is left out of the mean
+    np.testing.assert_allclose(raw[0], table[[2, 3]].mean(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(raw[1], table[4], rtol=1e-6)
+
+    normalized = embedder.encode(texts)
+    np.testing.assert_allclose(np.linalg.norm(normalized, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_allclose(normalized[2], raw[2] / np.linalg.norm(raw[2]), rtol=1e-6)
+    assert embedder.encode([]).shape == (0, 8)
+
+
+def test_parity_check_passes_only_above_the_threshold(model_dir):
+    directory, _ = model_dir
+    embedder = OnnxEmbedder(directory)
+    texts = ["uber ride", "aws hosting"]
+
+    same = check_parity(embedder, embedder, texts, threshold=0.99)
+    assert same["passed"] and same["min_cosine"] == pytest.approx(1.0)
+
+    class Drifted:
+        """A reference whose second embedding points elsewhere."""
+
+        def encode(self, texts, normalize_embeddings=True, show_progress_bar=False):
+            vectors = embedder.encode(texts)
+            vectors[1] = embedder.encode(["uber"])[0]
+            return vectors
+
+    drifted = check_parity(Drifted(), embedder, texts, threshold=0.99)
+    assert not drifted["passed"]
+    assert drifted["min_cosine"] < drifted["mean_cosine"] < 1.0  # only one text drifted
+    assert drifted["threshold"] == 0.99
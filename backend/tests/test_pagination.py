@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import event
+
+from app import models
+from app.routers.predictions import list_predictions
+from app.routers.reviews import get_review_queue
+
+
+@pytest.fixture
+def db(db):
+    """The shared ``db`` with 30 predictions across the three statuses."""
+    statuses = ["pending_review", "manual_required", "auto_posted"]
+    for i in range(30):
+        txn = models.Transaction(transaction_date=datetime(2024, 1, 1), description=f"Txn {i}", amount=float(i))
+        db.add(txn)
+        db.flush()
+        db.add(models.Prediction(
+            transaction_id=txn.id, predicted_gl_code="5100",
+            confidence_score=float(60 + i % 7),  # plenty of ties
+            status=statuses[i % 3],
+        ))
+    db.commit()
+    return db
+
+
+def _walk(endpoint, db, **params):
+    """All pages of ``endpoint`` following X-Next-Cursor; also counts the queries per page."""
+    rows, cursor, queries, count = [], None, [], []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: count.append(1))
+    while True:
+        response = Response()
+        count.clear()
+        page = endpoint(response=response, cursor=cursor, db=db, **params)
+        queries.append(len(count))
+        db.expire_all()
+        rows += page
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return rows, queries
+
+
+def test_predictions_keyset_pages_cover_everything_once(db):
+    rows, queries = _walk(list_predictions, db, limit=7)
+    assert [row.id for row in rows] == list(range(30, 0, -1))
+    assert all(row.transaction.description.startswith("Txn") for row in rows)
+    assert max(queries) == 1  # transactions come with the page, no N+1
+
+    filtered, _ = _walk(list_predictions, db, limit=4, status="auto_posted")
+    assert [row.id for row in filtered] == list(range(30, 0, -3))
+
+
+def test_review_queue_keyset_orders_by_confidence_with_ties(db):
+    rows, queries = _walk(get_review_queue, db, limit=6)
+
+    expected = sorted(
+        db.query(models.Prediction).filter(models.Prediction.status.in_(models.REVIEW_STATUSES)),
+        key=lambda pred: (-pred.confidence_score, -pred.id),
+    )
+    assert [row.id for row in rows] == [pred.id for pred in expected]
+    assert len(rows) == 20
+    assert max(queries) == len(models.REVIEW_STATUSES)
+
+    # The old offset paging still answers the same pages
+    page = get_review_queue(response=Response(), skip=6, limit=6, db=db)
+    assert [row.id for row in page] == [pred.id for pred in expected[6:12]]
+
+
+def test_malformed_cursor_is_rejected(db):
+    with pytest.raises(HTTPException) as excinfo:
+        get_review_queue(response=Response(), cursor="not-a-cursor", db=db)
+    assert excinfo.value.status_code == 400
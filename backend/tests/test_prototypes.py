@@ -0,0 +1,50 @@
+import numpy as np
+
+from app.ml.prototypes import GLPrototypes
+
+
+def _unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_incremental_adds_match_full_recompute():
+    rng = np.random.default_rng(0)
+    vectors = _unit(rng.normal(size=(60, 8)))
+    gl_ids = rng.integers(0, 4, size=60)
+
+    incremental = GLPrototypes(8)
+    for start in range(0, 60, 7):
+        incremental.add(vectors[start:start + 7], gl_ids[start:start + 7])
+
+    full = GLPrototypes.from_vectors(vectors, gl_ids, 8)
+    assert np.allclose(incremental.centroids, full.centroids)
+    assert incremental.counts.tolist() == np.bincount(gl_ids, minlength=4).tolist()
+
+
+def test_classify_accepts_only_clear_margins():
+    prototypes = GLPrototypes.from_vectors(_unit(np.eye(3)), np.array([0, 1, 2]), 3)
+    queries = _unit([[1.0, 0.05, 0.0], [1.0, 0.95, 0.0]])
+
+    accepted, top_ids, probs = prototypes.classify(queries, min_margin=0.2, temperature=0.05)
+
+    assert accepted.tolist() == [True, False]
+    assert top_ids[:, 0].tolist() == [0, 0]
+    assert probs[0, 0] > 0.99 and np.all(np.diff(probs, axis=1) <= 0)
+
+
+def test_saved_prototypes_are_rejected_for_other_labels(tmp_path):
+    gl_ids = np.array([0, 1, 1, 2])
+    prototypes = GLPrototypes.from_vectors(_unit(np.eye(4)[:, :3] + 0.1), gl_ids, 3)
+    path = tmp_path / "prototypes.npz"
+    fingerprint = GLPrototypes.fingerprint(gl_ids, ["6000", "6100", "6200"])
+    prototypes.save(path, 4, fingerprint)
+
+    loaded = GLPrototypes.load(path, 3, 4, fingerprint)
+    assert np.allclose(loaded.sums, prototypes.sums)
+
+    # Same row count, different labels behind the rows
+    relabeled = GLPrototypes.fingerprint(np.array([0, 0, 1, 2]), ["6000", "6100", "6200"])
+    assert GLPrototypes.load(path, 3, 4, relabeled) is None
+    renamed = GLPrototypes.fingerprint(gl_ids, ["6000", "6200", "6100"])
+    assert GLPrototypes.load(path, 3, 4, renamed) is None
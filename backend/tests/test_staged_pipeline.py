@@ -0,0 +1,52 @@
+import threading
+import time
+
+import pytest
+
+from app.services.staged_pipeline import Stage, run_stages
+
+
+def test_every_item_flows_through_all_stages():
+    seen, lock = [], threading.Lock()
+
+    def double(item):
+        time.sleep(0.001)
+        return [x * 2 for x in item]
+
+    def collect(item):
+        with lock:
+            seen.extend(item)
+
+    source = ([i, i + 100] for i in range(50))
+    stats = run_stages(source, [Stage("double", double, workers=3), Stage("collect", collect)], queue_size=2)
+
+    assert sorted(seen) == sorted(2 * x for i in range(50) for x in (i, i + 100))
+    assert [s["rows"] for s in stats] == [100, 100]
+    assert stats[0]["workers"] == 3 and stats[0]["rows_per_second"] > 0
+
+
+def test_dropped_items_skip_later_stages():
+    collected = []
+    stats = run_stages(
+        ([i] for i in range(10)),
+        [Stage("filter", lambda item: item if item[0] % 2 else None), Stage("collect", collected.extend)],
+    )
+    assert sorted(collected) == [1, 3, 5, 7, 9]
+    assert stats[1]["items"] == 5
+
+
+def test_stage_error_stops_the_pipeline():
+    def explode(item):
+        if item[0] == 3:
+            raise ValueError("boom")
+        return item
+
+    # A slow, endless source must not keep the pipeline alive after the failure
+    def source():
+        i = 0
+        while True:
+            yield [i]
+            i += 1
+
+    with pytest.raises(ValueError, match="boom"):
+        run_stages(source(), [Stage("explode", explode), Stage("sink", lambda item: None)], queue_size=1)
@@ -0,0 +1,191 @@
+import os
+
+import numpy as np
+
+from app.ml import vector_store
+
+
+def _random_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, 384)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _labels(n):
+    return [{"gl_code": str(5100 + 100 * (i % 5)), "gl_name": "GL"} for i in range(n)]
+
+
+def test_index_type_switches_at_thresholds(monkeypatch):
+    monkeypatch.setattr(vector_store, "FAISS_INDEX_TYPE", "auto")
+    monkeypatch.setattr(vector_store, "FAISS_HNSW_MIN_VECTORS", 500)
+    monkeypatch.setattr(vector_store, "FAISS_IVF_MIN_VECTORS", 1000)
+    monkeypatch.setattr(vector_store, "FAISS_IVF_MIN_TRAIN", 1000)
+    monkeypatch.setattr(vector_store, "FAISS_PQ_M", 8)
+    vector_store.reset_index()
+
+    vectors = _random_vectors(1200)
+    seen = []
+    for start in range(0, 1200, 400):
+        vector_store.add_vectors(vectors[start:start + 400], _labels(400))
+        seen.append(vector_store.get_index_info()["type"])
+
+    assert seen == ["flat", "hnsw", "ivf_pq"]
+    assert vector_store.get_index_info()["nprobe"] == vector_store.FAISS_IVF_NPROBE
+
+    # Callers see the same search contract regardless of index type
+    distances, results = vector_store.search(vectors[0], k=5)
+    assert len(distances) == len(results) == 5
+    assert all("gl_code" in r for r in results)
+
+    vector_store.reset_index()
+
+
+def _no_compaction(monkeypatch):
+    # A forked worker exits right after saving; a background compaction it
+    # scheduled would be cut off halfway through writing the base snapshot
+    monkeypatch.setattr(vector_store, "FAISS_DELTA_COMPACT_SEGMENTS", 100)
+    monkeypatch.setattr(vector_store, "FAISS_DELTA_COMPACT_FRACTION", 1.0)
+
+
+def test_workers_hot_reload_newer_snapshot(monkeypatch, index_dir):
+    monkeypatch.setattr(vector_store, "FAISS_VERSION_CHECK_INTERVAL", 0)
+    _no_compaction(monkeypatch)
+    vectors = _random_vectors(15)
+
+    vector_store.reset_index()
+    vector_store.add_vectors(vectors[:10], _labels(10))
+    vector_store.save_index()
+    vector_store.release_index()
+    assert vector_store.get_total_vectors() == 10
+    assert vector_store.get_index_info()["version"] == 1
+
+    # Another worker retrains and publishes the next snapshot
+    pid = os.fork()
+    if pid == 0:
+        vector_store.add_vectors(vectors[10:], _labels(5))
+        vector_store.save_index()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert vector_store.read_snapshot_version() == 2
+    distances, gl_ids = vector_store.search_ids(vectors[12:13], k=1)
+    assert vector_store.get_total_vectors() == 15
+    assert vector_store.get_gl_label(int(gl_ids[0, 0]))["gl_code"] == _labels(15)[12]["gl_code"]
+
+    vector_store.release_index()
+
+
+def test_writers_publish_a_new_generation():
+    vectors = _random_vectors(15)
+    vector_store.reset_index()
+    vector_store.add_vectors(vectors[:10], _labels(10))
+    before = vector_store.get_generation()
+
+    vector_store.add_vectors(vectors[10:], [{"gl_code": "9999", "gl_name": "New"}] * 5)
+    after = vector_store.get_generation()
+
+    # A search that started on the old generation keeps a consistent view
+    assert before.ntotal == 10 and before.n_gl == 5
+    assert after.ntotal == 15 and after.n_gl == 6
+    _, gl_ids = before.search_ids(vectors[12:13], k=1)
+    assert before.gl_label(int(gl_ids[0, 0]))["gl_code"] != "9999"
+    _, gl_ids = after.search_ids(vectors[12:13], k=1)
+    assert after.gl_label(int(gl_ids[0, 0]))["gl_code"] == "9999"
+
+    vector_store.reset_index()
+
+
+def test_saves_append_delta_segments_until_compaction(monkeypatch, index_dir):
+    monkeypatch.setattr(vector_store, "FAISS_DELTA_COMPACT_SEGMENTS", 100)
+    monkeypatch.setattr(vector_store, "FAISS_DELTA_COMPACT_FRACTION", 1.0)
+    vectors = _random_vectors(40)
+    labels = _labels(40)
+
+    vector_store.reset_index()
+    vector_store.add_vectors(vectors[:30], labels[:30])
+    vector_store.save_index()
+    base_written = os.stat(index_dir / "index.faiss").st_mtime_ns
+
+    # Small retrains only append segments; the base file is left alone
+    for start in (30, 35):
+        vector_store.add_vectors(vectors[start:start + 5], labels[start:start + 5])
+        vector_store.save_index()
+    assert os.stat(index_dir / "index.faiss").st_mtime_ns == base_written
+    assert len(list((index_dir / "deltas").glob("*.npy"))) == 2
+
+    # Loading replays base + deltas
+    vector_store.release_index()
+    assert vector_store.get_total_vectors() == 40
+    assert vector_store.get_index_info()["delta_vectors"] == 10
+    distances, results = vector_store.search(vectors[37], k=1)
+    assert results[0]["gl_code"] == labels[37]["gl_code"] and distances[0] < 1e-5
+
+    assert vector_store.compact_index()
+    assert list((index_dir / "deltas").glob("*")) == []
+    vector_store.release_index()
+    assert vector_store.get_total_vectors() == 40
+    assert vector_store.get_index_info()["delta_vectors"] == 0
+    assert vector_store.get_labels(("",))[37]["gl_code"] == labels[37]["gl_code"]
+
+    vector_store.release_index()
+
+
+def test_full_snapshot_keeps_segments_other_workers_published(monkeypatch, index_dir):
+    monkeypatch.setattr(vector_store, "FAISS_VERSION_CHECK_INTERVAL", 0)
+    _no_compaction(monkeypatch)
+    vectors = _random_vectors(16)
+    labels = [{**label, "source": "keep" if i < 5 else "old"} for i, label in enumerate(_labels(10))]
+
+    vector_store.reset_index()
+    vector_store.add_vectors(vectors[:10], labels)
+    vector_store.save_index()
+    vector_store.remove_sources({"old"})  # unsaved; this worker now needs a full snapshot
+
+    # Meanwhile another worker appends a delta segment
+    pid = os.fork()
+    if pid == 0:
+        vector_store.release_index()
+        vector_store.add_vectors(vectors[10:13], [{"gl_code": "7100", "gl_name": "GL", "source": "other"}] * 3)
+        vector_store.save_index()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    vector_store.add_vectors(vectors[13:], [{"gl_code": "7200", "gl_name": "GL", "source": "keep"}] * 3)
+    vector_store.save_index()
+
+    vector_store.release_index()
+    assert vector_store.get_total_vectors() == 11
+    assert vector_store.get_labels(("old",)) == []
+    assert [label["gl_code"] for label in vector_store.get_labels(("other",))] == ["7100"] * 3
+    distances, results = vector_store.search(vectors[14], k=1)
+    assert results[0]["gl_code"] == "7200" and distances[0] < 1e-5
+
+    vector_store.release_index()
+
+
+def test_ivf_pq_retrains_from_the_original_vectors(monkeypatch, index_dir):
+    monkeypatch.setattr(vector_store, "FAISS_INDEX_TYPE", "auto")
+    monkeypatch.setattr(vector_store, "FAISS_IVF_MIN_VECTORS", 1000)
+    monkeypatch.setattr(vector_store, "FAISS_IVF_MIN_TRAIN", 1000)
+    monkeypatch.setattr(vector_store, "FAISS_IVF_RETRAIN_GROWTH", 1.5)
+    monkeypatch.setattr(vector_store, "FAISS_PQ_M", 8)
+    trained_on = []
+    build_index = vector_store._build_index
+    monkeypatch.setattr(vector_store, "_build_index",
+                        lambda index_type, vectors: trained_on.append(vectors.copy()) or build_index(index_type, vectors))
+    vectors = _random_vectors(1800)
+
+    vector_store.reset_index()
+    vector_store.add_vectors(vectors[:1200], _labels(1200))
+    assert vector_store.get_index_info()["type"] == "ivf_pq"
+    vector_store.save_index()
+
+    # A worker loading the snapshot gets the exact vectors back, not PQ reconstructions
+    vector_store.release_index()
+    assert vector_store.get_generation().mapped
+    np.testing.assert_array_equal(vector_store.get_generation().vectors(), vectors[:1200])
+
+    vector_store.add_vectors(vectors[1200:], _labels(600))  # outgrows the training size
+    assert vector_store.get_generation().trained_size == 1800
+    np.testing.assert_array_equal(trained_on[-1], vectors)
+
+    vector_store.reset_index()
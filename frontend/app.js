@@ -424,7 +424,7 @@ async function loadReviewQueue() {
 async function approveReview(predictionId) {
     try {
         await apiFetch(`/reviews/${predictionId}/approve`, { method: 'POST' });
-        showToast('Prediction approved & posted to ERP', 'success');
+        showToast('Prediction approved & queued for ERP posting', 'success');
         document.getElementById(`review-${predictionId}`).remove();
         loadDashboardStats();
     } catch (error) {
@@ -451,7 +451,7 @@ async function rejectReview(predictionId) {
                 corrected_by: 'analyst',
             }),
         });
-        showToast('Correction saved & posted to ERP', 'success');
+        showToast('Correction saved & queued for ERP posting', 'success');
         document.getElementById(`review-${predictionId}`).remove();
         loadDashboardStats();
     } catch (error) {